@@ -0,0 +1,33 @@
+"""
+Management command to (re)build the executive dashboard daily metrics
+(see apps.administrator.metrics).
+
+Usage:
+    python manage.py rebuild_daily_metrics            # last 90 days
+    python manage.py rebuild_daily_metrics --days 7
+    python manage.py rebuild_daily_metrics --all      # from the first order / signup
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily metric rows the C-level dashboard reads"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Recompute this many days back from today")
+        parser.add_argument("--all", action="store_true", help="Recompute every day since the first fact")
+
+    def handle(self, *args, **options):
+        from apps.administrator.metrics import DailyMetricsRollup
+
+        if options["all"]:
+            since = DailyMetricsRollup.first_day()
+            if since is None:
+                self.stdout.write(self.style.WARNING("No orders, escrows or signups yet."))
+                return
+            stats = DailyMetricsRollup.reconcile(since=since)
+        else:
+            stats = DailyMetricsRollup.reconcile(days=options["days"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['days']} days recomputed, {stats['product_rows']} product sales rows."
+        ))
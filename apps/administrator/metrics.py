@@ -0,0 +1,186 @@
+"""
+Materialised executive dashboard metrics.
+
+CLevelDashboardAnalyticsView used to aggregate the whole order, escrow and
+user history on every request. DailyMetricsRollup keeps one DailyMetric row
+per day and DailyProductSales rows per product and day instead:
+
+  - order, order item, escrow, customer and designer saves mark their day
+    stale once their transaction commits (see signals.py; bulk writers
+    call mark() themselves);
+  - refresh_stale() recomputes only the stale days, every few minutes;
+  - reconcile() recomputes the last RECONCILE_DAYS every night, catching
+    queryset .update() status changes and deletes that no signal reports.
+
+A day is always recomputed from its own rows (created_at range scans), so
+the cost of a refresh does not grow with history and the dashboard only
+sums day rows. Current customer and designer totals stay live counts:
+signup day rows never drop deleted accounts.
+"""
+import logging
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.customers.models import Customer, Order, OrderItem
+from apps.designers.models import Designer
+from apps.pay.models import Escrow
+from apps.utils.db import upsert_options
+
+from .models import DailyMetric, DailyProductSales
+
+logger = logging.getLogger(__name__)
+
+
+class DailyMetricsRollup:
+    SOLD_STATUSES = ("delivered", "processing", "shipped")
+    RECONCILE_DAYS = 90
+    CHUNK_DAYS = 31
+
+    METRIC_FIELDS = [
+        "gmv", "escrows", "revenue", "payouts", "orders", "shipping", "new_customers", "new_designers",
+    ]
+
+    @staticmethod
+    def _day(moment):
+        return timezone.localdate(moment) if isinstance(moment, datetime) else moment
+
+    @classmethod
+    def mark(cls, *moments) -> None:
+        """
+        Mark the days of the given datetimes (or dates) for recomputation.
+        Inside a transaction the write waits for the commit, so a checkout
+        never holds the lock on today's shared row (and a rollback marks
+        nothing).
+        """
+        days = {cls._day(moment) for moment in moments if moment}
+        if days:
+            transaction.on_commit(lambda: cls._write_marks(days))
+
+    @classmethod
+    def _write_marks(cls, days) -> None:
+        now = timezone.now()
+        DailyMetric.objects.bulk_create(
+            [DailyMetric(date=day, marked_at=now) for day in sorted(days)],
+            **upsert_options(DailyMetric, ["date"], ["marked_at"]),
+        )
+
+    @classmethod
+    def refresh_stale(cls) -> dict:
+        """Recompute the days marked since they were last computed."""
+        days = DailyMetric.objects.filter(marked_at__isnull=False).filter(
+            Q(computed_at__isnull=True) | Q(marked_at__gte=F("computed_at"))
+        ).values_list("date", flat=True)
+        return cls.recompute(days)
+
+    @classmethod
+    def reconcile(cls, days=None, since=None) -> dict:
+        """Recompute the last `days` days (RECONCILE_DAYS), or every day from `since`."""
+        today = timezone.localdate()
+        first = since or today - timedelta(days=(days or cls.RECONCILE_DAYS) - 1)
+        return cls.recompute(first + timedelta(days=n) for n in range((today - first).days + 1))
+
+    @classmethod
+    def first_day(cls):
+        """The earliest day with any dashboard fact, or None."""
+        moments = [
+            Order.objects.order_by("created_at").values_list("created_at", flat=True).first(),
+            Escrow.objects.order_by("created_at").values_list("created_at", flat=True).first(),
+            Customer.objects.order_by("user__date_joined").values_list("user__date_joined", flat=True).first(),
+            Designer.objects.order_by("user__date_joined").values_list("user__date_joined", flat=True).first(),
+        ]
+        days = [cls._day(moment) for moment in moments if moment]
+        return min(days) if days else None
+
+    @classmethod
+    def recompute(cls, days) -> dict:
+        """Rewrite the metric and product sales rows of the given days."""
+        days = sorted(set(days))
+        stats = {"days": len(days), "product_rows": 0}
+        for start in range(0, len(days), cls.CHUNK_DAYS):
+            stats["product_rows"] += cls._recompute_chunk(days[start:start + cls.CHUNK_DAYS])
+        if days:
+            logger.info("[daily_metrics] %s", stats)
+        return stats
+
+    @staticmethod
+    def _within(field, days):
+        """OR of local-midnight ranges covering `days`, one per consecutive run."""
+        tz = timezone.get_current_timezone()
+        condition, run_start = Q(), None
+        for i, day in enumerate(days):
+            run_start = run_start or day
+            if i + 1 < len(days) and days[i + 1] == day + timedelta(days=1):
+                continue
+            condition |= Q(**{
+                f"{field}__gte": datetime.combine(run_start, time.min, tzinfo=tz),
+                f"{field}__lt": datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz),
+            })
+            run_start = None
+        return condition
+
+    @classmethod
+    def _recompute_chunk(cls, days) -> int:
+        started = timezone.now()
+        rows = {day: {field: 0 for field in cls.METRIC_FIELDS} for day in days}
+        sold = OrderItem.objects.filter(status__in=cls.SOLD_STATUSES)
+
+        def collect(queryset, field, **aggregates):
+            per_day = (
+                queryset.filter(cls._within(field, days))
+                .annotate(day=TruncDate(field))
+                .values("day")
+                .annotate(**aggregates)
+                .order_by()
+            )
+            for entry in per_day:
+                if entry["day"] in rows:
+                    rows[entry["day"]].update(
+                        {name: entry[name] or 0 for name in aggregates}
+                    )
+
+        collect(sold, "created_at", gmv=Sum("amount"))
+        collect(
+            Escrow.objects, "created_at",
+            escrows=Count("pk"), revenue=Sum("amount"), payouts=Sum(F("amount") - F("platform_commission")),
+        )
+        collect(Order.objects, "created_at", orders=Count("pk"), shipping=Sum("shipping_amount"))
+        collect(Customer.objects, "user__date_joined", new_customers=Count("pk"))
+        collect(Designer.objects, "user__date_joined", new_designers=Count("pk"))
+
+        sales = [
+            DailyProductSales(
+                date=entry["day"], product_id=entry["product_id"],
+                units=entry["units"] or 0, revenue=entry["revenue"] or 0,
+            )
+            for entry in (
+                sold.filter(cls._within("created_at", days))
+                .annotate(day=TruncDate("created_at"))
+                .values("day", "product_id")
+                .annotate(units=Sum("quantity"), revenue=Sum("sub_total"))
+                .order_by()
+            )
+        ]
+
+        with transaction.atomic():
+            # computed_at is when the reads started: marks made meanwhile stay stale
+            DailyMetric.objects.bulk_create(
+                [DailyMetric(date=day, computed_at=started, **values) for day, values in rows.items()],
+                **upsert_options(DailyMetric, ["date"], [*cls.METRIC_FIELDS, "computed_at"]),
+            )
+            DailyProductSales.objects.filter(date__in=days).delete()
+            DailyProductSales.objects.bulk_create(sales)
+        return len(sales)
+
+
+def refresh_daily_metrics():
+    """Scheduled job entry point."""
+    return DailyMetricsRollup.refresh_stale()
+
+
+def reconcile_daily_metrics():
+    """Scheduled job entry point (nightly)."""
+    return DailyMetricsRollup.reconcile()
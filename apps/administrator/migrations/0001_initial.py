@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('core', '0006_product_embedding_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('gmv', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('escrows', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('payouts', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('shipping', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('new_customers', models.PositiveIntegerField(default=0)),
+                ('new_designers', models.PositiveIntegerField(default=0)),
+                ('marked_at', models.DateTimeField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'daily_metrics',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('product', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.product')),
+            ],
+            options={
+                'db_table': 'daily_product_sales',
+            },
+        ),
+    ]
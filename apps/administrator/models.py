@@ -1,3 +1,44 @@
 from django.db import models
 
-# Create your models here.
+from apps.core.models import Product
+
+
+class DailyMetric(models.Model):
+    """
+    One day of executive dashboard facts; see apps.administrator.metrics.
+    A day is stale while marked_at is newer than computed_at.
+    """
+    date = models.DateField(unique=True)
+
+    gmv = models.DecimalField(max_digits=16, decimal_places=2, default=0)  # sold order items
+    escrows = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)  # escrowed amount
+    payouts = models.DecimalField(max_digits=16, decimal_places=2, default=0)  # escrow minus commission
+    orders = models.PositiveIntegerField(default=0)
+    shipping = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    new_customers = models.PositiveIntegerField(default=0)
+    new_designers = models.PositiveIntegerField(default=0)
+
+    marked_at = models.DateTimeField(null=True, blank=True)
+    computed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "daily_metrics"
+        ordering = ["date"]
+
+    def __str__(self):
+        return str(self.date)
+
+
+class DailyProductSales(models.Model):
+    """Units and revenue of one product's sold order items on one day."""
+    date = models.DateField(db_index=True)
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name="+")
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = "daily_product_sales"
+
+    def __str__(self):
+        return f"{self.date} {self.product_id}: {self.units}"
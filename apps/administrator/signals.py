@@ -0,0 +1,29 @@
+"""
+Django signals marking the days of the executive dashboard metrics stale.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.administrator.metrics import DailyMetricsRollup
+from apps.customers.models import Customer, Order, OrderItem
+from apps.designers.models import Designer
+from apps.pay.models import Escrow
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=OrderItem)
+@receiver(post_save, sender=Escrow)
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=OrderItem)
+@receiver(post_delete, sender=Escrow)
+def on_sale_change(sender, instance, **kwargs):
+    """Orders, item status changes and escrows count towards their creation day."""
+    DailyMetricsRollup.mark(instance.created_at)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Designer)
+def on_signup(sender, instance, created, **kwargs):
+    if created:
+        DailyMetricsRollup.mark(instance.user.date_joined)
@@ -1,3 +1,148 @@
-from django.test import TestCase
+"""
+Tests for apps.administrator daily metrics and the C-level dashboard.
 
-# Create your tests here.
+Tests cover:
+  - Recomputed day rows match the raw order / escrow / signup tables
+  - Saves mark their day stale on commit; refresh_stale() picks them up
+  - Dashboard reads the day rows in a fixed number of queries
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.administrator.metrics import DailyMetricsRollup
+from apps.administrator.models import DailyMetric, DailyProductSales
+from apps.core.models import Product
+from apps.customers.models import Customer, Order, OrderItem
+from apps.designers.models import Designer
+from apps.pay.models import Escrow, Invoice, Payment
+
+User = get_user_model()
+
+LOCMEM_CACHE = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class DailyMetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.now = timezone.now()
+        cls.today = timezone.localdate(cls.now)
+        cls.designer = User.objects.create_user(username="weaver", email="weaver@example.com", password="password123")
+        Designer.objects.create(user=cls.designer, status="approved")
+        cls.buyer = User.objects.create_user(username="abena", email="abena@example.com", password="password123")
+        cls.customer = Customer.objects.create(user=cls.buyer)
+        cls.kente = Product.objects.create(user=cls.designer, name="Kente Wrap", price=120, stock=10)
+        cls.adire = Product.objects.create(user=cls.designer, name="Adire Scarf", price=30, stock=10)
+        cls.payment = Payment.objects.create(user=cls.buyer, amount=500, payment_method="card", status="success")
+
+        cls.admin = User.objects.create_user(username="ceo", email="ceo@example.com", password="password123")
+        User.objects.filter(pk=cls.admin.pk).update(user_type="admin", admin_role="c_level")
+        cls.admin.refresh_from_db()
+
+    def sell(self, product, quantity, status="processing", days_ago=0, shipping=5):
+        order = Order.objects.create(
+            customer=self.customer, invoice=Invoice.objects.create(user=self.buyer, amount=100),
+            order_id=f"URBON-{Order.objects.count()}", total_amount=100, shipping_amount=shipping,
+        )
+        item = OrderItem.objects.create(
+            order=order, product=product, designer=self.designer, quantity=quantity,
+            amount=product.price * quantity, sub_total=product.price * quantity, status=status,
+            tracking_number=f"T-{OrderItem.objects.count()}",
+        )
+        escrow = Escrow.objects.create(
+            payment=self.payment, customer=self.buyer, designer=self.designer,
+            amount=item.sub_total, platform_commission=item.sub_total / 10,
+        )
+        when = self.now - timedelta(days=days_ago)
+        Order.objects.filter(pk=order.pk).update(created_at=when)
+        OrderItem.objects.filter(pk=item.pk).update(created_at=when)
+        Escrow.objects.filter(pk=escrow.pk).update(created_at=when)
+        return item
+
+    def dashboard(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse("admin-clevel-dashboard"))
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_reconciled_days_match_raw_tables(self):
+        self.sell(self.kente, 2, days_ago=3)
+        self.sell(self.adire, 1, status="delivered", days_ago=3)
+        self.sell(self.adire, 4, status="pending", days_ago=1)  # not sold yet
+        self.sell(self.adire, 3, status="shipped")
+        DailyMetricsRollup.reconcile(days=5)
+
+        three_days_ago = DailyMetric.objects.get(date=self.today - timedelta(days=3))
+        self.assertEqual(
+            (three_days_ago.gmv, three_days_ago.escrows, three_days_ago.revenue, three_days_ago.payouts),
+            (Decimal("270.00"), 2, Decimal("270.00"), Decimal("243.00")),
+        )
+        self.assertEqual((three_days_ago.orders, three_days_ago.shipping), (2, Decimal("10.00")))
+        self.assertEqual(DailyMetric.objects.get(date=self.today - timedelta(days=1)).gmv, 0)
+        self.assertEqual(DailyMetric.objects.get(date=self.today).new_customers, 1)
+        self.assertEqual(DailyProductSales.objects.filter(product=self.adire).count(), 2)
+
+        data, _ = self.dashboard()
+        financials = data["financials"]
+        self.assertEqual(
+            (financials["total_gmv"], financials["total_payouts"], financials["total_shipping"]),
+            (360.0, 432.0, 20.0),
+        )
+        self.assertEqual(len(financials["daily_series"]), 3)
+        self.assertEqual(
+            (data["growth"]["total_users"], data["designers"]["total_designers"], data["designers"]["active_designers"]),
+            (1, 1, 1),
+        )
+        self.assertEqual(
+            [(p["name"], p["units"]) for p in data["products"]["top_products"]],
+            [("Adire Scarf", 4), ("Kente Wrap", 2)],
+        )
+
+    def test_saves_mark_their_day_stale(self):
+        item = self.sell(self.kente, 1, status="pending", days_ago=2)
+        DailyMetricsRollup.reconcile(days=3)
+        self.assertEqual(DailyMetricsRollup.refresh_stale()["days"], 0)
+
+        item.refresh_from_db()
+        item.status = "delivered"
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                item.save()
+            # today's shared row is only written once the save commits
+            self.assertFalse(any("daily_metrics" in q["sql"] for q in queries.captured_queries))
+        self.assertEqual(DailyMetricsRollup.refresh_stale()["days"], 1)
+        self.assertEqual(DailyMetric.objects.get(date=self.today - timedelta(days=2)).gmv, Decimal("120.00"))
+        self.assertEqual(DailyMetricsRollup.refresh_stale()["days"], 0)
+
+    def test_head_counts_are_live(self):
+        data, _ = self.dashboard()  # no day rows computed yet
+        self.assertEqual((data["growth"]["total_users"], data["designers"]["total_designers"]), (1, 1))
+
+        DailyMetricsRollup.reconcile(days=3)
+        self.customer.delete()
+        data, _ = self.dashboard()
+        self.assertEqual(data["growth"]["total_users"], 0)
+
+    def test_dashboard_queries_do_not_grow_with_history(self):
+        self.sell(self.kente, 1, days_ago=40)
+        DailyMetricsRollup.reconcile(days=60)
+        _, few = self.dashboard()
+
+        for days_ago in range(10):
+            self.sell(self.adire, 1, days_ago=days_ago)
+        DailyMetricsRollup.reconcile(days=60)
+        _, more = self.dashboard()
+        self.assertEqual(more, few)
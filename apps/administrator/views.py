@@ -1026,52 +1026,48 @@ class CLevelDashboardAnalyticsView(APIView):
     permission_classes = [IsCLevel]
 
     def get(self, request):
-        from django.db.models import Sum, Count, F, Q
-        from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+        from django.db.models import Sum
+        from django.db.models.functions import TruncMonth
         from django.utils import timezone
         import datetime
 
+        from .models import DailyMetric, DailyProductSales
+
+        # Precomputed day rows (apps.administrator.metrics); nothing here
+        # scans order, escrow or signup history.
         now = timezone.now()
-        thirty_days_ago = now - datetime.timedelta(days=30)
-        six_months_ago = now - datetime.timedelta(days=180)
+        thirty_days_ago = timezone.localdate(now - datetime.timedelta(days=30))
+        six_months_ago = timezone.localdate(now - datetime.timedelta(days=180))
 
         # ---------------------------------------------------------
         # 1. Financial Analytics (Revenue & Expenses)
         # ---------------------------------------------------------
-        
-        # Current Top Level Totals
-        total_gmv = OrderItem.objects.filter(
-            status__in=['delivered', 'processing', 'shipped']
-        ).aggregate(total=Sum('amount'))['total'] or 0
 
-        # Revenue is GMV. Expenses are Payouts to Designers via Escrow.
-        total_payouts = Escrow.objects.aggregate(
-            payouts=Sum(F('amount') - F('platform_commission'))
-        )['payouts'] or 0
+        # Current Top Level Totals (revenue is GMV, expenses are escrow payouts to designers)
+        totals = DailyMetric.objects.aggregate(
+            gmv=Sum('gmv'),
+            payouts=Sum('payouts'),
+            shipping=Sum('shipping'),
+        )
+        total_gmv = totals['gmv'] or 0
+        total_payouts = totals['payouts'] or 0
 
         # Time-Series Revenue vs Expenses (Daily for the last 30 days)
-        daily_financials_qs = Escrow.objects.filter(created_at__gte=thirty_days_ago).annotate(
-            date=TruncDate('created_at')
-        ).values('date').annotate(
-            revenue=Sum('amount'),
-            expenses=Sum(F('amount') - F('platform_commission'))
-        ).order_by('date')
-
         daily_financials = [
             {
-                "date": entry['date'].strftime('%Y-%m-%d'),
-                "revenue": float(entry['revenue'] or 0),
-                "expenses": float(entry['expenses'] or 0)
+                "date": entry.date.strftime('%Y-%m-%d'),
+                "revenue": float(entry.revenue),
+                "expenses": float(entry.payouts)
             }
-            for entry in daily_financials_qs
+            for entry in DailyMetric.objects.filter(date__gte=thirty_days_ago, escrows__gt=0).order_by('date')
         ]
 
         # Monthly Financials (Last 6 months)
-        monthly_financials_qs = Escrow.objects.filter(created_at__gte=six_months_ago).annotate(
-            month=TruncMonth('created_at')
+        monthly_financials_qs = DailyMetric.objects.filter(date__gte=six_months_ago, escrows__gt=0).annotate(
+            month=TruncMonth('date')
         ).values('month').annotate(
-            revenue=Sum('amount'),
-            expenses=Sum(F('amount') - F('platform_commission'))
+            revenue=Sum('revenue'),
+            expenses=Sum('payouts')
         ).order_by('month')
 
         monthly_financials = [
@@ -1086,50 +1082,41 @@ class CLevelDashboardAnalyticsView(APIView):
         # ---------------------------------------------------------
         # 2. Growth & Logistics Analytics
         # ---------------------------------------------------------
-        
+
+        # Current head counts stay live: signup day rows never drop deleted accounts
         total_users = Customer.objects.count()
-        new_users_last_month = Customer.objects.filter(user__date_joined__gte=thirty_days_ago).count()
+        new_users_last_month = DailyMetric.objects.filter(date__gte=thirty_days_ago).aggregate(
+            count=Sum('new_customers')
+        )['count'] or 0
 
         total_designers = Designer.objects.count()
         active_designers = Designer.objects.filter(status='approved').count()
 
-        # Monthly User Growth
-        monthly_users_qs = Customer.objects.filter(user__date_joined__gte=six_months_ago).annotate(
-            month=TruncMonth('user__date_joined')
-        ).values('month').annotate(count=Count('id')).order_by('month')
+        # Monthly User & Designer Growth
+        monthly_growth_qs = DailyMetric.objects.filter(date__gte=six_months_ago).annotate(
+            month=TruncMonth('date')
+        ).values('month').annotate(
+            customers=Sum('new_customers'),
+            designers=Sum('new_designers')
+        ).order_by('month')
 
-        monthly_user_growth = [
+        monthly_growth = [
             {
                 "date": entry['month'].strftime('%b %Y'),
-                "customers": entry['count']
+                "customers": entry['customers'] or 0,
+                "designers": entry['designers'] or 0
             }
-            for entry in monthly_users_qs
+            for entry in monthly_growth_qs
+            if entry['customers'] or entry['designers']
         ]
 
-        # Monthly Designer Growth
-        monthly_designers_qs = Designer.objects.filter(user__date_joined__gte=six_months_ago).annotate(
-            month=TruncMonth('user__date_joined')
-        ).values('month').annotate(count=Count('id')).order_by('month')
-
-        # Merge them
-        growth_dict = {item['date']: {"date": item['date'], "customers": item['customers'], "designers": 0} for item in monthly_user_growth}
-        for entry in monthly_designers_qs:
-            month_str = entry['month'].strftime('%b %Y')
-            if month_str not in growth_dict:
-                growth_dict[month_str] = {"date": month_str, "customers": 0, "designers": 0}
-            growth_dict[month_str]["designers"] = entry['count']
-        
-        monthly_growth = sorted(list(growth_dict.values()), key=lambda x: datetime.datetime.strptime(x['date'], '%b %Y'))
-
         # Shipping Costs (Revenue from shipping)
-        total_shipping_revenue = Order.objects.aggregate(total=Sum('shipping_amount'))['total'] or 0
+        total_shipping_revenue = totals['shipping'] or 0
 
         # Top Products
-        top_products_qs = OrderItem.objects.filter(
-            status__in=['delivered', 'processing', 'shipped']
-        ).values('product__name').annotate(
-            units_sold=Sum('quantity'),
-            revenue=Sum('sub_total')
+        top_products_qs = DailyProductSales.objects.values('product__name').annotate(
+            units_sold=Sum('units'),
+            revenue=Sum('revenue')
         ).order_by('-units_sold')[:5]
 
         top_products = [
@@ -2,13 +2,27 @@
 Urbana Core Algorithm V2.0 — Scoring & Ranking Services
 """
 
+import atexit
+import ipaddress
+import json
+import logging
 import math
 import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from datetime import timedelta
 from typing import Dict, List, Optional
 
+import numpy as np
 from django.utils import timezone
-from django.db.models import Avg, Count, F, Q, Sum
+from django.db import connection, transaction
+from django.db.models import (
+    Avg, Case, Count, F, FloatField, IntegerField, Max, Min, Q, Sum, Value, When,
+)
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast, Coalesce
 from django.core.cache import cache
 
 from apps.algorithm.models import (
@@ -21,9 +35,83 @@ from apps.algorithm.models import (
     UserActivity,
     UserPreferenceProfile,
 )
-from apps.core.models import Category, Product, Review
-from apps.customers.models import OrderItem, ReturnRequest
-from apps.designers.models import Designer, DesignerOrder, ShipmentTracking
+from apps.core.models import Category, Product, ProductView, Review
+from apps.customers.models import Address, OrderItem, ReturnRequest
+from apps.designers.models import Designer, DesignerOrder, DesignerProduct, ShipmentTracking
+from apps.utils.db import upsert_options
+
+logger = logging.getLogger(__name__)
+
+
+def _redis_connection():
+    """Raw Redis client behind the default cache, or None if it is not django-redis."""
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection("default")
+    except Exception:
+        return None
+
+
+def _scatter(index: Dict, rows, key: str, fields: List[str], size: int) -> Dict:
+    """Place grouped aggregate rows into zero-filled arrays aligned with `index`."""
+    cols = {f: np.zeros(size, dtype=np.float64) for f in fields}
+    for row in rows:
+        i = index.get(row[key])
+        if i is None:
+            continue
+        for f in fields:
+            cols[f][i] = row[f] or 0
+    return cols
+
+
+# =====================================================
+# 0. Batch Run Instrumentation
+# =====================================================
+
+class RunStats:
+    """
+    Counts database queries and wall time for a batch job.
+
+    Usage:
+        with RunStats("product_scores") as stats:
+            ...
+        stats.as_dict()  # {"job": ..., "queries": ..., "wall_time_ms": ...}
+    """
+
+    def __init__(self, job: str):
+        self.job = job
+        self.queries = 0
+        self.wall_time = 0.0
+        self.extra = {}
+        self._started = None
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall_time = time.perf_counter() - self._started
+        self._wrapper.__exit__(exc_type, exc, tb)
+        logger.info(
+            "[%s] %d queries in %.1f ms %s",
+            self.job, self.queries, self.wall_time * 1000, self.extra,
+        )
+        return False
+
+    def as_dict(self) -> Dict:
+        return {
+            "job": self.job,
+            "queries": self.queries,
+            "wall_time_ms": round(self.wall_time * 1000, 1),
+            **self.extra,
+        }
 
 
 # =====================================================
@@ -36,194 +124,362 @@ class ProductScoringEngine:
     FRESHNESS_BOOST_DAYS = 7
     CACHE_KEY_PREFIX = "product_score"
     CACHE_TTL = 3600  # 1 hour
+    COALESCE_WINDOW = 30  # seconds; rescore requests inside one window share a run
 
     @classmethod
     def compute_all(cls, config: Optional[AlgorithmConfig] = None):
         """Batch recompute all product scores. Called nightly."""
-        if config is None:
-            config = AlgorithmConfig.get_active()
+        stats = BatchProductScoringEngine.run(config=config)
+        return stats["products_scored"]
 
-        weights = config.get_weights()
-        now = timezone.now()
-        boost_cutoff = now - timedelta(days=config.new_product_boost_days)
+    @classmethod
+    def compute_product(cls, product_id: str, config: Optional[AlgorithmConfig] = None) -> Dict:
+        """
+        Incremental update: rescore only `product_id` and drop its cached score.
+        Runs the same aggregates as the nightly batch, restricted to one product.
+        """
+        stats = BatchProductScoringEngine.run(config=config, product_ids=[product_id])
+        try:
+            cache.delete(f"{cls.CACHE_KEY_PREFIX}:{product_id}")
+        except Exception:
+            pass  # Redis down → score cache expires on its own
+        return stats
 
-        # Preload aggregates
-        products = Product.objects.filter(is_published=True, is_active=True)
-        scores_to_update = []
+    @classmethod
+    def schedule_rescore(cls, product_id: str) -> bool:
+        """
+        Queue an incremental rescore COALESCE_WINDOW from now as a one-shot
+        APS job, so a burst of events for the same product shares one run.
+        Returns False when a rescore is already pending for this product.
+        """
+        pending_key = f"{cls.CACHE_KEY_PREFIX}:pending:{product_id}"
+        try:
+            # Outlives the window so a late leader does not let a second run in;
+            # rescore_product() deletes it when the run starts
+            if not cache.add(pending_key, 1, cls.COALESCE_WINDOW * 4):
+                return False
+        except Exception:
+            pass  # Redis down → the job id still coalesces
+
+        def enqueue():
+            from apps.aps.scheduler import schedule_once
+            try:
+                schedule_once(
+                    rescore_product,
+                    timezone.now() + timedelta(seconds=cls.COALESCE_WINDOW),
+                    job_id=f"rescore_product:{product_id}",
+                    args=[product_id],
+                )
+            except Exception:
+                logger.exception("[product_score] could not queue rescore of %s", product_id)
+                cls.release_rescore(product_id)
 
-        for product in products.prefetch_related(
-            "reviews", "order_items", "activities"
-        ):
-            ps, _ = ProductScore.objects.get_or_create(product=product)
+        transaction.on_commit(enqueue)
+        return True
 
-            # 1. Engagement Score
-            ps.engagement_score = cls._compute_engagement(product)
+    @classmethod
+    def release_rescore(cls, product_id: str):
+        """Clear the pending marker so events after this point queue a new run."""
+        try:
+            cache.delete(f"{cls.CACHE_KEY_PREFIX}:pending:{product_id}")
+        except Exception:
+            pass
 
-            # 2. Conversion Score
-            ps.conversion_score = cls._compute_conversion(product)
+    @classmethod
+    def get_score(cls, product_id: str) -> float:
+        cache_key = f"{cls.CACHE_KEY_PREFIX}:{product_id}"
+        score = cache.get(cache_key)
+        if score is not None:
+            return score
+        try:
+            ps = ProductScore.objects.get(product_id=product_id)
+            cache.set(cache_key, ps.urbana_score, cls.CACHE_TTL)
+            return ps.urbana_score
+        except ProductScore.DoesNotExist:
+            return 0.0
 
-            # 3. Retention Score
-            ps.retention_score = cls._compute_retention(product)
 
-            # 4. Freshness Score
-            ps.freshness_score = cls._compute_freshness(product, boost_cutoff)
+def rescore_product(product_id: str) -> Dict:
+    """One-shot job queued by ProductScoringEngine.schedule_rescore."""
+    # Release first so events arriving while we score queue another run
+    ProductScoringEngine.release_rescore(product_id)
+    return ProductScoringEngine.compute_product(product_id)
+
+
+class BatchProductScoringEngine:
+    """
+    Set-based Urbana Score computation for the whole catalogue.
+
+    Every component is computed from a handful of grouped aggregate
+    queries over UserActivity, OrderItem, Review, ReturnRequest and the
+    hourly ProductTrendSnapshot rows,
+    loaded into columnar NumPy arrays indexed by product, combined with
+    vectorised arithmetic and upserted in bulk. The query count is
+    independent of catalogue size (apart from upsert batches).
+    """
+
+    UPSERT_BATCH_SIZE = 1000
+    SCORE_FIELDS = [
+        "engagement_score",
+        "conversion_score",
+        "retention_score",
+        "freshness_score",
+        "designer_score",
+        "fit_confidence",
+        "urbana_score",
+        "trend_score",
+        "is_trending",
+        "computed_at",
+        "updated_at",
+    ]
 
-            # 5. Designer Score (from Designer Intelligence Engine)
-            try:
-                ds = DesignerScore.objects.get(designer=product.user.designer_profile)
-                ps.designer_score = ds.operational_score
-            except Exception:
-                ps.designer_score = 0.5
-
-            # 6. Fit Confidence
-            ps.fit_confidence = cls._compute_fit_confidence(product)
-
-            # Composite Urbana Score
-            ps.urbana_score = (
-                weights["engagement"] * ps.engagement_score
-                + weights["conversion"] * ps.conversion_score
-                + weights["retention"] * ps.retention_score
-                + weights["freshness"] * ps.freshness_score
-                + weights["designer"] * ps.designer_score
-                + weights["fit"] * ps.fit_confidence
-            )
+    @classmethod
+    def run(cls, config: Optional[AlgorithmConfig] = None, product_ids=None) -> Dict:
+        """
+        Score every published product (or only `product_ids`) and write
+        the results back. Returns run stats: products scored, query
+        count and wall time.
+        """
+        with RunStats("product_scores") as stats:
+            if config is None:
+                config = AlgorithmConfig.get_active()
 
-            # Trend detection
-            ps.trend_score = TrendDetectionEngine.compute_trend_score(product)
-            ps.is_trending = ps.trend_score > config.trending_sigma_threshold
-
-            ps.computed_at = now
-            scores_to_update.append(ps)
-
-        ProductScore.objects.bulk_update(
-            scores_to_update,
-            [
-                "engagement_score",
-                "conversion_score",
-                "retention_score",
-                "freshness_score",
-                "designer_score",
-                "fit_confidence",
-                "urbana_score",
-                "trend_score",
-                "is_trending",
-                "computed_at",
-            ],
-            batch_size=500,
-        )
+            products = Product.objects.filter(is_published=True, is_active=True)
+            if product_ids is not None:
+                products = products.filter(id__in=list(product_ids))
 
-        return len(scores_to_update)
+            columns = cls.compute_columns(products, timezone.now())
+            scores = cls.combine(columns, config)
+            count = cls.write(columns["product_id"], scores, columns["now"])
+
+            stats.extra["products_scored"] = count
+            if product_ids is None:
+                stats.extra["feed_pool_size"] = CandidatePool.rebuild()
+        return stats.as_dict()
+
+    # ---------- loading ----------
 
     @classmethod
-    def _compute_engagement(cls, product: Product) -> float:
-        """Engagement based on CTR, time-on-product, saves."""
-        last_30d = timezone.now() - timedelta(days=30)
-        activities = UserActivity.objects.filter(
-            product=product, created_at__gte=last_30d
+    def compute_columns(cls, products, now) -> Dict:
+        """Run the grouped aggregates and return one array per raw signal."""
+        last_30d = now - timedelta(days=30)
+        E = UserActivity.EventType
+
+        rows = list(
+            products.order_by().values_list(
+                "id", "created_at", "user__designer_profile__score__operational_score"
+            )
         )
+        size = len(rows)
+        product_ids = [r[0] for r in rows]
+        index = {pid: i for i, pid in enumerate(product_ids)}
 
-        views = activities.filter(event_type=UserActivity.EventType.PRODUCT_VIEW).count()
-        clicks = activities.filter(event_type=UserActivity.EventType.PRODUCT_CLICK).count()
-        saves = activities.filter(event_type=UserActivity.EventType.WISHLIST_ADD).count()
-        shares = activities.filter(event_type=UserActivity.EventType.SHARE).count()
+        age_days = np.array(
+            [(now - r[1]).days if r[1] else 0 for r in rows], dtype=np.float64
+        )
+        designer_score = np.array(
+            [0.5 if r[2] is None else r[2] for r in rows], dtype=np.float64
+        )
 
-        # Time on product (stored in metadata as seconds)
-        time_entries = [
-            a.metadata.get("seconds", 0)
-            for a in activities.filter(event_type=UserActivity.EventType.TIME_ON_PRODUCT)
-        ]
-        avg_time = sum(time_entries) / len(time_entries) if time_entries else 0
-
-        # Normalized engagement score
-        score = min(1.0, (
-            min(clicks / max(views, 1), 0.5) * 0.4
-            + min(saves / max(views, 1), 0.3) * 0.3
-            + min(avg_time / 60, 1.0) * 0.2
-            + min(shares / max(views, 1), 0.2) * 0.1
-        ))
-        return max(0.0, score)
-
-    @classmethod
-    def _compute_conversion(cls, product: Product) -> float:
-        """Purchases / Clicks over last 30 days."""
-        last_30d = timezone.now() - timedelta(days=30)
-        clicks = UserActivity.objects.filter(
-            product=product,
-            event_type=UserActivity.EventType.PRODUCT_CLICK,
-            created_at__gte=last_30d,
-        ).count()
-        purchases = OrderItem.objects.filter(
-            product=product, created_at__gte=last_30d
-        ).count()
-
-        if clicks == 0:
-            return 0.0
-        return min(1.0, purchases / clicks)
-
-    @classmethod
-    def _compute_retention(cls, product: Product) -> float:
-        """Repeat purchases, low return rate, good ratings."""
-        # Rating
-        avg_rating = Review.objects.filter(product=product, is_approved=True).aggregate(
-            avg=Avg("rating")
-        )["avg"] or 3.0
-        rating_score = (avg_rating - 1) / 4  # normalize 1-5 to 0-1
-
-        # Return rate
-        total_items = OrderItem.objects.filter(product=product).count()
-        returns = ReturnRequest.objects.filter(
-            order_item__product=product
-        ).count()
-        return_rate = returns / max(total_items, 1)
-        return_score = max(0, 1 - return_rate * 5)  # >20% returns = 0
-
-        # Repeat purchase rate
-        customers = (
-            OrderItem.objects.filter(product=product)
-            .values("order__customer")
+        # Restrict every aggregate to the products being scored
+        product_filter = {"product__in": products.order_by().values("id")}
+        seconds = Coalesce(
+            Cast(KeyTextTransform("seconds", "metadata"), FloatField()), Value(0.0)
+        )
+
+        activity = _scatter(index, (
+            UserActivity.objects.filter(created_at__gte=last_30d, **product_filter)
+            .order_by()
+            .values("product_id")
+            .annotate(
+                views=Count("id", filter=Q(event_type=E.PRODUCT_VIEW)),
+                clicks=Count("id", filter=Q(event_type=E.PRODUCT_CLICK)),
+                saves=Count("id", filter=Q(event_type=E.WISHLIST_ADD)),
+                shares=Count("id", filter=Q(event_type=E.SHARE)),
+                time_entries=Count("id", filter=Q(event_type=E.TIME_ON_PRODUCT)),
+                time_total=Sum(seconds, filter=Q(event_type=E.TIME_ON_PRODUCT)),
+            )
+        ), "product_id", [
+            "views", "clicks", "saves", "shares", "time_entries", "time_total",
+        ], size)
+
+        orders = _scatter(index, (
+            OrderItem.objects.filter(**product_filter)
+            .order_by()
+            .values("product_id")
+            .annotate(
+                total_items=Count("id"),
+                purchases_30d=Count("id", filter=Q(created_at__gte=last_30d)),
+            )
+        ), "product_id", ["total_items", "purchases_30d"], size)
+
+        trends = _scatter(
+            index,
+            TrendDetectionEngine.snapshot_totals(now).filter(**product_filter),
+            "product_id",
+            ["clicks_window", "purchases_window", "clicks_baseline", "purchases_baseline"],
+            size,
+        )
+
+        # Repeat buyers: one row per (product, customer), folded with bincount
+        buyer_rows = list(
+            OrderItem.objects.filter(**product_filter)
+            .order_by()
+            .values_list("product_id", "order__customer_id")
             .annotate(buys=Count("id"))
         )
-        repeat_count = sum(1 for c in customers if c["buys"] > 1)
-        repeat_rate = repeat_count / max(len(customers), 1)
+        buyer_idx = np.array(
+            [index[r[0]] for r in buyer_rows if r[0] in index], dtype=np.int64
+        )
+        buyer_buys = np.array(
+            [r[2] for r in buyer_rows if r[0] in index], dtype=np.float64
+        )
+        customers = np.bincount(buyer_idx, minlength=size).astype(np.float64)
+        repeat_customers = np.bincount(
+            buyer_idx, weights=(buyer_buys > 1).astype(np.float64), minlength=size
+        )
 
-        return min(1.0, rating_score * 0.4 + return_score * 0.4 + repeat_rate * 0.2)
+        reviews = _scatter(index, (
+            Review.objects.filter(is_approved=True, **product_filter)
+            .order_by()
+            .values("product_id")
+            .annotate(review_count=Count("id"), avg_rating=Avg("rating"))
+        ), "product_id", ["review_count", "avg_rating"], size)
 
-    @classmethod
-    def _compute_freshness(cls, product: Product, boost_cutoff) -> float:
-        """New products get a boost that decays over time."""
-        age_days = (timezone.now() - product.created_at).days
-        if age_days <= 7:
-            return 1.0 - (age_days / 7) * 0.3  # 1.0 -> 0.7
-        return max(0.3, 1.0 - (age_days / 90))  # linear decay over 90 days
+        returns = _scatter(index, (
+            ReturnRequest.objects.filter(
+                order_item__product__in=products.order_by().values("id")
+            )
+            .order_by()
+            .values("order_item__product_id")
+            .annotate(
+                returns=Count("id"),
+                wrong_size_returns=Count(
+                    "id", filter=Q(reason=ReturnRequest.Reason.WRONG_SIZE)
+                ),
+            )
+        ), "order_item__product_id", ["returns", "wrong_size_returns"], size)
+
+        return {
+            "now": now,
+            "product_id": product_ids,
+            "age_days": age_days,
+            "designer_score": designer_score,
+            "customers": customers,
+            "repeat_customers": repeat_customers,
+            **activity,
+            **orders,
+            **reviews,
+            **returns,
+            **trends,
+        }
+
+    # ---------- scoring ----------
 
     @classmethod
-    def _compute_fit_confidence(cls, product: Product) -> float:
-        """Predict size accuracy based on return reasons."""
-        wrong_size_returns = ReturnRequest.objects.filter(
-            order_item__product=product, reason=ReturnRequest.Reason.WRONG_SIZE
-        ).count()
-        total_returns = ReturnRequest.objects.filter(
-            order_item__product=product
-        ).count()
+    def combine(cls, c: Dict, config: AlgorithmConfig) -> Dict:
+        """Vectorised equivalent of the per-product ProductScoringEngine formulas."""
+        weights = config.get_weights()
+        views = np.maximum(c["views"], 1)
+
+        # Engagement
+        avg_time = np.divide(
+            c["time_total"], c["time_entries"],
+            out=np.zeros_like(c["time_total"]), where=c["time_entries"] > 0,
+        )
+        engagement = (
+            np.minimum(c["clicks"] / views, 0.5) * 0.4
+            + np.minimum(c["saves"] / views, 0.3) * 0.3
+            + np.minimum(avg_time / 60, 1.0) * 0.2
+            + np.minimum(c["shares"] / views, 0.2) * 0.1
+        )
+        engagement = np.clip(engagement, 0.0, 1.0)
 
-        if total_returns == 0:
-            return 0.7  # neutral if no data
+        # Conversion
+        conversion = np.where(
+            c["clicks"] > 0,
+            np.minimum(1.0, c["purchases_30d"] / np.maximum(c["clicks"], 1)),
+            0.0,
+        )
+
+        # Retention
+        avg_rating = np.where(c["review_count"] > 0, c["avg_rating"], 3.0)
+        rating_score = (avg_rating - 1) / 4
+        return_rate = c["returns"] / np.maximum(c["total_items"], 1)
+        return_score = np.maximum(0.0, 1 - return_rate * 5)
+        repeat_rate = c["repeat_customers"] / np.maximum(c["customers"], 1)
+        retention = np.minimum(
+            1.0, rating_score * 0.4 + return_score * 0.4 + repeat_rate * 0.2
+        )
+
+        # Freshness
+        age = c["age_days"]
+        freshness = np.where(
+            age <= 7,
+            1.0 - (age / 7) * 0.3,
+            np.maximum(0.3, 1.0 - age / 90),
+        )
+
+        # Fit confidence
+        fit = np.where(
+            c["returns"] > 0,
+            np.maximum(
+                0.1,
+                1.0 - (c["wrong_size_returns"] / np.maximum(c["returns"], 1)) * 2,
+            ),
+            0.7,
+        )
+
+        designer = c["designer_score"]
+
+        urbana = (
+            weights["engagement"] * engagement
+            + weights["conversion"] * conversion
+            + weights["retention"] * retention
+            + weights["freshness"] * freshness
+            + weights["designer"] * designer
+            + weights["fit"] * fit
+        )
+
+        # Trend: last 48h vs. the 30-day average per 48h window (from snapshots)
+        trend = TrendDetectionEngine.velocity(
+            c["clicks_window"], c["purchases_window"],
+            c["clicks_baseline"], c["purchases_baseline"],
+        )
+
+        return {
+            "engagement_score": engagement,
+            "conversion_score": conversion,
+            "retention_score": retention,
+            "freshness_score": freshness,
+            "designer_score": designer,
+            "fit_confidence": fit,
+            "urbana_score": urbana,
+            "trend_score": trend,
+            "is_trending": trend > config.trending_sigma_threshold,
+        }
 
-        fit_error_rate = wrong_size_returns / total_returns
-        return max(0.1, 1.0 - fit_error_rate * 2)
+    # ---------- writing ----------
 
     @classmethod
-    def get_score(cls, product_id: str) -> float:
-        cache_key = f"{cls.CACHE_KEY_PREFIX}:{product_id}"
-        score = cache.get(cache_key)
-        if score is not None:
-            return score
-        try:
-            ps = ProductScore.objects.get(product_id=product_id)
-            cache.set(cache_key, ps.urbana_score, cls.CACHE_TTL)
-            return ps.urbana_score
-        except ProductScore.DoesNotExist:
-            return 0.0
+    def write(cls, product_ids: List[str], scores: Dict, now) -> int:
+        """Upsert one ProductScore row per product."""
+        columns = {k: v.tolist() for k, v in scores.items()}
+        objs = [
+            ProductScore(
+                product_id=pid,
+                computed_at=now,
+                updated_at=now,
+                **{k: columns[k][i] for k in columns},
+            )
+            for i, pid in enumerate(product_ids)
+        ]
+        ProductScore.objects.bulk_create(
+            objs,
+            batch_size=cls.UPSERT_BATCH_SIZE,
+            **upsert_options(ProductScore, ["product"], cls.SCORE_FIELDS),
+        )
+        return len(objs)
 
 
 # =====================================================
@@ -234,106 +490,15 @@ class DesignerIntelligenceEngine:
     """Computes Designer Operational Score and BHS."""
 
     @classmethod
-    def compute_all(cls):
+    def compute_all(cls) -> int:
         """Recompute scores for all designers."""
-        for designer in Designer.objects.all():
-            cls.compute_designer(designer)
+        return BatchDesignerScoringEngine.run()["designers_scored"]
 
     @classmethod
     def compute_designer(cls, designer: Designer):
-        ds, _ = DesignerScore.objects.get_or_create(designer=designer)
-        now = timezone.now()
-        last_30d = now - timedelta(days=30)
-        last_60d = now - timedelta(days=60)
-
-        # Delivery speed: % orders delivered within SLA (e.g., 7 days)
-        orders = DesignerOrder.objects.filter(
-            order_item__product__user=designer.user, created_at__gte=last_30d
-        )
-        total_orders = orders.count()
-        on_time = orders.filter(
-            status="delivered",
-            order_item__delivered_at__lte=F("created_at") + timedelta(days=7),
-        ).count()
-        ds.delivery_speed_score = on_time / max(total_orders, 1)
-
-        # Fulfillment rate: % orders fulfilled (not cancelled)
-        fulfilled = total_orders - orders.filter(status="cancelled").count()
-        ds.fulfillment_rate_score = fulfilled / max(total_orders, 1)
-
-        # Customer rating: average of product reviews
-        avg_rating = Review.objects.filter(
-            product__user=designer.user, is_approved=True
-        ).aggregate(avg=Avg("rating"))["avg"] or 3.0
-        ds.customer_rating_score = (avg_rating - 1) / 4
-
-        # Responsiveness: designer reply time (mock if no messaging system yet)
-        ds.responsiveness_score = 0.7  # default until messaging is built
-
-        # Operational score
-        ds.operational_score = (
-            ds.delivery_speed_score * 0.3
-            + ds.fulfillment_rate_score * 0.3
-            + ds.customer_rating_score * 0.25
-            + ds.responsiveness_score * 0.15
-        )
-
-        # BHS - Sales Growth (MoM)
-        sales_this_month = OrderItem.objects.filter(
-            product__user=designer.user,
-            created_at__gte=last_30d,
-        ).count()
-        sales_last_month = OrderItem.objects.filter(
-            product__user=designer.user,
-            created_at__gte=last_60d,
-            created_at__lt=last_30d,
-        ).count()
-        if sales_last_month > 0:
-            ds.sales_growth_mom = (sales_this_month - sales_last_month) / sales_last_month
-        else:
-            ds.sales_growth_mom = 0
-
-        # Inventory stability (stockout rate inverse)
-        low_stock = sum(
-            1 for p in designer.products.all() if p.stock <= 3
-        )
-        total_products = designer.products.count()
-        ds.inventory_stability = 1 - (low_stock / max(total_products, 1))
-
-        # Content quality (media completeness)
-        products_with_media = sum(
-            1 for p in designer.products.all() if p.product.media.exists()
-        )
-        ds.content_quality = products_with_media / max(total_products, 1)
-
-        # BHS composite
-        ds.business_health_score = min(1.0, max(0.0, (
-            ds.sales_growth_mom * 0.3
-            + ds.inventory_stability * 0.25
-            + ds.content_quality * 0.25
-            + ds.operational_score * 0.2
-        )))
-
-        # Lifecycle stage
-        total_sales = OrderItem.objects.filter(
-            product__user=designer.user
-        ).count()
-        if total_sales < 10:
-            ds.lifecycle_stage = "new"
-        elif total_sales < 100:
-            ds.lifecycle_stage = "growing"
-        else:
-            ds.lifecycle_stage = "top"
-
-        # Apply penalty if expired
-        if ds.penalty_expires_at and now >= ds.penalty_expires_at:
-            ds.penalty_multiplier = 1.0
-            ds.penalty_reason = []
-            ds.penalty_expires_at = None
-
-        ds.computed_at = now
-        ds.save()
-        return ds
+        """Recompute one designer's scores through the batch path."""
+        BatchDesignerScoringEngine.run(designer_ids=[designer.id])
+        return DesignerScore.objects.get(designer=designer)
 
     @classmethod
     def apply_penalty(cls, designer: Designer, reason: str, severity: str = "medium"):
@@ -346,6 +511,202 @@ class DesignerIntelligenceEngine:
         return ds
 
 
+class BatchDesignerScoringEngine:
+    """
+    Set-based Designer Operational Score and BHS for every designer.
+
+    Orders, reviews, sales and catalogue health are read with one grouped
+    aggregate each (keyed by the designer's user, which is what products
+    and orders point at), combined with vectorised arithmetic and upserted
+    in bulk. The query count does not depend on the number of designers.
+    """
+
+    UPSERT_BATCH_SIZE = 1000
+    DELIVERY_SLA = timedelta(days=7)
+    RESPONSIVENESS_DEFAULT = 0.7  # until messaging is built
+    SCORE_FIELDS = [
+        "delivery_speed_score",
+        "fulfillment_rate_score",
+        "customer_rating_score",
+        "responsiveness_score",
+        "operational_score",
+        "sales_growth_mom",
+        "inventory_stability",
+        "content_quality",
+        "business_health_score",
+        "lifecycle_stage",
+        "computed_at",
+        "updated_at",
+    ]
+
+    @classmethod
+    def run(cls, designer_ids=None) -> Dict:
+        """
+        Score every designer (or only `designer_ids`) and write the results
+        back. Returns run stats: designers scored, query count and wall time.
+        """
+        with RunStats("designer_scores") as stats:
+            now = timezone.now()
+            designers = Designer.objects.all()
+            if designer_ids is not None:
+                designers = designers.filter(id__in=list(designer_ids))
+
+            columns = cls.compute_columns(designers, now)
+            scores = cls.combine(columns)
+            count = cls.write(columns["designer_id"], scores, now)
+
+            # Lift expired penalties (kept out of the upsert so a penalty
+            # applied mid-run is never overwritten)
+            DesignerScore.objects.filter(
+                designer__in=designers, penalty_expires_at__lte=now
+            ).update(penalty_multiplier=1.0, penalty_reason=[], penalty_expires_at=None)
+
+            stats.extra["designers_scored"] = count
+        return stats.as_dict()
+
+    @classmethod
+    def compute_columns(cls, designers, now) -> Dict:
+        """Run the grouped aggregates and return one array per raw signal."""
+        last_30d = now - timedelta(days=30)
+        last_60d = now - timedelta(days=60)
+
+        rows = list(designers.order_by().values_list("id", "user_id"))
+        size = len(rows)
+        designer_ids = [r[0] for r in rows]
+        by_user = {r[1]: i for i, r in enumerate(rows) if r[1] is not None}
+        by_designer = {r[0]: i for i, r in enumerate(rows)}
+
+        # Restrict every aggregate to the designers being scored
+        users = designers.order_by().values("user_id")
+
+        orders = _scatter(by_user, (
+            DesignerOrder.objects.filter(
+                order_item__product__user__in=users, created_at__gte=last_30d
+            )
+            .order_by()
+            .values("order_item__product__user_id")
+            .annotate(
+                total_orders=Count("id"),
+                on_time=Count("id", filter=Q(
+                    status="delivered",
+                    order_item__delivered_at__lte=F("created_at") + cls.DELIVERY_SLA,
+                )),
+                cancelled=Count("id", filter=Q(status="cancelled")),
+            )
+        ), "order_item__product__user_id", ["total_orders", "on_time", "cancelled"], size)
+
+        reviews = _scatter(by_user, (
+            Review.objects.filter(product__user__in=users, is_approved=True)
+            .order_by()
+            .values("product__user_id")
+            .annotate(review_count=Count("id"), avg_rating=Avg("rating"))
+        ), "product__user_id", ["review_count", "avg_rating"], size)
+
+        sales = _scatter(by_user, (
+            OrderItem.objects.filter(product__user__in=users)
+            .order_by()
+            .values("product__user_id")
+            .annotate(
+                total_sales=Count("id"),
+                sales_this_month=Count("id", filter=Q(created_at__gte=last_30d)),
+                sales_last_month=Count("id", filter=Q(
+                    created_at__gte=last_60d, created_at__lt=last_30d
+                )),
+            )
+        ), "product__user_id", ["total_sales", "sales_this_month", "sales_last_month"], size)
+
+        # Catalogue health; the media join fans out, hence distinct counts
+        catalogue = _scatter(by_designer, (
+            DesignerProduct.objects.filter(designer__in=designers)
+            .order_by()
+            .values("designer_id")
+            .annotate(
+                total_products=Count("id", distinct=True),
+                low_stock=Count("id", filter=Q(stock__lte=3), distinct=True),
+                with_media=Count(
+                    "id", filter=Q(product__media__isnull=False), distinct=True
+                ),
+            )
+        ), "designer_id", ["total_products", "low_stock", "with_media"], size)
+
+        return {
+            "designer_id": designer_ids,
+            **orders,
+            **reviews,
+            **sales,
+            **catalogue,
+        }
+
+    @classmethod
+    def combine(cls, c: Dict) -> Dict:
+        """Vectorised equivalent of the per-designer score formulas."""
+        total_orders = np.maximum(c["total_orders"], 1)
+        delivery = c["on_time"] / total_orders
+        fulfillment = (c["total_orders"] - c["cancelled"]) / total_orders
+
+        avg_rating = np.where(c["review_count"] > 0, c["avg_rating"], 3.0)
+        rating = (avg_rating - 1) / 4
+        responsiveness = np.full_like(delivery, cls.RESPONSIVENESS_DEFAULT)
+
+        operational = (
+            delivery * 0.3
+            + fulfillment * 0.3
+            + rating * 0.25
+            + responsiveness * 0.15
+        )
+
+        last_month = c["sales_last_month"]
+        growth = np.divide(
+            c["sales_this_month"] - last_month, last_month,
+            out=np.zeros_like(last_month), where=last_month > 0,
+        )
+        total_products = np.maximum(c["total_products"], 1)
+        inventory = 1 - c["low_stock"] / total_products
+        content = c["with_media"] / total_products
+
+        bhs = np.clip(
+            growth * 0.3 + inventory * 0.25 + content * 0.25 + operational * 0.2,
+            0.0, 1.0,
+        )
+        stage = np.where(
+            c["total_sales"] < 10, "new",
+            np.where(c["total_sales"] < 100, "growing", "top"),
+        )
+
+        return {
+            "delivery_speed_score": delivery,
+            "fulfillment_rate_score": fulfillment,
+            "customer_rating_score": rating,
+            "responsiveness_score": responsiveness,
+            "operational_score": operational,
+            "sales_growth_mom": growth,
+            "inventory_stability": inventory,
+            "content_quality": content,
+            "business_health_score": bhs,
+            "lifecycle_stage": stage,
+        }
+
+    @classmethod
+    def write(cls, designer_ids: List[str], scores: Dict, now) -> int:
+        """Upsert one DesignerScore row per designer."""
+        columns = {k: v.tolist() for k, v in scores.items()}
+        objs = [
+            DesignerScore(
+                designer_id=did,
+                computed_at=now,
+                updated_at=now,
+                **{k: columns[k][i] for k in columns},
+            )
+            for i, did in enumerate(designer_ids)
+        ]
+        DesignerScore.objects.bulk_create(
+            objs,
+            batch_size=cls.UPSERT_BATCH_SIZE,
+            **upsert_options(DesignerScore, ["designer"], cls.SCORE_FIELDS),
+        )
+        return len(objs)
+
+
 # =====================================================
 # 3. Trend Detection Engine
 # =====================================================
@@ -353,86 +714,118 @@ class DesignerIntelligenceEngine:
 class TrendDetectionEngine:
     """Detects trending products using velocity metrics."""
 
+    BASELINE_DAYS = 30
+    WINDOW_HOURS = 48
+    SNAPSHOT_EVENTS = {
+        "clicks": UserActivity.EventType.PRODUCT_CLICK,
+        "views": UserActivity.EventType.PRODUCT_VIEW,
+        "saves": UserActivity.EventType.WISHLIST_ADD,
+        "shares": UserActivity.EventType.SHARE,
+    }
+
     @classmethod
-    def compute_trend_score(cls, product: Product) -> float:
-        """Compare last 48h engagement to baseline (30-day average)."""
-        now = timezone.now()
-        window_48h = now - timedelta(hours=48)
-        baseline_start = now - timedelta(days=30)
-
-        # Current window
-        current_clicks = UserActivity.objects.filter(
-            product=product,
-            event_type=UserActivity.EventType.PRODUCT_CLICK,
-            created_at__gte=window_48h,
-        ).count()
-        current_purchases = OrderItem.objects.filter(
-            product=product, created_at__gte=window_48h
-        ).count()
-
-        # Baseline: average per 48h over last 30 days
-        total_days = 30
-        total_clicks = UserActivity.objects.filter(
-            product=product,
-            event_type=UserActivity.EventType.PRODUCT_CLICK,
-            created_at__gte=baseline_start,
-        ).count()
-        total_purchases = OrderItem.objects.filter(
-            product=product, created_at__gte=baseline_start
-        ).count()
-
-        baseline_clicks = total_clicks / max(total_days / 2, 1)
-        baseline_purchases = total_purchases / max(total_days / 2, 1)
-
-        # Velocity ratios
-        click_velocity = current_clicks / max(baseline_clicks, 1)
-        purchase_velocity = current_purchases / max(baseline_purchases, 1)
+    def velocity(cls, clicks_window, purchases_window, clicks_baseline, purchases_baseline):
+        """
+        Velocity ratio of the current window against the baseline average per
+        window. Works on scalars and on NumPy arrays alike.
+        """
+        windows = max(cls.BASELINE_DAYS * 24 / cls.WINDOW_HOURS, 1)
+        baseline_clicks = clicks_baseline / windows
+        baseline_purchases = purchases_baseline / windows
 
+        click_velocity = clicks_window / np.maximum(baseline_clicks, 1)
+        purchase_velocity = purchases_window / np.maximum(baseline_purchases, 1)
         return click_velocity * 0.6 + purchase_velocity * 0.4
 
     @classmethod
-    def take_hourly_snapshot(cls):
-        """Called every hour to capture engagement counts."""
-        now = timezone.now()
-        hour = now.replace(minute=0, second=0, microsecond=0)
-        last_hour = hour - timedelta(hours=1)
-
-        for product in Product.objects.filter(is_published=True):
-            clicks = UserActivity.objects.filter(
-                product=product,
-                event_type=UserActivity.EventType.PRODUCT_CLICK,
-                created_at__gte=last_hour,
-                created_at__lt=hour,
-            ).count()
-            views = UserActivity.objects.filter(
-                product=product,
-                event_type=UserActivity.EventType.PRODUCT_VIEW,
-                created_at__gte=last_hour,
-                created_at__lt=hour,
-            ).count()
-            saves = UserActivity.objects.filter(
-                product=product,
-                event_type=UserActivity.EventType.WISHLIST_ADD,
-                created_at__gte=last_hour,
-                created_at__lt=hour,
-            ).count()
-            purchases = OrderItem.objects.filter(
-                product=product, created_at__gte=last_hour, created_at__lt=hour
-            ).count()
-            shares = UserActivity.objects.filter(
-                product=product,
-                event_type=UserActivity.EventType.SHARE,
-                created_at__gte=last_hour,
-                created_at__lt=hour,
-            ).count()
-
-            ProductTrendSnapshot.objects.update_or_create(
-                product=product, hour=hour,
-                defaults={
-                    "clicks": clicks, "views": views, "saves": saves,
-                    "purchases": purchases, "shares": shares,
-                },
+    def snapshot_totals(cls, now=None):
+        """
+        Per-product click / purchase totals for the current window and the
+        baseline period, summed from the hourly snapshots.
+        """
+        now = now or timezone.now()
+        window_start = now - timedelta(hours=cls.WINDOW_HOURS)
+        baseline_start = now - timedelta(days=cls.BASELINE_DAYS)
+        in_window = Q(hour__gt=window_start)
+        return (
+            ProductTrendSnapshot.objects.filter(hour__gt=baseline_start)
+            .order_by()
+            .values("product_id")
+            .annotate(
+                clicks_window=Sum("clicks", filter=in_window),
+                purchases_window=Sum("purchases", filter=in_window),
+                clicks_baseline=Sum("clicks"),
+                purchases_baseline=Sum("purchases"),
             )
+        )
+
+    @classmethod
+    def compute_trend_score(cls, product: Product) -> float:
+        """Compare last 48h engagement to baseline (30-day average), from snapshots."""
+        rows = list(cls.snapshot_totals().filter(product_id=product.id))
+        totals = rows[0] if rows else {}
+        return float(cls.velocity(
+            totals.get("clicks_window") or 0,
+            totals.get("purchases_window") or 0,
+            totals.get("clicks_baseline") or 0,
+            totals.get("purchases_baseline") or 0,
+        ))
+
+    @classmethod
+    def take_hourly_snapshot(cls, hour=None) -> Dict:
+        """
+        Called every hour to capture engagement counts for the hour that just
+        ended. One conditional aggregate over UserActivity and one over
+        OrderItem build every snapshot; products with no activity are skipped
+        and rows are upserted in bulk, so a rerun for the same hour is safe.
+        """
+        with RunStats("trend_snapshots") as stats:
+            hour = (hour or timezone.now()).replace(minute=0, second=0, microsecond=0)
+            last_hour = hour - timedelta(hours=1)
+            in_hour = {"created_at__gte": last_hour, "created_at__lt": hour}
+
+            counts = {}
+            activity = (
+                UserActivity.objects.filter(
+                    product__is_published=True,
+                    event_type__in=list(cls.SNAPSHOT_EVENTS.values()),
+                    **in_hour,
+                )
+                .order_by()
+                .values("product_id")
+                .annotate(**{
+                    field: Count("id", filter=Q(event_type=event))
+                    for field, event in cls.SNAPSHOT_EVENTS.items()
+                })
+            )
+            for row in activity:
+                counts[row.pop("product_id")] = row
+
+            purchases = (
+                OrderItem.objects.filter(product__is_published=True, **in_hour)
+                .order_by()
+                .values("product_id")
+                .annotate(purchases=Count("id"))
+            )
+            for row in purchases:
+                counts.setdefault(row["product_id"], {})["purchases"] = row["purchases"]
+
+            snapshots = [
+                ProductTrendSnapshot(product_id=product_id, hour=hour, **row)
+                for product_id, row in counts.items()
+                if any(row.values())
+            ]
+            ProductTrendSnapshot.objects.bulk_create(
+                snapshots,
+                batch_size=1000,
+                **upsert_options(
+                    ProductTrendSnapshot,
+                    ["product", "hour"],
+                    [*cls.SNAPSHOT_EVENTS, "purchases", "updated_at"],
+                ),
+            )
+            stats.extra["snapshots"] = len(snapshots)
+        return stats.as_dict()
 
 
 # =====================================================
@@ -442,28 +835,38 @@ class TrendDetectionEngine:
 class SessionIntentEngine:
     """Real-time session intent scoring."""
 
+    # Action type -> SessionIntent counter it increments (besides total_actions)
+    ACTION_FIELDS = {
+        "click": "click_count",
+        "product_click": "click_count",
+        "add_to_cart": "add_to_cart_count",
+        "search": "search_count",
+        "depth_view": "product_depth_views",
+    }
+    COUNTER_FIELDS = [
+        "total_actions",
+        "click_count",
+        "add_to_cart_count",
+        "search_count",
+        "product_depth_views",
+    ]
+
     @classmethod
-    def record_action(cls, session_id: str, action_type: str, user=None):
-        si, _ = SessionIntent.objects.get_or_create(
-            session_id=session_id, defaults={"user": user}
-        )
-        si.total_actions += 1
-        si.click_count += 1 if action_type in ("click", "product_click") else 0
-        if action_type == "add_to_cart":
-            si.add_to_cart_count += 1
-        elif action_type == "search":
-            si.search_count += 1
-        elif action_type == "depth_view":
-            si.product_depth_views += 1
-        si.save()
-        cls.compute_intent(si)
-        return si
+    def record_action(cls, session_id: str, action_type: str, user=None) -> float:
+        """Count one action against the session's cached state; returns the new SIS."""
+        deltas = cls.aggregate_deltas([{
+            "session_id": session_id,
+            "event_type": action_type,
+            "user_id": user.pk if user is not None else None,
+        }])
+        return SessionIntentStore.apply(deltas)[session_id]["intent_score"]
 
     @classmethod
-    def compute_intent(cls, si: SessionIntent) -> float:
-        """Compute SIS from session signals."""
+    def score(cls, si: SessionIntent, now=None) -> float:
+        """SIS for a session's current counters (no database access)."""
+        now = now or timezone.now()
         duration_min = max(
-            (timezone.now() - si.first_action_at).total_seconds() / 60, 1
+            (now - si.first_action_at).total_seconds() / 60, 1
         )
         actions_per_min = si.total_actions / duration_min
 
@@ -474,10 +877,36 @@ class SessionIntentEngine:
         depth_weight = min(si.product_depth_views / max(si.total_actions, 1), 0.3)
 
         score = cart_freq * 0.4 + speed * 0.2 + search_weight + depth_weight
-        si.intent_score = min(1.0, max(0.0, score))
+        return min(1.0, max(0.0, score))
+
+    @classmethod
+    def compute_intent(cls, si: SessionIntent) -> float:
+        """Compute SIS from session signals."""
+        si.intent_score = cls.score(si)
         si.save(update_fields=["intent_score"])
         return si.intent_score
 
+    @classmethod
+    def aggregate_deltas(cls, events: List[Dict]) -> Dict[str, Dict]:
+        """Fold a batch of events into per-session counter deltas."""
+        deltas = {}
+        for event in events:
+            delta = deltas.setdefault(event["session_id"], {
+                "user_id": None, **{f: 0 for f in cls.COUNTER_FIELDS},
+            })
+            delta["total_actions"] += 1
+            field = cls.ACTION_FIELDS.get(event["event_type"])
+            if field:
+                delta[field] += 1
+            if event.get("user_id"):
+                delta["user_id"] = event["user_id"]
+        return deltas
+
+    @classmethod
+    def apply_deltas(cls, deltas: Dict[str, Dict]) -> int:
+        """Apply aggregated counter deltas for many sessions at once."""
+        return len(SessionIntentStore.apply(deltas))
+
     @classmethod
     def get_intent_level(cls, score: float) -> str:
         if score > 0.7:
@@ -487,6 +916,188 @@ class SessionIntentEngine:
         return "low"
 
 
+class SessionIntentStore:
+    """
+    Cache-resident session intent state.
+
+    Counters and the computed SIS live in the cache under one key per
+    session, with a sliding TTL renewed on every action. Feed requests read
+    the score from here only. Touched sessions are marked dirty (a Redis set
+    under django-redis, a process-local set otherwise) and checkpoint()
+    writes them to SessionIntent in one bulk upsert.
+
+    The APS job checkpoint_session_intents checkpoints the shared set every
+    minute. A process-local set can only be checkpointed by its own process
+    (its cache is local too), so it is written out whenever it reaches
+    LOCAL_DIRTY_LIMIT sessions.
+    """
+
+    KEY_PREFIX = "session_intent"
+    DIRTY_KEY = "algorithm:session_intent_dirty"
+    TTL = 60 * 60 * 2  # seconds since the session's last action
+    DEFAULT_SCORE = 0.5  # unknown sessions rank neutrally
+    CHECKPOINT_BATCH_SIZE = 500
+    LOCAL_DIRTY_LIMIT = 500
+    BACKGROUND_CHECKPOINT = True  # checkpoint a full local set on a worker thread
+    LOCK_TIMEOUT = 10  # seconds; a crashed holder's session lock expires after this
+
+    _dirty = set()
+    _lock = threading.Lock()
+    _checkpoint_lock = threading.Lock()
+
+    @classmethod
+    def _key(cls, session_id: str) -> str:
+        return f"{cls.KEY_PREFIX}:{session_id}"
+
+    @classmethod
+    def get_score(cls, session_id: str) -> float:
+        """SIS for a session, from the cache only."""
+        if not session_id:
+            return cls.DEFAULT_SCORE
+        state = cache.get(cls._key(session_id))
+        return state["intent_score"] if state else cls.DEFAULT_SCORE
+
+    @classmethod
+    def _model(cls, session_id: str, state: Dict) -> SessionIntent:
+        return SessionIntent(session_id=session_id, **state)
+
+    @classmethod
+    @contextmanager
+    def _locked(cls, session_ids):
+        """Hold the per-session locks (taken in sorted order, so no deadlock)."""
+        taken = []
+        try:
+            for sid in sorted(session_ids):
+                key = f"{cls._key(sid)}:lock"
+                while not cache.add(key, 1, cls.LOCK_TIMEOUT):
+                    time.sleep(0.005)
+                taken.append(key)
+            yield
+        finally:
+            cache.delete_many(taken)
+
+    @classmethod
+    def apply(cls, deltas: Dict[str, Dict]) -> Dict[str, Dict]:
+        """
+        Add per-session counter deltas (see SessionIntentEngine.aggregate_deltas)
+        and rescore. Sessions missing from the cache are reloaded from their
+        last checkpoint in one query. Returns the new state per session.
+
+        The read-modify-write runs under per-session locks, so concurrent
+        flushes and requests touching the same session do not lose counts.
+        """
+        if not deltas:
+            return {}
+        with cls._locked(deltas):
+            states = cls._apply(deltas)
+        cls._mark_dirty(list(deltas))
+        return states
+
+    @classmethod
+    def _apply(cls, deltas: Dict[str, Dict]) -> Dict[str, Dict]:
+        now = timezone.now()
+        keys = {sid: cls._key(sid) for sid in deltas}
+        cached = cache.get_many(list(keys.values()))
+        states = {sid: cached[key] for sid, key in keys.items() if key in cached}
+
+        missing = [sid for sid in deltas if sid not in states]
+        if missing:
+            for row in SessionIntent.objects.filter(session_id__in=missing).values(
+                "session_id", "user_id", "first_action_at", "intent_score",
+                *SessionIntentEngine.COUNTER_FIELDS,
+            ):
+                states[row.pop("session_id")] = row
+
+        for sid, delta in deltas.items():
+            state = states.setdefault(sid, {
+                "user_id": None,
+                "first_action_at": now,
+                **{f: 0 for f in SessionIntentEngine.COUNTER_FIELDS},
+            })
+            for field in SessionIntentEngine.COUNTER_FIELDS:
+                state[field] += delta[field]
+            state["user_id"] = delta["user_id"] or state["user_id"]
+            state["last_action_at"] = now
+            state["intent_score"] = SessionIntentEngine.score(cls._model(sid, state), now)
+
+        cache.set_many({keys[sid]: states[sid] for sid in deltas}, cls.TTL)
+        return {sid: states[sid] for sid in deltas}
+
+    @classmethod
+    def _mark_dirty(cls, session_ids: List[str]):
+        conn = _redis_connection()
+        if conn is not None:
+            try:
+                conn.sadd(cls.DIRTY_KEY, *session_ids)
+                return
+            except Exception:
+                pass  # Redis down → track in process
+        with cls._lock:
+            cls._dirty.update(session_ids)
+            full = len(cls._dirty) >= cls.LOCAL_DIRTY_LIMIT
+        if full:
+            cls._checkpoint_local()
+
+    @classmethod
+    def _checkpoint_local(cls):
+        if not cls.BACKGROUND_CHECKPOINT:
+            cls.checkpoint(local_only=True)
+        elif not cls._checkpoint_lock.locked():
+            threading.Thread(target=cls._checkpoint_in_thread, daemon=True).start()
+
+    @classmethod
+    def _checkpoint_in_thread(cls):
+        from django.db import connection as thread_connection
+        try:
+            cls.checkpoint(local_only=True)
+        except Exception:
+            logger.exception("Session intent checkpoint failed")
+        finally:
+            thread_connection.close()
+
+    @classmethod
+    def _pop_dirty(cls, limit: int, local_only: bool = False) -> List[str]:
+        with cls._lock:
+            session_ids = [cls._dirty.pop() for _ in range(min(limit, len(cls._dirty)))]
+        conn = None if local_only else _redis_connection()
+        if conn is not None and len(session_ids) < limit:
+            try:
+                popped = conn.spop(cls.DIRTY_KEY, limit - len(session_ids)) or []
+                session_ids.extend(
+                    sid.decode() if isinstance(sid, bytes) else sid for sid in popped
+                )
+            except Exception:
+                pass
+        return session_ids
+
+    @classmethod
+    def checkpoint(cls, local_only: bool = False) -> Dict:
+        """Persist every dirty session to SessionIntent."""
+        with cls._checkpoint_lock, RunStats("session_intent_checkpoint") as stats:
+            written = 0
+            while True:
+                session_ids = cls._pop_dirty(cls.CHECKPOINT_BATCH_SIZE, local_only=local_only)
+                if not session_ids:
+                    break
+                cached = cache.get_many([cls._key(sid) for sid in session_ids])
+                rows = [
+                    cls._model(sid, cached[cls._key(sid)])
+                    for sid in session_ids
+                    if cls._key(sid) in cached  # expired before checkpoint
+                ]
+                SessionIntent.objects.bulk_create(
+                    rows,
+                    batch_size=cls.CHECKPOINT_BATCH_SIZE,
+                    **upsert_options(SessionIntent, ["session_id"], [
+                        "user", "intent_score", "last_action_at",
+                        *SessionIntentEngine.COUNTER_FIELDS,
+                    ]),
+                )
+                written += len(rows)
+            stats.extra["sessions_written"] = written
+        return stats.as_dict()
+
+
 # =====================================================
 # 5. Personalisation Engine
 # =====================================================
@@ -529,74 +1140,372 @@ class PersonalisationEngine:
             return 0.5
         return sum(scores) / len(scores)
 
+    @staticmethod
+    def _affinity_vector(affinity: Dict, vocabulary: List[str]) -> np.ndarray:
+        """
+        Dense affinity vector aligned with `vocabulary`, capped at 1.0. One
+        extra zero slot is appended so a missing feature (index -1) scores 0.
+        """
+        vec = np.zeros(len(vocabulary) + 1, dtype=np.float64)
+        for i, key in enumerate(vocabulary):
+            vec[i] = affinity.get(key, 0)
+        return np.minimum(vec, 1.0)
+
+    @classmethod
+    def encode_profile(cls, profile: UserPreferenceProfile, categories: List[str], origins: List[str]) -> Dict:
+        """Encode a preference profile as dense vectors over the given vocabularies."""
+        price_mid = None
+        if profile.preferred_price_max and profile.preferred_price_min:
+            mid = float((profile.preferred_price_min + profile.preferred_price_max) / 2)
+            if mid > 0:
+                price_mid = mid
+        return {
+            "category": cls._affinity_vector(profile.category_affinity or {}, categories),
+            "has_category": bool(profile.category_affinity),
+            "origin": cls._affinity_vector(profile.cultural_affinity or {}, origins),
+            "has_origin": bool(profile.cultural_affinity),
+            "price_mid": price_mid,
+        }
+
+    @classmethod
+    def compute_matches(cls, features: Dict, user=None, profile: Optional[UserPreferenceProfile] = None) -> np.ndarray:
+        """
+        Vectorised compute_match over many candidates in one NumPy pass.
+
+        `features` holds aligned arrays `category_idx`, `origin_idx` (-1 when
+        missing) and `price` (0 when missing), plus the `categories` and
+        `origins` vocabularies the indices refer to (see CandidatePool.features).
+        """
+        size = len(features["price"])
+        if user is None or not user.is_authenticated:
+            return np.full(size, 0.5)  # neutral for guests
+
+        if profile is None:
+            try:
+                profile = UserPreferenceProfile.objects.get(user=user)
+            except UserPreferenceProfile.DoesNotExist:
+                return np.full(size, 0.5)
+
+        vectors = cls.encode_profile(profile, features["categories"], features["origins"])
+        total = np.zeros(size, dtype=np.float64)
+        count = np.zeros(size, dtype=np.float64)
+
+        # Style match (category affinity)
+        if vectors["has_category"]:
+            has = features["category_idx"] >= 0
+            total += np.where(has, vectors["category"][features["category_idx"]], 0.0)
+            count += has
+
+        # Price match
+        if vectors["price_mid"] is not None:
+            mid = vectors["price_mid"]
+            price = features["price"]
+            has = price > 0
+            total += np.where(has, np.maximum(0.0, 1 - np.abs(price - mid) / mid), 0.0)
+            count += has
+
+        # Culture match
+        if vectors["has_origin"]:
+            has = features["origin_idx"] >= 0
+            total += np.where(has, vectors["origin"][features["origin_idx"]], 0.0)
+            count += has
+
+        return np.where(count > 0, total / np.maximum(count, 1), 0.5)
+
+    PROFILE_WINDOW_DAYS = 90
+    PROFILE_CHUNK_SIZE = 500
+    PROFILE_FIELDS = [
+        "category_affinity",
+        "cultural_affinity",
+        "preferred_price_min",
+        "preferred_price_max",
+        "size_profile",
+        "sessions_per_week",
+        "last_computed_at",
+    ]
+
     @classmethod
     def recompute_profile(cls, user):
-        """Nightly batch: rebuild UserPreferenceProfile from activity history."""
-        profile, _ = UserPreferenceProfile.objects.get_or_create(user=user)
-        last_90d = timezone.now() - timedelta(days=90)
+        """Rebuild one user's UserPreferenceProfile from activity history."""
+        cls.recompute_profiles(user_ids=[user.pk], force=True)
+        return UserPreferenceProfile.objects.get(user=user)
 
-        activities = UserActivity.objects.filter(
-            user=user, created_at__gte=last_90d
-        )
+    @classmethod
+    def recompute_profiles(cls, user_ids=None, force: bool = False) -> Dict:
+        """
+        Nightly batch: rebuild UserPreferenceProfile for every active user with
+        activity newer than their profile (or all of `user_ids` with force).
 
-        # Category affinity
-        category_counts = {}
-        for a in activities.filter(product__isnull=False):
-            cat_id = str(a.product.category_id)
-            category_counts[cat_id] = category_counts.get(cat_id, 0) + 1
-        total = sum(category_counts.values()) or 1
-        profile.category_affinity = {
-            k: round(v / total, 3) for k, v in category_counts.items()
-        }
+        Users are processed in id-ordered chunks; each chunk costs a fixed
+        handful of grouped aggregates and one bulk write, independent of how
+        many activities or users it covers.
+        """
+        now = timezone.now()
+        since = now - timedelta(days=cls.PROFILE_WINDOW_DAYS)
 
-        # Price preference
-        purchases = activities.filter(
-            event_type=UserActivity.EventType.PURCHASE, product__isnull=False
-        )
-        prices = [float(a.product.price) for a in purchases if a.product.price]
-        if prices:
-            profile.preferred_price_min = min(prices)
-            profile.preferred_price_max = max(prices)
-
-        # Cultural affinity
-        origin_counts = {}
-        for a in activities.filter(product__origin__isnull=False):
-            origin_counts[a.product.origin] = origin_counts.get(a.product.origin, 0) + 1
-        total_origins = sum(origin_counts.values()) or 1
-        profile.cultural_affinity = {
-            k: round(v / total_origins, 3) for k, v in origin_counts.items()
-        }
+        with RunStats("profile_rebuild") as stats:
+            recent = UserActivity.objects.filter(
+                user__isnull=False, user__is_active=True, created_at__gte=since
+            )
+            if user_ids is not None:
+                recent = recent.filter(user_id__in=user_ids)
+            last_activity = dict(
+                recent.order_by().values_list("user_id").annotate(last=Max("created_at"))
+            )
+            if force and user_ids is not None:
+                for user_id in user_ids:
+                    last_activity.setdefault(user_id, None)
+
+            candidates = sorted(last_activity)
+            rebuilt = skipped = 0
+            for start in range(0, len(candidates), cls.PROFILE_CHUNK_SIZE):
+                chunk = candidates[start:start + cls.PROFILE_CHUNK_SIZE]
+                profiles = UserPreferenceProfile.objects.in_bulk(chunk, field_name="user_id")
+                stale = [
+                    user_id for user_id in chunk
+                    if force
+                    or user_id not in profiles
+                    or last_activity[user_id] > profiles[user_id].last_computed_at
+                ]
+                skipped += len(chunk) - len(stale)
+                if stale:
+                    rebuilt += cls._rebuild_chunk(stale, profiles, since, now)
+
+            stats.extra["profiles_recomputed"] = rebuilt
+            stats.extra["profiles_skipped"] = skipped
+        return stats.as_dict()
 
-        # Size profile
-        size_counts = {}
-        for a in activities.filter(
-            event_type=UserActivity.EventType.PURCHASE, metadata__size__isnull=False
+    @classmethod
+    def _rebuild_chunk(cls, user_ids, profiles, since, now) -> int:
+        activities = UserActivity.objects.filter(
+            user_id__in=user_ids, created_at__gte=since
+        ).order_by()
+        purchases = activities.filter(event_type=UserActivity.EventType.PURCHASE)
+
+        # Category + cultural affinity from one (user, category, origin) histogram
+        category_counts, origin_counts = {}, {}
+        for user_id, category_id, origin, n in (
+            activities.filter(product__isnull=False)
+            .values_list("user_id", "product__category_id", "product__origin")
+            .annotate(n=Count("id"))
         ):
-            size = a.metadata.get("size")
-            if size:
-                cat = str(a.product.category_id) if a.product else "all"
-                size_counts[cat] = size
-        profile.size_profile = size_counts
+            cats = category_counts.setdefault(user_id, {})
+            cats[str(category_id)] = cats.get(str(category_id), 0) + n
+            if origin is not None:
+                origins = origin_counts.setdefault(user_id, {})
+                origins[origin] = origins.get(origin, 0) + n
+
+        # Price band of purchased products
+        price_bands = {
+            user_id: (low, high)
+            for user_id, low, high in (
+                purchases.filter(product__price__gt=0)
+                .values_list("user_id")
+                .annotate(low=Min("product__price"), high=Max("product__price"))
+            )
+        }
 
-        # Engagement
-        from django.db.models import Count
-        sessions = (
-            activities.values("session_id")
-            .annotate(count=Count("id"))
-            .distinct()
+        # Most bought size per category (most recent wins ties)
+        size_profiles = {}
+        size_rows = (
+            purchases.filter(metadata__size__isnull=False)
+            .annotate(size=KeyTextTransform("size", "metadata"))
+            .values_list("user_id", "product__category_id", "size")
+            .annotate(n=Count("id"), last=Max("created_at"))
+        )
+        best = {}
+        for user_id, category_id, size, n, last in size_rows:
+            if not size:
+                continue
+            key = (user_id, str(category_id) if category_id else "all")
+            if key not in best or (n, last) > best[key][:2]:
+                best[key] = (n, last, size)
+        for (user_id, category), (_, _, size) in best.items():
+            size_profiles.setdefault(user_id, {})[category] = size
+
+        sessions = dict(
+            activities.values_list("user_id")
+            .annotate(n=Count("session_id", distinct=True))
         )
-        profile.sessions_per_week = len(sessions) / 12  # 90 days ≈ 12 weeks
-        profile.save()
-        return profile
+
+        to_create, to_update = [], []
+        for user_id in user_ids:
+            profile = profiles.get(user_id)
+            if profile is None:
+                profile = UserPreferenceProfile(user_id=user_id)
+                to_create.append(profile)
+            else:
+                to_update.append(profile)
+
+            cats = category_counts.get(user_id, {})
+            total = sum(cats.values()) or 1
+            profile.category_affinity = {k: round(v / total, 3) for k, v in cats.items()}
+
+            origins = origin_counts.get(user_id, {})
+            total_origins = sum(origins.values()) or 1
+            profile.cultural_affinity = {
+                k: round(v / total_origins, 3) for k, v in origins.items()
+            }
+
+            if user_id in price_bands:
+                profile.preferred_price_min, profile.preferred_price_max = price_bands[user_id]
+            profile.size_profile = size_profiles.get(user_id, {})
+            profile.sessions_per_week = sessions.get(user_id, 0) / 12  # 90 days ≈ 12 weeks
+            profile.last_computed_at = now
+
+        UserPreferenceProfile.objects.bulk_create(to_create, batch_size=cls.PROFILE_CHUNK_SIZE)
+        UserPreferenceProfile.objects.bulk_update(
+            to_update, cls.PROFILE_FIELDS, batch_size=cls.PROFILE_CHUNK_SIZE
+        )
+        return len(user_ids)
 
 
 # =====================================================
 # 6. Ranking Engine
 # =====================================================
 
+class CandidatePool:
+    """
+    Materialised, score-sorted feed candidates.
+
+    Rebuilt by the scoring job and kept in the shared cache; each worker
+    also keeps the last pool it loaded and only re-reads it when the
+    version stamp in cache changes. The pool is columnar: aligned NumPy
+    arrays (sorted by urbana_score) plus the vocabularies that the
+    category / origin / designer-country indices refer to, so the feed
+    can rerank without touching the database.
+    """
+
+    CACHE_KEY = "feed_candidate_pool"
+    VERSION_KEY = "feed_candidate_pool:version"
+    CACHE_TTL = 60 * 60 * 24  # 24 hours; refreshed by every full scoring run
+    LOCAL_TTL = 300  # how long a worker trusts its copy when Redis is down
+
+    _local = {"version": None, "pool": None, "loaded_at": 0.0}
+
+    @staticmethod
+    def _encode(values: List) -> tuple:
+        """Map values to vocabulary indices; None / "" become -1."""
+        vocabulary, index, codes = [], {}, []
+        for v in values:
+            if not v:
+                codes.append(-1)
+                continue
+            if v not in index:
+                index[v] = len(vocabulary)
+                vocabulary.append(v)
+            codes.append(index[v])
+        return vocabulary, np.array(codes, dtype=np.int32)
+
+    @classmethod
+    def build(cls) -> Dict:
+        """Load the pool in one query, ordered by urbana_score."""
+        now = timezone.now()
+        rows = list(
+            ProductScore.objects.filter(
+                product__is_published=True, product__is_active=True
+            )
+            .order_by("-urbana_score")
+            .values_list(
+                "product_id",
+                "product__category_id",
+                "product__price",
+                "product__origin",
+                "urbana_score",
+                "trend_score",
+                "is_trending",
+                "product__user__designer_profile__country",
+                "product__user__designer_profile__score__lifecycle_stage",
+                "product__user__designer_profile__score__penalty_multiplier",
+                "product__user__designer_profile__score__penalty_expires_at",
+            )
+        )
+
+        multipliers = []
+        for row in rows:
+            stage, penalty, penalty_expires_at = row[8], row[9], row[10]
+            # Designer lifecycle boost / penalty (see DesignerScore.is_penalized)
+            if stage == "new":
+                multipliers.append(1.2)
+            elif penalty is not None and penalty < 1.0 and penalty_expires_at and now < penalty_expires_at:
+                multipliers.append(penalty)
+            else:
+                multipliers.append(1.0)
+
+        categories, category_idx = cls._encode([r[1] for r in rows])
+        origins, origin_idx = cls._encode([r[3] for r in rows])
+        countries, country_idx = cls._encode([r[7] for r in rows])
+        return {
+            "ids": np.array([r[0] for r in rows], dtype=object),
+            "category_idx": category_idx,
+            "origin_idx": origin_idx,
+            "country_idx": country_idx,
+            "price": np.array([float(r[2] or 0) for r in rows], dtype=np.float64),
+            "urbana_score": np.array([r[4] for r in rows], dtype=np.float64),
+            "trend_score": np.array([r[5] for r in rows], dtype=np.float64),
+            "is_trending": np.array([r[6] for r in rows], dtype=bool),
+            "designer_multiplier": np.array(multipliers, dtype=np.float64),
+            "categories": categories,
+            "origins": origins,
+            "countries": countries,
+        }
+
+    @staticmethod
+    def features(pool: Dict, idx: np.ndarray) -> Dict:
+        """Personalisation features for the candidates at positions `idx`."""
+        return {
+            "category_idx": pool["category_idx"][idx],
+            "origin_idx": pool["origin_idx"][idx],
+            "price": pool["price"][idx],
+            "categories": pool["categories"],
+            "origins": pool["origins"],
+        }
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """Recompute the pool and publish it to the shared cache."""
+        pool = cls.build()
+        version = timezone.now().isoformat()
+        try:
+            cache.set(cls.CACHE_KEY, pool, cls.CACHE_TTL)
+            cache.set(cls.VERSION_KEY, version, cls.CACHE_TTL)
+        except Exception:
+            pass  # Redis down → this worker still serves its local copy
+        cls._local = {"version": version, "pool": pool, "loaded_at": time.monotonic()}
+        return len(pool["ids"])
+
+    @classmethod
+    def get(cls) -> Dict:
+        """Return the current pool, loading or rebuilding it if needed."""
+        try:
+            version = cache.get(cls.VERSION_KEY)
+        except Exception:
+            # Redis down → keep the local copy while it is fresh enough
+            fresh = time.monotonic() - cls._local["loaded_at"] < cls.LOCAL_TTL
+            version = cls._local["version"] if fresh else None
+
+        if version is not None and version == cls._local["version"]:
+            return cls._local["pool"]
+
+        pool = None
+        if version is not None:
+            try:
+                pool = cache.get(cls.CACHE_KEY)
+            except Exception:
+                pass
+        if pool is None:
+            cls.rebuild()
+            return cls._local["pool"]
+
+        cls._local = {"version": version, "pool": pool, "loaded_at": time.monotonic()}
+        return pool
+
+
 class RankingEngine:
     """Generates the final personalised feed."""
 
+    RERANK_TOP_K = 1000  # pool entries reranked per request
+
     @classmethod
     def get_feed(
         cls,
@@ -610,89 +1519,77 @@ class RankingEngine:
         """
         Return a ranked list of products for the feed.
         70-80% exploitation (high final score), 20-30% exploration (new/unseen).
+
+        Candidates come from the precomputed CandidatePool (already sorted by
+        urbana_score); only its top-K are reranked, in one vectorised pass, so
+        the cost of a request does not depend on catalogue size and no
+        per-product queries run.
         """
         config = AlgorithmConfig.get_active()
-        si = SessionIntent.objects.filter(session_id=session_id).first()
-        intent_score = si.intent_score if si else 0.5
+        intent_score = SessionIntentStore.get_score(session_id)
         intent_level = SessionIntentEngine.get_intent_level(intent_score)
 
-        # Base queryset
-        qs = Product.objects.filter(
-            is_published=True, is_active=True
-        ).select_related("category", "user")
+        pool = CandidatePool.get()
+        mask = np.ones(len(pool["ids"]), dtype=bool)
         if category_id:
-            qs = qs.filter(category_id=category_id)
+            if category_id in pool["categories"]:
+                mask &= pool["category_idx"] == pool["categories"].index(category_id)
+            else:
+                mask[:] = False
         if exclude_product_id:
-            qs = qs.exclude(id=exclude_product_id)
+            mask &= pool["ids"] != exclude_product_id
+        top_k = max(cls.RERANK_TOP_K, (offset + limit) * 4)
+        idx = np.flatnonzero(mask)[:top_k]
 
-        # Fetch scores
-        product_scores = {
-            ps.product_id: ps for ps in ProductScore.objects.filter(product__in=qs)
-        }
         profile = None
+        user_country = None
         if user and user.is_authenticated:
             try:
                 profile = UserPreferenceProfile.objects.get(user=user)
             except UserPreferenceProfile.DoesNotExist:
                 pass
+            # Geo factor (simple version: prefer same region)
+            user_country = Address.objects.filter(
+                customer__user=user, is_default=True
+            ).values_list("country", flat=True).first()
+
+        # Personalisation
+        personalisation = PersonalisationEngine.compute_matches(
+            CandidatePool.features(pool, idx), user, profile
+        )
 
-        # Geo factor (simple version: prefer same region)
-        geo_factor_map = {}
-        if user and hasattr(user, "customer_profile"):
-            user_country = user.customer_profile.addresses.filter(
-                is_default=True
-            ).first()
-            user_country = user_country.country if user_country else None
-            for p in qs:
-                designer_country = p.user.designer_profile.country if hasattr(p.user, "designer_profile") else None
-                if user_country and designer_country and user_country == designer_country:
-                    geo_factor_map[p.id] = 1.2
-                else:
-                    geo_factor_map[p.id] = 1.0
-
-        ranked = []
-        for product in qs:
-            ps = product_scores.get(product.id)
-            if not ps:
-                continue
-
-            # Base score
-            base_score = ps.urbana_score
-
-            # Personalisation
-            personalisation = PersonalisationEngine.compute_match(
-                product, user, profile
-            )
-
-            # Geo factor
-            geo = geo_factor_map.get(product.id, 1.0)
-
-            # Trend boost
-            trend = 1.0 + (ps.trend_score * 0.2) if ps.is_trending else 1.0
+        # Geo factor
+        country_idx = pool["country_idx"][idx]
+        if user_country and user_country in pool["countries"]:
+            geo = np.where(country_idx == pool["countries"].index(user_country), 1.2, 1.0)
+        else:
+            geo = np.ones(len(idx))
 
-            # Final score
-            final_score = base_score * personalisation * intent_score * geo * trend
+        # Trend boost
+        trend = np.where(
+            pool["is_trending"][idx], 1.0 + pool["trend_score"][idx] * 0.2, 1.0
+        )
 
-            # Designer lifecycle boost
-            try:
-                ds = DesignerScore.objects.get(designer=product.user.designer_profile)
-                if ds.lifecycle_stage == "new":
-                    final_score *= 1.2
-                elif ds.is_penalized():
-                    final_score *= ds.penalty_multiplier
-            except Exception:
-                pass
+        # Final score (designer lifecycle boost / penalty precomputed in pool)
+        urbana = pool["urbana_score"][idx]
+        final = (
+            urbana * personalisation * intent_score * geo * trend
+            * pool["designer_multiplier"][idx]
+        )
 
-            ranked.append({
-                "product": product,
-                "final_score": final_score,
-                "urbana_score": ps.urbana_score,
-                "is_trending": ps.is_trending,
+        # Sort by final score (stable, so ties keep urbana_score order)
+        order = np.argsort(-final, kind="stable")
+        ranked = [
+            {
+                "product_id": pool["ids"][idx[i]],
+                "final_score": float(final[i]),
+                "urbana_score": float(urbana[i]),
+                "personalisation": float(personalisation[i]),
+                "is_trending": bool(pool["is_trending"][idx[i]]),
                 "intent_level": intent_level,
-            })
-
-        # Sort by final score
-        ranked.sort(key=lambda x: x["final_score"], reverse=True)
+            }
+            for i in order
+        ]
 
         # Exploration: inject underexposed/new products
         exploitation_count = int(limit * (1 - config.exploration_ratio))
@@ -705,8 +1602,18 @@ class RankingEngine:
 
         # Interleave (exploitation first, then exploration)
         final_feed = exploited + explorers
+        page = final_feed[offset:offset + limit]
 
-        return final_feed[offset:offset + limit]
+        # One query for the page's products
+        products = Product.objects.select_related("category", "user").in_bulk(
+            [r["product_id"] for r in page]
+        )
+        feed = []
+        for r in page:
+            product = products.get(r.pop("product_id"))
+            if product is not None:
+                feed.append({"product": product, **r})
+        return feed
 
     @classmethod
     def get_trending(cls, limit: int = 20) -> List[Dict]:
@@ -715,3 +1622,279 @@ class RankingEngine:
             is_trending=True
         ).select_related("product").order_by("-trend_score")[:limit]
         return [{"product": t.product, "trend_score": t.trend_score} for t in trending]
+
+
+# =====================================================
+# 7. Event Ingestion
+# =====================================================
+
+class EventIngestionBuffer:
+    """
+    Write-behind buffer for tracked events.
+
+    TrackEventView only validates events and appends them here. Events are
+    kept in a Redis list when the cache is django-redis (shared by all
+    workers) and in a process-local deque otherwise (or while Redis is
+    down). A flush drains the buffer in chunks, writes each chunk with one
+    bulk_create and applies the session-intent deltas per session in one
+    update; post_save does not fire, so intent is not double counted.
+
+    Besides the size / age check on append, the APS job flush_event_buffer
+    drains the shared list, and a process with events in its local deque
+    flushes them FLUSH_INTERVAL later even if no further event arrives.
+
+    Events leave the buffer only once their chunk is written. A chunk of
+    the shared list is moved to PROCESSING_KEY (one flusher at a time,
+    under FLUSH_LOCK_KEY) and deleted after write() commits; a chunk left
+    there by a failed or killed flush is retried first. A failed local
+    chunk is pushed back onto the front of the deque.
+    """
+
+    REDIS_KEY = "algorithm:event_buffer"
+    PROCESSING_KEY = "algorithm:event_buffer:processing"
+    FLUSH_LOCK_KEY = "algorithm:event_buffer:lock"
+    FLUSH_LOCK_TIMEOUT = 300  # seconds; a flush of the whole backlog fits well inside
+    FLUSH_SIZE = 500  # flush once this many events are waiting
+    FLUSH_INTERVAL = 5  # seconds; flush older events on the next append
+    BACKGROUND_FLUSH = True  # flush on a worker thread instead of the request
+
+    _local = deque()
+    _lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    _last_flush = time.monotonic()
+    _local_timer = None
+
+    # ---------- validation ----------
+
+    @classmethod
+    def validate(cls, events, user=None, user_agent: str = "", ip_address=None):
+        """
+        Normalise raw request events. Returns (accepted, rejected_count);
+        accepted events are JSON-serialisable dicts.
+        """
+        if isinstance(events, dict):
+            events = [events]
+        if not isinstance(events, list):
+            return [], 1
+
+        try:
+            ip_address = str(ipaddress.ip_address(ip_address)) if ip_address else None
+        except ValueError:
+            ip_address = None
+
+        valid_types = set(UserActivity.EventType.values) | set(SessionIntentEngine.ACTION_FIELDS)
+        accepted, rejected = [], 0
+        for event in events:
+            if not isinstance(event, dict):
+                rejected += 1
+                continue
+            session_id = str(event.get("session_id") or "")
+            event_type = str(event.get("event_type") or "")
+            if not session_id or len(session_id) > 100 or event_type not in valid_types:
+                rejected += 1
+                continue
+            metadata = event.get("metadata")
+            metadata = metadata if isinstance(metadata, dict) else {}
+            # Older clients send the ids inside metadata
+            product_id = event.get("product_id") or metadata.get("product_id")
+            designer_id = event.get("designer_id") or metadata.get("designer_id")
+            accepted.append({
+                "session_id": session_id,
+                "event_type": event_type,
+                "product_id": str(product_id)[:50] if product_id else None,
+                "designer_id": str(designer_id)[:50] if designer_id else None,
+                "metadata": metadata,
+                "user_id": user.pk if user is not None else None,
+                "user_agent": user_agent or "",
+                "ip_address": ip_address,
+            })
+        return accepted, rejected
+
+    # ---------- buffering ----------
+
+    @classmethod
+    def append(cls, events: List[Dict]) -> int:
+        """Buffer validated events; returns how many are now waiting."""
+        if not events:
+            return 0
+        waiting = None
+        conn = _redis_connection()
+        if conn is not None:
+            try:
+                waiting = conn.rpush(cls.REDIS_KEY, *[json.dumps(e) for e in events])
+            except Exception:
+                waiting = None  # Redis down → keep events in process
+        if waiting is None:
+            with cls._lock:
+                cls._local.extend(events)
+                waiting = len(cls._local)
+            cls._arm_local_flush()
+
+        if waiting >= cls.FLUSH_SIZE or time.monotonic() - cls._last_flush >= cls.FLUSH_INTERVAL:
+            cls.request_flush()
+        return waiting
+
+    @classmethod
+    def _arm_local_flush(cls):
+        """Flush this process's deque FLUSH_INTERVAL from now; the APS job cannot reach it."""
+        if not cls.BACKGROUND_FLUSH:
+            return
+        with cls._lock:
+            if cls._local_timer is not None and cls._local_timer.is_alive():
+                return
+            cls._local_timer = threading.Timer(
+                cls.FLUSH_INTERVAL, cls._flush_in_thread, kwargs={"local_only": True}
+            )
+            cls._local_timer.daemon = True
+            cls._local_timer.start()
+
+    @classmethod
+    def request_flush(cls):
+        """Start a flush unless one is already running in this process."""
+        if not cls.BACKGROUND_FLUSH:
+            cls.flush()
+            return
+        if cls._flush_lock.locked():
+            return
+        threading.Thread(target=cls._flush_in_thread, daemon=True).start()
+
+    @classmethod
+    def _flush_in_thread(cls, local_only: bool = False):
+        from django.db import connection as thread_connection
+        try:
+            cls.flush(local_only=local_only)
+        except Exception:
+            logger.exception("Event buffer flush failed")
+        finally:
+            thread_connection.close()
+
+    @classmethod
+    def _claim(cls, conn, limit: int) -> List[Dict]:
+        """Next shared chunk, moved to PROCESSING_KEY until acknowledged."""
+        raw = conn.lrange(cls.PROCESSING_KEY, 0, -1)  # left by a failed flush
+        if not raw:
+            pipe = conn.pipeline(transaction=True)
+            for _ in range(limit):
+                pipe.lmove(cls.REDIS_KEY, cls.PROCESSING_KEY, "LEFT", "RIGHT")
+            raw = [item for item in pipe.execute() if item is not None]
+        return [json.loads(item) for item in raw]
+
+    # ---------- flushing ----------
+
+    @classmethod
+    def flush(cls, local_only: bool = False) -> Dict:
+        """Drain and persist everything buffered so far."""
+        with cls._flush_lock:
+            cls._last_flush = time.monotonic()
+            with RunStats("event_flush") as stats:
+                written = cls._flush_local()
+                if not local_only:
+                    written += cls._flush_shared()
+                stats.extra["events_written"] = written
+        return stats.as_dict()
+
+    @classmethod
+    def _flush_local(cls) -> int:
+        written = 0
+        while True:
+            with cls._lock:
+                events = [cls._local.popleft() for _ in range(min(len(cls._local), cls.FLUSH_SIZE))]
+            if not events:
+                return written
+            try:
+                written += cls.write(events)
+            except Exception:
+                with cls._lock:
+                    cls._local.extendleft(reversed(events))
+                raise
+
+    @classmethod
+    def _flush_shared(cls) -> int:
+        conn = _redis_connection()
+        if conn is None:
+            return 0
+        try:
+            lock = conn.lock(cls.FLUSH_LOCK_KEY, timeout=cls.FLUSH_LOCK_TIMEOUT)
+            if not lock.acquire(blocking=False):
+                return 0  # another process is flushing the shared list
+        except Exception:
+            return 0  # Redis down → retry on the next flush
+
+        written = 0
+        try:
+            while True:
+                events = cls._claim(conn, cls.FLUSH_SIZE)
+                if not events:
+                    return written
+                written += cls.write(events)
+                conn.delete(cls.PROCESSING_KEY)  # acknowledge the committed chunk
+        finally:
+            try:
+                lock.release()
+            except Exception:
+                pass  # expired; the next flusher retries the processing list
+
+    @classmethod
+    def write(cls, events: List[Dict]) -> int:
+        """Persist one chunk of events and its session-intent deltas."""
+        # Drop references to products / designers that do not exist
+        product_ids = {e["product_id"] for e in events if e["product_id"]}
+        designer_ids = {e["designer_id"] for e in events if e["designer_id"]}
+        if product_ids:
+            product_ids = set(
+                Product.objects.filter(id__in=product_ids).values_list("id", flat=True)
+            )
+        if designer_ids:
+            designer_ids = set(
+                Designer.objects.filter(id__in=designer_ids).values_list("id", flat=True)
+            )
+
+        with transaction.atomic():
+            UserActivity.objects.bulk_create(
+                [
+                    UserActivity(
+                        user_id=e["user_id"],
+                        session_id=e["session_id"],
+                        event_type=e["event_type"],
+                        product_id=e["product_id"] if e["product_id"] in product_ids else None,
+                        designer_id=e["designer_id"] if e["designer_id"] in designer_ids else None,
+                        metadata=e["metadata"],
+                        user_agent=e["user_agent"],
+                        ip_address=e["ip_address"],
+                    )
+                    for e in events
+                ],
+                batch_size=cls.FLUSH_SIZE,
+            )
+            # Product events also feed the designer analytics view counts
+            ProductView.objects.bulk_create(
+                [
+                    ProductView(
+                        product_id=e["product_id"],
+                        designer_id=e["designer_id"] if e["designer_id"] in designer_ids else None,
+                        session_id=e["session_id"],
+                        event_type=e["event_type"],
+                        source=str(e["metadata"].get("source") or "organic")[:50],
+                        metadata=e["metadata"],
+                    )
+                    for e in events
+                    if e["product_id"] in product_ids
+                ],
+                batch_size=cls.FLUSH_SIZE,
+            )
+            SessionIntentEngine.apply_deltas(SessionIntentEngine.aggregate_deltas(events))
+        return len(events)
+
+
+def checkpoint_session_intents() -> Dict:
+    """Scheduled job entry point."""
+    return SessionIntentStore.checkpoint()
+
+
+def flush_event_buffer() -> Dict:
+    """Scheduled job entry point (drains partly filled buffers)."""
+    return EventIngestionBuffer.flush()
+
+
+# Persist whatever this process still holds when it shuts down
+atexit.register(EventIngestionBuffer.flush, local_only=True)
@@ -30,16 +30,15 @@ def on_activity_save(sender, instance, created, **kwargs):
 @receiver(post_save, sender=OrderItem)
 def on_order_item_save(sender, instance, created, **kwargs):
     """Recompute product conversion + designer scores on purchase."""
-    if created and instance.product:
-        # Fire async task for heavy computation
+    if created and instance.product_id:
+        # Coalesced incremental rescore of the purchased product only
+        ProductScoringEngine.schedule_rescore(instance.product_id)
         try:
             from celery import current_app
-            current_app.send_task("apps.algorithm.tasks.compute_product_score", args=[instance.product_id])
             if instance.designer:
                 current_app.send_task("apps.algorithm.tasks.compute_designer_score", args=[instance.designer_id])
         except Exception:
-            # Fallback to synchronous if Celery not available
-            ProductScoringEngine._compute_conversion(instance.product)
+            pass
 
 
 @receiver(post_save, sender=ReturnRequest)
@@ -70,12 +69,8 @@ def on_return_save(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Review)
 def on_review_save(sender, instance, created, **kwargs):
     """Recompute product retention score on review."""
-    if created and instance.product:
-        try:
-            from celery import current_app
-            current_app.send_task("apps.algorithm.tasks.compute_product_score", args=[instance.product_id])
-        except Exception:
-            pass
+    if created and instance.product_id:
+        ProductScoringEngine.schedule_rescore(instance.product_id)
 
 
 @receiver(post_save, sender=DesignerOrder)
@@ -6,9 +6,13 @@ from celery import shared_task
 from django.utils import timezone
 
 from apps.algorithm.services import (
+    BatchDesignerScoringEngine,
+    BatchProductScoringEngine,
     DesignerIntelligenceEngine,
+    EventIngestionBuffer,
     PersonalisationEngine,
     ProductScoringEngine,
+    SessionIntentStore,
     TrendDetectionEngine,
 )
 from apps.algorithm.models import AlgorithmConfig, CategoryBalance
@@ -20,20 +24,19 @@ from apps.customers.models import OrderItem
 def compute_all_product_scores():
     """Nightly task: recompute Urbana Score for all products."""
     config = AlgorithmConfig.get_active()
-    count = ProductScoringEngine.compute_all(config=config)
-    return {"status": "ok", "products_scored": count}
+    stats = BatchProductScoringEngine.run(config=config)
+    return {"status": "ok", **stats}
 
 
 @shared_task
 def compute_product_score(product_id: str):
     """Incremental update for a single product."""
-    from apps.core.models import Product
-    try:
-        product = Product.objects.get(id=product_id)
-        ProductScoringEngine.compute_all()
-        return {"status": "ok", "product_id": product_id}
-    except Product.DoesNotExist:
+    # Release first so events arriving while we score queue another run
+    ProductScoringEngine.release_rescore(product_id)
+    stats = ProductScoringEngine.compute_product(product_id)
+    if not stats["products_scored"]:
         return {"status": "error", "detail": "Product not found"}
+    return {"status": "ok", "product_id": product_id, **stats}
 
 
 @shared_task
@@ -51,29 +54,36 @@ def compute_designer_score(designer_id: str):
 @shared_task
 def compute_all_designer_scores():
     """Nightly task: recompute all designer scores."""
-    DesignerIntelligenceEngine.compute_all()
-    return {"status": "ok"}
+    stats = BatchDesignerScoringEngine.run()
+    return {"status": "ok", **stats}
 
 
 @shared_task
 def take_trend_snapshots():
     """Hourly task: capture engagement snapshots for trend detection."""
-    TrendDetectionEngine.take_hourly_snapshot()
-    return {"status": "ok"}
+    stats = TrendDetectionEngine.take_hourly_snapshot()
+    return {"status": "ok", **stats}
+
+
+@shared_task
+def flush_event_buffer():
+    """Every few seconds: persist buffered tracking events."""
+    stats = EventIngestionBuffer.flush()
+    return {"status": "ok", **stats}
+
+
+@shared_task
+def checkpoint_session_intents():
+    """Every minute: persist cached session intent to SessionIntent."""
+    stats = SessionIntentStore.checkpoint()
+    return {"status": "ok", **stats}
 
 
 @shared_task
 def recompute_user_profiles():
-    """Nightly task: rebuild all user preference profiles."""
-    from apps.authentication.models import User
-    count = 0
-    for user in User.objects.filter(is_active=True):
-        try:
-            PersonalisationEngine.recompute_profile(user)
-            count += 1
-        except Exception:
-            continue
-    return {"status": "ok", "profiles_recomputed": count}
+    """Nightly task: rebuild preference profiles of users with new activity."""
+    stats = PersonalisationEngine.recompute_profiles()
+    return {"status": "ok", **stats}
 
 
 @shared_task
@@ -0,0 +1,753 @@
+"""
+Tests for apps.algorithm batch scoring.
+
+Tests cover:
+  - Batch Urbana Score components match the score formulas
+  - Query count of a batch run does not grow with catalogue size
+  - Incremental single-product rescoring and burst coalescing
+  - Feed ranking from the precomputed candidate pool
+  - Vectorised personalisation matches the per-product formula
+  - Hourly trend snapshots from grouped aggregates
+  - Write-behind buffered event ingestion and session intent deltas
+  - Cache-resident session intent with bulk checkpoints
+  - Bulk user preference profile rebuild
+  - Set-based designer scoring
+"""
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django_apscheduler.models import DjangoJob
+
+from apps.algorithm.models import (
+    AlgorithmConfig,
+    DesignerScore,
+    ProductScore,
+    ProductTrendSnapshot,
+    SessionIntent,
+    UserActivity,
+    UserPreferenceProfile,
+)
+from apps.algorithm.services import (
+    BatchDesignerScoringEngine,
+    BatchProductScoringEngine,
+    CandidatePool,
+    DesignerIntelligenceEngine,
+    EventIngestionBuffer,
+    PersonalisationEngine,
+    ProductScoringEngine,
+    RankingEngine,
+    SessionIntentEngine,
+    SessionIntentStore,
+    TrendDetectionEngine,
+    checkpoint_session_intents,
+    flush_event_buffer,
+    rescore_product,
+)
+from apps.aps.scheduler import build_scheduler
+from apps.core.models import Category, MediaAsset, Product, ProductView, Review
+from apps.customers.models import Customer, Order, OrderItem, ReturnRequest
+from apps.designers.models import Designer, DesignerOrder, DesignerProduct
+from apps.pay.models import Invoice
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+LOCMEM_CACHE = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+class AlgorithmFixtureMixin:
+    """Small marketplace: one designer, one customer, a few products."""
+
+    def make_user(self, name):
+        user = User.objects.create_user(
+            username=name, email=f"{name}@example.com", password="password123"
+        )
+        user.is_active = True
+        user.save(update_fields=["is_active"])
+        return user
+
+    def make_product(self, name, **kwargs):
+        defaults = {
+            "user": self.designer_user,
+            "name": name,
+            "description": name,
+            "price": 100,
+            "stock": 10,
+            "is_published": True,
+        }
+        defaults.update(kwargs)
+        return Product.objects.create(**defaults)
+
+    def setUp(self):
+        self.designer_user = self.make_user("designer")
+        self.designer = Designer.objects.create(
+            user=self.designer_user, brand_name="Brand", country="NG"
+        )
+        self.customer_user = self.make_user("customer")
+        self.customer = Customer.objects.create(user=self.customer_user)
+        self.invoice = Invoice.objects.create(user=self.customer_user, amount=100)
+        self.order = Order.objects.create(
+            customer=self.customer, invoice=self.invoice, total_amount=100
+        )
+
+    def add_activity(self, product, event_type, count=1, **kwargs):
+        for _ in range(count):
+            UserActivity.objects.create(
+                session_id="s1", event_type=event_type, product=product, **kwargs
+            )
+
+    def add_order_item(self, product, n):
+        return OrderItem.objects.create(
+            order=self.order, product=product, amount=100,
+            tracking_number=f"T-{product.id}-{n}",
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class BatchProductScoringTests(AlgorithmFixtureMixin, TestCase):
+
+    def test_batch_matches_score_formulas(self):
+        E = UserActivity.EventType
+        busy = self.make_product("Busy")
+        quiet = self.make_product("Quiet")
+
+        self.add_activity(busy, E.PRODUCT_VIEW, 10)
+        self.add_activity(busy, E.PRODUCT_CLICK, 4)
+        self.add_activity(busy, E.WISHLIST_ADD, 2)
+        self.add_activity(busy, E.TIME_ON_PRODUCT, metadata={"seconds": 30})
+        self.add_activity(busy, E.TIME_ON_PRODUCT, metadata={})
+        first = self.add_order_item(busy, 1)
+        self.add_order_item(busy, 2)
+        Review.objects.create(
+            product=busy, customer=self.customer, rating=4, is_approved=True
+        )
+        ReturnRequest.objects.create(
+            order_item=first, reason=ReturnRequest.Reason.WRONG_SIZE
+        )
+        TrendDetectionEngine.take_hourly_snapshot(hour=timezone.now() + timedelta(hours=1))
+
+        config = AlgorithmConfig.get_active()
+        stats = BatchProductScoringEngine.run(config=config)
+        self.assertEqual(stats["products_scored"], 2)
+
+        # (engagement, conversion, retention, fit confidence) by the score formulas:
+        # busy: CTR 0.4, save rate 0.2, 15s average time; 2 purchases / 4 clicks;
+        # rating 4, 1 return in 2 items, one repeat buyer; the return was a wrong size
+        expected = {busy: (0.27, 0.5, 0.5, 0.1), quiet: (0.0, 0.0, 0.6, 0.7)}
+        for product, scores in expected.items():
+            ps = ProductScore.objects.get(product=product)
+            for actual, wanted in zip(
+                (ps.engagement_score, ps.conversion_score, ps.retention_score, ps.fit_confidence), scores
+            ):
+                self.assertAlmostEqual(actual, wanted)
+            self.assertAlmostEqual(
+                ps.trend_score, TrendDetectionEngine.compute_trend_score(product)
+            )
+        self.assertGreater(ProductScore.objects.get(product=busy).trend_score, 0)
+
+    def test_rerun_updates_existing_rows(self):
+        product = self.make_product("Rerun")
+        BatchProductScoringEngine.run()
+        BatchProductScoringEngine.run()
+        self.assertEqual(ProductScore.objects.filter(product=product).count(), 1)
+
+    def test_query_count_independent_of_catalogue_size(self):
+        config = AlgorithmConfig.get_active()
+        for i in range(3):
+            self.make_product(f"Small {i}")
+        small = BatchProductScoringEngine.run(config=config)
+
+        for i in range(30):
+            self.make_product(f"Large {i}")
+        large = BatchProductScoringEngine.run(config=config)
+
+        self.assertEqual(large["products_scored"], 33)
+        self.assertEqual(small["queries"], large["queries"])
+
+    def test_unpublished_products_are_skipped(self):
+        self.make_product("Draft", is_published=False)
+        stats = BatchProductScoringEngine.run()
+        self.assertEqual(stats["products_scored"], 0)
+        self.assertFalse(ProductScore.objects.exists())
+
+    def test_old_products_lose_freshness(self):
+        product = self.make_product("Old")
+        Product.objects.filter(id=product.id).update(
+            created_at=timezone.now() - timedelta(days=60)
+        )
+        BatchProductScoringEngine.run()
+        ps = ProductScore.objects.get(product=product)
+        self.assertAlmostEqual(ps.freshness_score, max(0.3, 1.0 - 60 / 90))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class IncrementalProductScoringTests(AlgorithmFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_compute_product_rescores_only_that_product(self):
+        target = self.make_product("Target")
+        other = self.make_product("Other")
+        cache.set(f"product_score:{target.id}", 0.99)
+
+        stats = ProductScoringEngine.compute_product(target.id)
+
+        self.assertEqual(stats["products_scored"], 1)
+        self.assertTrue(ProductScore.objects.filter(product=target).exists())
+        self.assertFalse(ProductScore.objects.filter(product=other).exists())
+        self.assertIsNone(cache.get(f"product_score:{target.id}"))
+
+    def rescore_jobs(self, product):
+        return DjangoJob.objects.filter(id=f"rescore_product:{product.id}")
+
+    def test_burst_of_events_is_coalesced(self):
+        product = self.make_product("Burst")
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for n in range(5):
+                self.add_order_item(product, n)
+        rescores = [callback for callback in callbacks if callback.__qualname__.startswith("ProductScoringEngine.")]
+        self.assertEqual(len(rescores), 1)
+        self.assertEqual(self.rescore_jobs(product).count(), 1)
+
+    def test_events_in_separate_transactions_share_one_deferred_run(self):
+        product = self.make_product("Autocommit")
+        for n in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.add_order_item(product, n)
+
+        job = self.rescore_jobs(product).get()
+        self.assertGreater(job.next_run_time, timezone.now() + timedelta(seconds=20))
+        self.assertFalse(ProductScore.objects.filter(product=product).exists())  # deferred, not run inline
+
+        rescore_product(product.id)  # what the leader runs at next_run_time
+        self.assertTrue(ProductScore.objects.filter(product=product).exists())
+        job.delete()  # APS drops a one-shot job once it ran
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_order_item(product, 2)
+        self.assertTrue(self.rescore_jobs(product).exists())
+
+    def test_release_allows_next_rescore(self):
+        product = self.make_product("Released")
+        self.assertTrue(ProductScoringEngine.schedule_rescore(product.id))
+        self.assertFalse(ProductScoringEngine.schedule_rescore(product.id))
+        ProductScoringEngine.release_rescore(product.id)
+        self.assertTrue(ProductScoringEngine.schedule_rescore(product.id))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CandidatePoolFeedTests(AlgorithmFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.config = AlgorithmConfig.get_active()
+
+    def score(self, product, urbana_score):
+        ProductScore.objects.update_or_create(
+            product=product, defaults={"urbana_score": urbana_score}
+        )
+
+    def test_pool_is_sorted_by_score(self):
+        low, high = self.make_product("Low"), self.make_product("High")
+        self.score(low, 0.2)
+        self.score(high, 0.9)
+        CandidatePool.rebuild()
+        self.assertEqual(list(CandidatePool.get()["ids"]), [high.id, low.id])
+
+    def test_feed_ranks_from_pool(self):
+        low, high = self.make_product("Low"), self.make_product("High")
+        self.score(low, 0.5)
+        self.score(high, 0.9)
+        CandidatePool.rebuild()
+
+        feed = RankingEngine.get_feed(limit=10)
+        self.assertEqual([item["product"] for item in feed][:2], [high, low])
+
+        excluded = RankingEngine.get_feed(limit=10, exclude_product_id=high.id)
+        self.assertNotIn(high, [item["product"] for item in excluded])
+
+    def test_feed_query_count_independent_of_catalogue_size(self):
+        for i in range(3):
+            self.score(self.make_product(f"Small {i}"), 0.5)
+        CandidatePool.rebuild()
+        with self.assertNumQueries(2):
+            RankingEngine.get_feed(limit=10)
+
+        for i in range(30):
+            self.score(self.make_product(f"Large {i}"), 0.5)
+        CandidatePool.rebuild()
+        with self.assertNumQueries(2):
+            RankingEngine.get_feed(limit=10)
+
+    def test_full_scoring_run_refreshes_pool(self):
+        product = self.make_product("Fresh")
+        stats = BatchProductScoringEngine.run(config=self.config)
+        self.assertEqual(stats["feed_pool_size"], 1)
+        self.assertEqual(list(CandidatePool.get()["ids"]), [product.id])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class VectorisedPersonalisationTests(AlgorithmFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        shirts = Category.objects.create(name="Shirts", slug="shirts")
+        dresses = Category.objects.create(name="Dresses", slug="dresses")
+        self.products = [
+            self.make_product("A", category=shirts, origin="NG", price=80),
+            self.make_product("B", category=dresses, origin="GH", price=300),
+            self.make_product("C", category=None, origin="", price=120),
+            self.make_product("D", category=dresses, origin="KE", price=0),
+        ]
+        for i, product in enumerate(self.products):
+            ProductScore.objects.create(product=product, urbana_score=1 - i * 0.1)
+        self.profile = UserPreferenceProfile.objects.create(
+            user=self.customer_user,
+            category_affinity={shirts.id: 0.7, dresses.id: 0.3},
+            cultural_affinity={"NG": 0.6, "GH": 1.4},
+            preferred_price_min=50,
+            preferred_price_max=150,
+        )
+
+    def test_matches_per_product_formula(self):
+        pool = CandidatePool.build()
+        by_id = {p.id: p for p in self.products}
+        matches = PersonalisationEngine.compute_matches(
+            CandidatePool.features(pool, range(len(pool["ids"]))),
+            self.customer_user, self.profile,
+        )
+        for pid, score in zip(pool["ids"], matches):
+            expected = PersonalisationEngine.compute_match(
+                by_id[pid], self.customer_user, self.profile
+            )
+            self.assertAlmostEqual(score, expected)
+
+    def test_guests_get_neutral_scores(self):
+        pool = CandidatePool.build()
+        matches = PersonalisationEngine.compute_matches(
+            CandidatePool.features(pool, range(len(pool["ids"]))), None
+        )
+        self.assertTrue((matches == 0.5).all())
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TrendSnapshotTests(AlgorithmFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.hour = (timezone.now() + timedelta(hours=1)).replace(
+            minute=0, second=0, microsecond=0
+        )
+
+    def test_snapshot_counts_and_skips_idle_products(self):
+        E = UserActivity.EventType
+        active = self.make_product("Active")
+        self.make_product("Idle")
+        self.add_activity(active, E.PRODUCT_CLICK, 3)
+        self.add_activity(active, E.PRODUCT_VIEW, 5)
+        self.add_activity(active, E.SHARE)
+        self.add_order_item(active, 1)
+
+        stats = TrendDetectionEngine.take_hourly_snapshot(hour=self.hour)
+
+        self.assertEqual(stats["snapshots"], 1)
+        snap = ProductTrendSnapshot.objects.get(product=active, hour=self.hour)
+        self.assertEqual(
+            (snap.clicks, snap.views, snap.saves, snap.purchases, snap.shares),
+            (3, 5, 0, 1, 1),
+        )
+
+    def test_rerun_for_same_hour_updates_in_place(self):
+        product = self.make_product("Rerun")
+        self.add_activity(product, UserActivity.EventType.PRODUCT_CLICK)
+        TrendDetectionEngine.take_hourly_snapshot(hour=self.hour)
+        self.add_activity(product, UserActivity.EventType.PRODUCT_CLICK)
+        TrendDetectionEngine.take_hourly_snapshot(hour=self.hour)
+
+        snaps = ProductTrendSnapshot.objects.filter(product=product)
+        self.assertEqual(snaps.count(), 1)
+        self.assertEqual(snaps.get().clicks, 2)
+
+    def test_query_count_independent_of_catalogue_size(self):
+        for i in range(3):
+            self.add_activity(self.make_product(f"Small {i}"), UserActivity.EventType.PRODUCT_CLICK)
+        small = TrendDetectionEngine.take_hourly_snapshot(hour=self.hour)
+
+        for i in range(20):
+            self.add_activity(self.make_product(f"Large {i}"), UserActivity.EventType.PRODUCT_CLICK)
+        large = TrendDetectionEngine.take_hourly_snapshot(hour=self.hour)
+
+        self.assertEqual(large["snapshots"], 23)
+        self.assertEqual(small["queries"], large["queries"])
+
+    def test_trend_score_reads_snapshots(self):
+        product = self.make_product("Trending")
+        ProductTrendSnapshot.objects.create(
+            product=product, hour=timezone.now() - timedelta(hours=2), clicks=30
+        )
+        ProductTrendSnapshot.objects.create(
+            product=product, hour=timezone.now() - timedelta(days=10), clicks=15
+        )
+        # 30 clicks in window; baseline 45 clicks / 15 windows = 3 per window
+        self.assertAlmostEqual(
+            TrendDetectionEngine.compute_trend_score(product), 30 / 3 * 0.6
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+@mock.patch.object(EventIngestionBuffer, "BACKGROUND_FLUSH", False)
+@mock.patch.object(EventIngestionBuffer, "FLUSH_INTERVAL", 3600)
+@mock.patch.object(SessionIntentStore, "BACKGROUND_CHECKPOINT", False)
+class EventIngestionTests(AlgorithmFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        EventIngestionBuffer._local.clear()
+        SessionIntentStore._dirty.clear()
+        EventIngestionBuffer._last_flush = time.monotonic()
+        EventIngestionBuffer._local_timer = None
+        self.product = self.make_product("Tracked")
+
+    def event(self, session_id="s1", event_type="product_click", **kwargs):
+        return {"session_id": session_id, "event_type": event_type, **kwargs}
+
+    def test_post_only_buffers_events(self):
+        events = [self.event(product_id=self.product.id)] * 2
+        events.append(self.event(metadata={"product_id": self.product.id, "source": "feed"}))
+        response = APIClient().post("/core/track", events, format="json")
+        self.assertEqual(response.data["events_logged"], 3)
+        self.assertEqual(UserActivity.objects.count(), 0)
+
+        EventIngestionBuffer.flush()
+        self.assertEqual(UserActivity.objects.filter(product=self.product).count(), 3)
+        self.assertEqual(ProductView.objects.filter(product=self.product).count(), 3)
+        self.assertEqual(ProductView.objects.filter(source="feed").count(), 1)
+
+    def test_failed_write_keeps_local_events(self):
+        accepted, _ = EventIngestionBuffer.validate([self.event(), self.event("s2")])
+        EventIngestionBuffer.append(accepted)
+        with mock.patch.object(EventIngestionBuffer, "write", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                EventIngestionBuffer.flush()
+        self.assertEqual(list(EventIngestionBuffer._local), accepted)
+
+        self.assertEqual(EventIngestionBuffer.flush()["events_written"], 2)
+        self.assertEqual(UserActivity.objects.count(), 2)
+
+    def test_invalid_events_rejected(self):
+        events = [
+            self.event(),
+            self.event(session_id=""),
+            self.event(event_type="made_up"),
+            self.event(session_id="x" * 101),
+            "not-an-event",
+            self.event(product_id="missing", metadata="not-a-dict"),
+        ]
+        accepted, rejected = EventIngestionBuffer.validate(events, ip_address="not-an-ip")
+        self.assertEqual((len(accepted), rejected), (2, 4))
+        self.assertIsNone(accepted[0]["ip_address"])
+        self.assertEqual(accepted[1]["metadata"], {})
+
+        EventIngestionBuffer.write(accepted)
+        # Unknown product ids are dropped rather than failing the batch
+        self.assertEqual(UserActivity.objects.filter(product__isnull=True).count(), 2)
+
+    def test_session_intent_counted_once_per_event(self):
+        events = [
+            self.event("a", "product_click"),
+            self.event("a", "add_to_cart"),
+            self.event("a", "search"),
+            self.event("b", "depth_view"),
+        ]
+        accepted, _ = EventIngestionBuffer.validate(events, user=self.customer_user)
+        EventIngestionBuffer.write(accepted)
+        EventIngestionBuffer.write(accepted[:1])
+        SessionIntentStore.checkpoint()
+
+        a = SessionIntent.objects.get(session_id="a")
+        self.assertEqual(
+            (a.total_actions, a.click_count, a.add_to_cart_count, a.search_count),
+            (4, 2, 1, 1),
+        )
+        self.assertEqual(a.user, self.customer_user)
+        self.assertAlmostEqual(a.intent_score, SessionIntentEngine.score(a), places=2)
+        b = SessionIntent.objects.get(session_id="b")
+        self.assertEqual((b.total_actions, b.product_depth_views), (1, 1))
+
+    def test_scheduled_job_flushes_a_partial_buffer(self):
+        accepted, _ = EventIngestionBuffer.validate([self.event(product_id=self.product.id)] * 2)
+        self.assertEqual(EventIngestionBuffer.append(accepted), 2)  # far below FLUSH_SIZE
+        self.assertEqual(UserActivity.objects.count(), 0)
+
+        self.assertEqual(flush_event_buffer()["events_written"], 2)
+        self.assertEqual(UserActivity.objects.filter(product=self.product).count(), 2)
+        self.assertIn("flush_event_buffer_job", [job.id for job in build_scheduler().get_jobs()])
+
+    def test_local_buffer_flushes_without_further_events(self):
+        accepted, _ = EventIngestionBuffer.validate([self.event()])
+        with mock.patch.object(EventIngestionBuffer, "BACKGROUND_FLUSH", True), \
+                mock.patch("apps.algorithm.services.threading.Timer") as timer:
+            EventIngestionBuffer.append(accepted)
+            EventIngestionBuffer.append(accepted)
+        timer.assert_called_once_with(3600, EventIngestionBuffer._flush_in_thread, kwargs={"local_only": True})
+        timer.return_value.start.assert_called_once()
+
+    def test_query_count_independent_of_batch_size(self):
+        def flush(n):
+            events = [
+                self.event(f"s{i % 5}", product_id=self.product.id) for i in range(n)
+            ]
+            accepted, _ = EventIngestionBuffer.validate(events)
+            EventIngestionBuffer.append(accepted)
+            return EventIngestionBuffer.flush()
+
+        flush(5)  # first sight of the sessions loads their checkpoints
+        small, large = flush(5), flush(50)
+        self.assertEqual(large["events_written"], 50)
+        self.assertEqual(small["queries"], large["queries"])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+@mock.patch.object(SessionIntentStore, "BACKGROUND_CHECKPOINT", False)
+class SessionIntentStoreTests(AlgorithmFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        SessionIntentStore._dirty.clear()
+
+    def test_actions_update_cache_without_writes(self):
+        SessionIntentEngine.record_action("s1", "add_to_cart", user=self.customer_user)
+        with self.assertNumQueries(0):
+            score = SessionIntentEngine.record_action("s1", "add_to_cart")
+            self.assertEqual(SessionIntentStore.get_score("s1"), score)
+        self.assertGreater(score, 0)
+        self.assertFalse(SessionIntent.objects.exists())
+
+    def test_feed_reads_intent_from_cache_only(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(SessionIntentStore.get_score("unknown"), 0.5)
+
+    def test_checkpoint_persists_dirty_sessions(self):
+        for session_id in ("a", "b", "c"):
+            SessionIntentEngine.record_action(session_id, "search", user=self.customer_user)
+        SessionIntentEngine.record_action("a", "add_to_cart")
+
+        stats = SessionIntentStore.checkpoint()
+        self.assertEqual(stats["sessions_written"], 3)
+        a = SessionIntent.objects.get(session_id="a")
+        self.assertEqual((a.total_actions, a.search_count, a.add_to_cart_count), (2, 1, 1))
+        self.assertEqual(a.user, self.customer_user)
+        self.assertEqual(a.intent_score, SessionIntentStore.get_score("a"))
+
+        # Nothing dirty → nothing written
+        self.assertEqual(SessionIntentStore.checkpoint()["sessions_written"], 0)
+
+    def test_scheduled_checkpoint(self):
+        SessionIntentEngine.record_action("a", "search")
+        self.assertEqual(checkpoint_session_intents()["sessions_written"], 1)
+        self.assertTrue(SessionIntent.objects.filter(session_id="a").exists())
+        self.assertIn("checkpoint_session_intents_job", [job.id for job in build_scheduler().get_jobs()])
+
+    @mock.patch.object(SessionIntentStore, "LOCAL_DIRTY_LIMIT", 3)
+    def test_local_dirty_set_is_bounded(self):
+        for session_id in ("a", "b"):
+            SessionIntentEngine.record_action(session_id, "search")
+        self.assertEqual(len(SessionIntentStore._dirty), 2)
+
+        SessionIntentEngine.record_action("c", "search")
+        self.assertEqual(len(SessionIntentStore._dirty), 0)
+        self.assertEqual(SessionIntent.objects.count(), 3)
+
+    def test_concurrent_actions_are_not_lost(self):
+        SessionIntentEngine.record_action("a", "search")
+
+        def act():
+            for _ in range(25):
+                SessionIntentEngine.record_action("a", "search")
+
+        threads = [threading.Thread(target=act) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        state = cache.get(SessionIntentStore._key("a"))
+        self.assertEqual((state["total_actions"], state["search_count"]), (101, 101))
+        self.assertIsNone(cache.get(f"{SessionIntentStore._key('a')}:lock"))
+
+    def test_expired_session_resumes_from_checkpoint(self):
+        SessionIntentEngine.record_action("a", "search")
+        SessionIntentStore.checkpoint()
+        cache.clear()
+
+        SessionIntentEngine.record_action("a", "click")
+        SessionIntentStore.checkpoint()
+        a = SessionIntent.objects.get(session_id="a")
+        self.assertEqual((a.total_actions, a.search_count, a.click_count), (2, 1, 1))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class BulkProfileRebuildTests(AlgorithmFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.shirts = Category.objects.create(name="Shirts", slug="shirts")
+        self.dresses = Category.objects.create(name="Dresses", slug="dresses")
+        self.shirt = self.make_product("Shirt", category=self.shirts, origin="NG", price=80)
+        self.dress = self.make_product("Dress", category=self.dresses, origin="GH", price=300)
+
+    def act(self, user, product, event_type=UserActivity.EventType.PRODUCT_VIEW, session="s1", **kwargs):
+        UserActivity.objects.create(
+            user=user, session_id=session, event_type=event_type, product=product, **kwargs
+        )
+
+    def test_profile_built_from_grouped_aggregates(self):
+        user = self.customer_user
+        purchase = UserActivity.EventType.PURCHASE
+        self.act(user, self.shirt, session="a")
+        self.act(user, self.shirt, session="b")
+        self.act(user, self.dress, purchase, session="b", metadata={"size": "M"})
+        self.act(user, self.shirt, purchase, session="c", metadata={"size": "L"})
+        self.act(user, self.shirt, purchase, session="c", metadata={"size": "L"})
+        self.act(user, self.shirt, purchase, session="c", metadata={"size": "S"})
+
+        stats = PersonalisationEngine.recompute_profiles()
+        self.assertEqual(stats["profiles_recomputed"], 1)
+
+        profile = UserPreferenceProfile.objects.get(user=user)
+        self.assertEqual(profile.category_affinity, {
+            str(self.shirts.id): round(5 / 6, 3), str(self.dresses.id): round(1 / 6, 3),
+        })
+        self.assertEqual(profile.cultural_affinity, {"NG": round(5 / 6, 3), "GH": round(1 / 6, 3)})
+        self.assertEqual((profile.preferred_price_min, profile.preferred_price_max), (80, 300))
+        self.assertEqual(
+            profile.size_profile,
+            {str(self.shirts.id): "L", str(self.dresses.id): "M"},
+        )
+        self.assertAlmostEqual(profile.sessions_per_week, 3 / 12)
+
+    def test_users_without_new_activity_are_skipped(self):
+        other = self.make_user("other")
+        self.act(self.customer_user, self.shirt)
+        self.act(other, self.dress)
+        PersonalisationEngine.recompute_profiles()
+
+        self.act(other, self.shirt)
+        stats = PersonalisationEngine.recompute_profiles()
+        self.assertEqual((stats["profiles_recomputed"], stats["profiles_skipped"]), (1, 1))
+        self.assertEqual(len(UserPreferenceProfile.objects.get(user=other).category_affinity), 2)
+
+    def test_single_user_rebuild_without_activity(self):
+        profile = PersonalisationEngine.recompute_profile(self.customer_user)
+        self.assertEqual(profile.category_affinity, {})
+        self.assertEqual(profile.sessions_per_week, 0)
+
+    def test_query_count_independent_of_user_count(self):
+        def rebuild(n):
+            for i in range(n):
+                user = self.make_user(f"user{n}-{i}")
+                self.act(user, self.shirt, session=f"s{n}-{i}")
+                self.act(user, self.dress, UserActivity.EventType.PURCHASE, metadata={"size": "M"})
+            return PersonalisationEngine.recompute_profiles(force=True)
+
+        rebuild(1)  # so both runs update existing profiles and create new ones
+        small, large = rebuild(2), rebuild(20)
+        self.assertEqual(large["profiles_recomputed"], 23)
+        self.assertEqual(small["queries"], large["queries"])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class BatchDesignerScoringTests(AlgorithmFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        low = self.make_product("Low stock")
+        stocked = self.make_product("Stocked")
+        DesignerProduct.objects.create(designer=self.designer, product=low, stock=2)
+        DesignerProduct.objects.create(designer=self.designer, product=stocked, stock=10)
+        for name in ("front", "back"):
+            stocked.media.add(MediaAsset.objects.create(file=f"{name}.jpg"))
+
+        now = timezone.now()
+        statuses = ["delivered", "delivered", "cancelled", "pending"]
+        for n, order_status in enumerate(statuses):
+            item = self.add_order_item(stocked, n)
+            if order_status == "delivered":
+                item.delivered_at = now
+                item.save(update_fields=["delivered_at"])
+            DesignerOrder.objects.create(
+                user=self.designer_user, order_item=item, status=order_status
+            )
+        for n in range(2):
+            self.add_order_item(low, f"old-{n}")
+        OrderItem.objects.filter(product=low).update(created_at=now - timedelta(days=45))
+
+        for rating in (5, 3):
+            Review.objects.create(
+                product=stocked, customer=self.customer, rating=rating, is_approved=True
+            )
+
+        self.idle = Designer.objects.create(
+            user=self.make_user("idle"), brand_name="Idle", country="GH"
+        )
+
+    def test_batch_matches_designer_formulas(self):
+        stats = BatchDesignerScoringEngine.run()
+        self.assertEqual(stats["designers_scored"], 2)
+
+        ds = DesignerScore.objects.get(designer=self.designer)
+        operational = 0.5 * 0.3 + 0.75 * 0.3 + 0.75 * 0.25 + 0.7 * 0.15
+        self.assertAlmostEqual(ds.delivery_speed_score, 0.5)
+        self.assertAlmostEqual(ds.fulfillment_rate_score, 0.75)
+        self.assertAlmostEqual(ds.customer_rating_score, 0.75)
+        self.assertAlmostEqual(ds.operational_score, operational)
+        self.assertAlmostEqual(ds.sales_growth_mom, 1.0)
+        self.assertAlmostEqual(ds.inventory_stability, 0.5)
+        self.assertAlmostEqual(ds.content_quality, 0.5)
+        self.assertAlmostEqual(
+            ds.business_health_score, 0.3 + 0.125 + 0.125 + operational * 0.2
+        )
+        self.assertEqual(ds.lifecycle_stage, "new")
+
+        idle = DesignerScore.objects.get(designer=self.idle)
+        self.assertAlmostEqual(idle.operational_score, 0.5 * 0.25 + 0.7 * 0.15)
+        self.assertAlmostEqual(idle.inventory_stability, 1.0)
+        self.assertEqual(idle.content_quality, 0.0)
+
+    def test_expired_penalty_lifted_and_active_penalty_kept(self):
+        DesignerIntelligenceEngine.apply_penalty(self.designer, "returns", "high")
+        DesignerIntelligenceEngine.apply_penalty(self.idle, "returns", "low")
+        DesignerScore.objects.filter(designer=self.idle).update(
+            penalty_expires_at=timezone.now() - timedelta(days=1)
+        )
+        DesignerIntelligenceEngine.compute_all()
+
+        self.assertEqual(DesignerScore.objects.get(designer=self.designer).penalty_multiplier, 0.4)
+        idle = DesignerScore.objects.get(designer=self.idle)
+        self.assertEqual((idle.penalty_multiplier, idle.penalty_reason), (1.0, []))
+
+    def test_compute_designer_touches_only_its_row(self):
+        ds = DesignerIntelligenceEngine.compute_designer(self.idle)
+        self.assertEqual(ds.designer, self.idle)
+        self.assertFalse(DesignerScore.objects.filter(designer=self.designer).exists())
+
+    def test_query_count_independent_of_designer_count(self):
+        small = BatchDesignerScoringEngine.run()
+        for i in range(10):
+            user = self.make_user(f"designer{i}")
+            designer = Designer.objects.create(user=user, brand_name=f"B{i}", country="NG")
+            product = self.make_product(f"P{i}", user=user)
+            DesignerProduct.objects.create(designer=designer, product=product, stock=i)
+        large = BatchDesignerScoringEngine.run()
+        self.assertEqual(large["designers_scored"], 12)
+        self.assertEqual(small["queries"], large["queries"])
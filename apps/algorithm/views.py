@@ -15,16 +15,17 @@ from apps.algorithm.models import (
     AnomalyLog,
     CategoryBalance,
     ProductScore,
-    SessionIntent,
     UserActivity,
     UserPreferenceProfile,
 )
 from apps.algorithm.services import (
     DesignerIntelligenceEngine,
+    EventIngestionBuffer,
     PersonalisationEngine,
     ProductScoringEngine,
     RankingEngine,
     SessionIntentEngine,
+    SessionIntentStore,
     TrendDetectionEngine,
 )
 from apps.core.models import Product
@@ -40,37 +41,20 @@ class TrackEventView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
-        events = request.data
-        if isinstance(events, dict):
-            events = [events]
-
-        created = 0
-        for event in events:
-            user = request.user if request.user.is_authenticated else None
-            session_id = event.get("session_id", "")
-            if not session_id:
-                continue
-
-            activity = UserActivity.objects.create(
-                user=user,
-                session_id=session_id,
-                event_type=event.get("event_type", ""),
-                product_id=event.get("product_id") or None,
-                designer_id=event.get("designer_id") or None,
-                metadata=event.get("metadata", {}),
-                user_agent=request.META.get("HTTP_USER_AGENT", ""),
-                ip_address=self._get_client_ip(request),
-            )
-            created += 1
-
-            # Real-time session intent update
-            SessionIntentEngine.record_action(
-                session_id=session_id,
-                action_type=event.get("event_type", ""),
-                user=user,
-            )
-
-        return Response({"status": "ok", "events_logged": created})
+        user = request.user if request.user.is_authenticated else None
+        accepted, rejected = EventIngestionBuffer.validate(
+            request.data,
+            user=user,
+            user_agent=request.META.get("HTTP_USER_AGENT", ""),
+            ip_address=self._get_client_ip(request),
+        )
+        # Persisted (with session intent) by the write-behind flush
+        EventIngestionBuffer.append(accepted)
+        return Response({
+            "status": "ok",
+            "events_logged": len(accepted),
+            "events_rejected": rejected,
+        })
 
     def _get_client_ip(self, request):
         xff = request.META.get("HTTP_X_FORWARDED_FOR")
@@ -121,11 +105,7 @@ class FeedView(APIView):
             results.append(serialized)
 
         # Return session intent for frontend adaptation
-        intent = 0.5
-        if session_id:
-            si = SessionIntent.objects.filter(session_id=session_id).first()
-            if si:
-                intent = si.intent_score
+        intent = SessionIntentStore.get_score(session_id)
 
         return Response({
             "results": results,
@@ -185,9 +165,7 @@ class RecommendationsView(APIView):
         for item, serialized in zip(feed, serializer.data):
             serialized["_ranking"] = {
                 "final_score": round(item["final_score"], 4),
-                "personalisation": round(
-                    item["final_score"] / max(item["urbana_score"], 0.001), 2
-                ),
+                "personalisation": round(item["personalisation"], 2),
             }
             results.append(serialized)
 
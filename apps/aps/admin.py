@@ -1,3 +1,8 @@
 from django.contrib import admin
 
+from apps.aps.models import JobRunStat, SchedulerLease
+
 # Register your models here.
+
+
+admin.site.register([JobRunStat, SchedulerLease])
@@ -9,11 +9,17 @@ class ApsConfig(AppConfig):
 
     def ready(self):
         import threading
+        from django.conf import settings
 
-        # Skip commands that shouldn’t start the scheduler
-        if any(cmd in sys.argv for cmd in ["migrate", "makemigrations", "collectstatic", "shell", "test"]):
+        # Skip commands that shouldn’t start the scheduler (run_scheduler runs it itself)
+        if any(cmd in sys.argv for cmd in ["migrate", "makemigrations", "collectstatic", "shell", "test", "run_scheduler"]):
             return
-        logger.info("Starting APScheduler (DjangoJobStore)")
+        # Jobs run in the `manage.py run_scheduler` process; web workers only
+        # join the election when APS_AUTOSTART=True (single-process setups)
+        if not settings.APS_AUTOSTART:
+            return
+        # Every worker joins the leader election; only the leader runs jobs
+        logger.info("Starting APScheduler (DjangoJobStore, leader elected)")
         threading.Thread(target=self._start_scheduler, daemon=True).start()
 
     def _start_scheduler(self):
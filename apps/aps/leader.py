@@ -0,0 +1,55 @@
+"""
+Leader election for the APS scheduler.
+
+Every Django process that boots may try to run the scheduler, but only the
+holder of the SchedulerLease row runs jobs. The lease is a single row taken
+and renewed with conditional UPDATEs, so whichever process wins the row is
+the leader until it stops renewing; after LEASE_SECONDS without a renewal
+(crash, deploy, network partition) any other process may take it over.
+"""
+import logging
+import os
+import socket
+import uuid
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLease:
+    LEASE_SECONDS = 60
+    RENEW_SECONDS = 15  # well inside the lease, so one slow renewal is not fatal
+
+    def __init__(self, name="aps-scheduler", holder=None):
+        self.name = name
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def acquire(self) -> bool:
+        """Take or renew the lease. True while this process is the leader."""
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=self.LEASE_SECONDS)
+        leases = SchedulerLease.objects.filter(name=self.name)
+
+        if leases.filter(holder=self.holder).update(expires_at=expires_at):
+            return True
+        if leases.filter(expires_at__lte=now).update(holder=self.holder, expires_at=expires_at, acquired_at=now):
+            logger.info("[aps] %s took over expired lease %s", self.holder, self.name)
+            return True
+        try:
+            with transaction.atomic():
+                SchedulerLease.objects.create(
+                    name=self.name, holder=self.holder, expires_at=expires_at, acquired_at=now,
+                )
+        except IntegrityError:
+            return False  # held by someone else
+        logger.info("[aps] %s acquired lease %s", self.holder, self.name)
+        return True
+
+    def release(self) -> None:
+        """Give the lease up so another process can take over immediately."""
+        SchedulerLease.objects.filter(name=self.name, holder=self.holder).update(expires_at=timezone.now())
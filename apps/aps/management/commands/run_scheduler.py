@@ -0,0 +1,31 @@
+"""
+Run the APS jobs in a dedicated process.
+
+Usage:
+    python manage.py run_scheduler
+
+Several copies may run (one per host for failover); only the holder of the
+scheduler lease runs jobs. Web workers stay out of the election unless
+APS_AUTOSTART=True.
+"""
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Run the APS scheduler on this process while it holds the leader lease"
+
+    def handle(self, *args, **options):
+        from apps.aps.leader import LeaderLease
+        from apps.aps.scheduler import SchedulerRunner
+
+        stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+
+        runner = SchedulerRunner(LeaderLease())
+        self.stdout.write(f"Scheduler candidate {runner.lease.holder} (renewing every {runner.lease.RENEW_SECONDS}s)")
+        runner.run(stop)
+        self.stdout.write(self.style.SUCCESS("Scheduler stopped, lease released."))
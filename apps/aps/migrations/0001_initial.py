@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobRunStat',
+            fields=[
+                ('job_id', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('runs', models.PositiveIntegerField(default=0)),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('missed', models.PositiveIntegerField(default=0)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_status', models.CharField(blank=True, max_length=10)),
+                ('last_lag', models.FloatField(default=0)),
+                ('last_duration', models.FloatField(default=0)),
+                ('max_lag', models.FloatField(default=0)),
+                ('max_duration', models.FloatField(default=0)),
+                ('total_duration', models.FloatField(default=0)),
+            ],
+            options={
+                'db_table': 'aps_job_run_stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='SchedulerLease',
+            fields=[
+                ('name', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('holder', models.CharField(max_length=128)),
+                ('expires_at', models.DateTimeField()),
+                ('acquired_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'aps_scheduler_lease',
+            },
+        ),
+    ]
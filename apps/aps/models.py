@@ -1,3 +1,47 @@
 from django.db import models
 
-# Create your models here.
+
+class SchedulerLease(models.Model):
+    """
+    Leader lease for the APS scheduler. Whichever process holds an
+    unexpired lease runs the jobs; see apps.aps.leader.
+    """
+    name = models.CharField(max_length=64, primary_key=True)
+    holder = models.CharField(max_length=128)
+    expires_at = models.DateTimeField()
+    acquired_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "aps_scheduler_lease"
+
+    def __str__(self):
+        return f"{self.name} ({self.holder} until {self.expires_at})"
+
+
+class JobRunStat(models.Model):
+    """
+    Per-job run counters. Lag is how late a run started after its scheduled
+    time, duration how long it took; both in seconds.
+    """
+    job_id = models.CharField(max_length=255, primary_key=True)
+    runs = models.PositiveIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)
+    missed = models.PositiveIntegerField(default=0)
+
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_status = models.CharField(max_length=10, blank=True)
+    last_lag = models.FloatField(default=0)
+    last_duration = models.FloatField(default=0)
+    max_lag = models.FloatField(default=0)
+    max_duration = models.FloatField(default=0)
+    total_duration = models.FloatField(default=0)
+
+    class Meta:
+        db_table = "aps_job_run_stats"
+
+    def __str__(self):
+        return self.job_id
+
+    @property
+    def average_duration(self):
+        return self.total_duration / self.runs if self.runs else 0
@@ -1,9 +1,16 @@
-# apps/pay/scheduler.py
+# apps/aps/scheduler.py
 
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
+from apscheduler.jobstores.base import ConflictingIdError
 from apscheduler.schedulers.background import BackgroundScheduler
 from django.conf import settings
-from django_apscheduler.jobstores import DjangoJobStore, register_events
+from django.db import close_old_connections
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django_apscheduler.jobstores import DjangoJobStore
 import logging
+import threading
 
 from .tasks import (
     auto_release_escrows_after_24hrs,
@@ -12,13 +19,169 @@ from .tasks import (
     send_delayed_customer_emails,
     send_delayed_designer_emails,
 )
+from .leader import LeaderLease
+from .models import JobRunStat
 
 logger = logging.getLogger(__name__)
 
 
-def start():
+class JobMetrics:
+    """
+    Scheduler listener recording per-job lag (submitted vs scheduled time)
+    and duration into JobRunStat.
+    """
+
+    def __init__(self):
+        self._submitted = {}
+        self._lock = threading.Lock()
+
+    def listen(self, scheduler):
+        scheduler.add_listener(
+            self, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED
+        )
+
+    def __call__(self, event):
+        try:
+            if event.code == EVENT_JOB_SUBMITTED:
+                with self._lock:
+                    for run_time in event.scheduled_run_times:
+                        self._submitted[(event.job_id, run_time)] = timezone.now()
+            elif event.code == EVENT_JOB_MISSED:
+                self._stat(event.job_id).update(missed=F("missed") + 1)
+            else:
+                with self._lock:
+                    started = self._submitted.pop((event.job_id, event.scheduled_run_time), None)
+                finished = timezone.now()
+                started = started or finished
+                self.record(
+                    event.job_id,
+                    failed=event.code == EVENT_JOB_ERROR,
+                    started=started,
+                    lag=max((started - event.scheduled_run_time).total_seconds(), 0),
+                    duration=(finished - started).total_seconds(),
+                )
+        except Exception:
+            logger.exception("[aps] could not record metrics for %s", event.job_id)
+        finally:
+            close_old_connections()
+
+    @staticmethod
+    def _stat(job_id):
+        JobRunStat.objects.get_or_create(job_id=job_id)
+        return JobRunStat.objects.filter(job_id=job_id)
+
+    @classmethod
+    def record(cls, job_id, failed, started, lag, duration):
+        cls._stat(job_id).update(
+            runs=F("runs") + 1,
+            failures=F("failures") + int(failed),
+            last_run_at=started,
+            last_status="error" if failed else "success",
+            last_lag=lag,
+            last_duration=duration,
+            max_lag=Greatest("max_lag", Value(lag)),
+            max_duration=Greatest("max_duration", Value(duration)),
+            total_duration=F("total_duration") + duration,
+        )
+        logger.info("[aps] %s %s in %.2fs (lag %.2fs)", job_id, "failed" if failed else "ran", duration, lag)
+
+
+class SchedulerRunner:
+    """
+    Runs the scheduler only while holding the leader lease. step() renews
+    (or tries to win) the lease and starts / stops the scheduler to match;
+    run() repeats it every RENEW_SECONDS until `stop` is set.
+
+    A job already running when the lease is lost finishes on its own; the
+    jobs claim their rows (select_for_update), so an overlapping run on the
+    new leader does not settle anything twice.
+    """
+
+    def __init__(self, lease=None):
+        self.lease = lease or LeaderLease()
+        self.scheduler = None
+
+    def step(self) -> bool:
+        close_old_connections()
+        try:
+            leader = self.lease.acquire()
+        except Exception:
+            logger.exception("[aps] lease renewal failed")
+            leader = False
+
+        if leader and self.scheduler is None:
+            self.scheduler = build_scheduler()
+            self.scheduler.start()
+            logger.info("[aps] %s is the scheduler leader", self.lease.holder)
+        elif leader:
+            # Pick up one-shot jobs other processes added to the store (schedule_once)
+            self.scheduler.wakeup()
+        elif not leader and self.scheduler is not None:
+            logger.warning("[aps] %s lost the scheduler lease, stopping jobs", self.lease.holder)
+            self._stop_scheduler()
+        return leader
+
+    def run(self, stop):
+        try:
+            while not stop.is_set():
+                self.step()
+                stop.wait(self.lease.RENEW_SECONDS)
+        finally:
+            self._stop_scheduler()
+            try:
+                self.lease.release()
+            except Exception:
+                logger.exception("[aps] could not release the scheduler lease")
+
+    def _stop_scheduler(self):
+        if self.scheduler is not None:
+            self.scheduler.shutdown(wait=False)
+            self.scheduler = None
+
+
+_submitter = None
+_submitter_lock = threading.Lock()
+
+
+def schedule_once(func, run_at, job_id, args=()) -> bool:
+    """
+    Store a one-shot job for the leader to run at `run_at`; callable from
+    any process. Returns False when a job with this id is still pending.
+    """
+    global _submitter
+    with _submitter_lock:
+        if _submitter is None:
+            # Paused for good: it only writes jobs to the shared store
+            _submitter = BackgroundScheduler(timezone=settings.TIME_ZONE)
+            _submitter.add_jobstore(DjangoJobStore(), "default")
+            _submitter.start(paused=True)
+    try:
+        _submitter.add_job(
+            func,
+            trigger="date",
+            run_date=run_at,
+            id=job_id,
+            args=list(args),
+            misfire_grace_time=None,  # the leader may wake up to RENEW_SECONDS late
+        )
+    except ConflictingIdError:
+        return False
+    return True
+
+
+def start(stop=None):
+    """Block, running the jobs whenever this process is the elected leader."""
+    SchedulerRunner().run(stop or threading.Event())
+
+
+def build_scheduler():
+    # Jobs from other apps are referenced by dotted path, so importing this
+    # module (every process does, for schedule_once) loads none of them
+    from apps.pay.services.fx import ExchangeRateService
+
     scheduler = BackgroundScheduler(timezone=settings.TIME_ZONE)
     scheduler.add_jobstore(DjangoJobStore(), "default")
+    JobMetrics().listen(scheduler)
 
     if settings.ENV == "dev":
         interval_minutes = 1
@@ -89,7 +252,111 @@ def start():
         coalesce=True,
     )
 
-    register_events(scheduler)
-    scheduler.start()
+    # -------------------------------------------------------
+    # FX rate tables (loaded once now so requests never hit the API)
+    # -------------------------------------------------------
+    scheduler.add_job(
+        "apps.pay.services.fx:refresh_exchange_rates",
+        trigger="interval",
+        minutes=ExchangeRateService.REFRESH_INTERVAL_MINUTES,
+        id="refresh_exchange_rates_job",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        next_run_time=timezone.now(),
+    )
+
+    # -------------------------------------------------------
+    # Shipping lane table (stale / missing grid points)
+    # -------------------------------------------------------
+    scheduler.add_job(
+        "apps.designers.shipping_quotes:warm_shipping_quotes",
+        trigger="interval",
+        minutes=30,
+        id="warm_shipping_quotes_job",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        next_run_time=timezone.now(),
+    )
+
+    # -------------------------------------------------------
+    # Precomputed price table (picks up FX / shipping changes)
+    # -------------------------------------------------------
+    scheduler.add_job(
+        "apps.pay.services.pricing:rebuild_price_table",
+        trigger="interval",
+        minutes=15,
+        id="rebuild_price_table_job",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # -------------------------------------------------------
+    # Product embeddings + vector index for AI semantic search
+    # -------------------------------------------------------
+    scheduler.add_job(
+        "apps.core.embeddings:refresh_product_embeddings",
+        trigger="interval",
+        minutes=60,
+        id="refresh_product_embeddings_job",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # -------------------------------------------------------
+    # Tracked events waiting in the ingestion buffer
+    # -------------------------------------------------------
+    scheduler.add_job(
+        "apps.algorithm.services:flush_event_buffer",
+        trigger="interval",
+        seconds=30,
+        id="flush_event_buffer_job",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # -------------------------------------------------------
+    # Cache-resident session intent -> SessionIntent rows
+    # -------------------------------------------------------
+    scheduler.add_job(
+        "apps.algorithm.services:checkpoint_session_intents",
+        trigger="interval",
+        minutes=1,
+        id="checkpoint_session_intents_job",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # -------------------------------------------------------
+    # Executive dashboard daily metrics (stale days)
+    # -------------------------------------------------------
+    scheduler.add_job(
+        "apps.administrator.metrics:refresh_daily_metrics",
+        trigger="interval",
+        minutes=interval_minutes,
+        id="refresh_daily_metrics_job",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # -------------------------------------------------------
+    # Executive dashboard daily metrics (nightly reconciler)
+    # -------------------------------------------------------
+    scheduler.add_job(
+        "apps.administrator.metrics:reconcile_daily_metrics",
+        trigger="cron",
+        hour=2,
+        minute=30,
+        id="reconcile_daily_metrics_job",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
 
-    logger.info("Escrow & email scheduler started successfully.")
\ No newline at end of file
+    return scheduler
\ No newline at end of file
@@ -1,3 +1,106 @@
+"""
+Tests for the APS scheduler leader election and job metrics.
+
+Tests cover:
+  - Only one lease holder at a time; takeover after expiry or release
+  - Only the leader starts the scheduler; losing the lease stops it
+  - Per-job lag / duration recorded from scheduler events
+"""
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from apscheduler.events import (
+    EVENT_JOB_ERROR,
+    EVENT_JOB_EXECUTED,
+    EVENT_JOB_SUBMITTED,
+    JobExecutionEvent,
+    JobSubmissionEvent,
+)
 from django.test import TestCase
+from django.utils import timezone
+
+from apps.aps.leader import LeaderLease
+from apps.aps.models import JobRunStat, SchedulerLease
+from apps.aps.scheduler import JobMetrics, SchedulerRunner
+
+
+class LeaderLeaseTests(TestCase):
+
+    def setUp(self):
+        self.web1 = LeaderLease(holder="web-1")
+        self.web2 = LeaderLease(holder="web-2")
+
+    def expire(self):
+        SchedulerLease.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_single_holder(self):
+        self.assertTrue(self.web1.acquire())
+        self.assertFalse(self.web2.acquire())
+        self.assertTrue(self.web1.acquire())  # renewal
+        self.assertEqual(SchedulerLease.objects.get().holder, "web-1")
+
+    def test_takeover_after_expiry(self):
+        self.web1.acquire()
+        self.expire()
+        self.assertTrue(self.web2.acquire())
+        self.assertFalse(self.web1.acquire())  # a late renewal does not steal it back
+
+    def test_release_hands_over(self):
+        self.web1.acquire()
+        self.web1.release()
+        self.assertTrue(self.web2.acquire())
+
+
+@patch("apps.aps.scheduler.build_scheduler")
+class SchedulerRunnerTests(TestCase):
+
+    def test_only_the_leader_runs_jobs(self, build_scheduler):
+        leader = SchedulerRunner(LeaderLease(holder="web-1"))
+        follower = SchedulerRunner(LeaderLease(holder="web-2"))
+
+        self.assertTrue(leader.step())
+        self.assertFalse(follower.step())
+        self.assertTrue(leader.step())
+        self.assertEqual(build_scheduler.call_count, 1)
+        build_scheduler.return_value.start.assert_called_once()
+        build_scheduler.return_value.wakeup.assert_called_once()  # renewal picks up schedule_once jobs
+        self.assertIsNone(follower.scheduler)
+
+    def test_losing_the_lease_stops_the_scheduler(self, build_scheduler):
+        runner = SchedulerRunner(LeaderLease(holder="web-1"))
+        runner.step()
+        SchedulerLease.objects.update(holder="web-2")
+
+        self.assertFalse(runner.step())
+        build_scheduler.return_value.shutdown.assert_called_once_with(wait=False)
+        self.assertIsNone(runner.scheduler)
+
+
+class JobMetricsTests(TestCase):
+
+    def run_job(self, metrics, code, scheduled, submitted, finished):
+        with patch("apps.aps.scheduler.timezone.now", return_value=submitted):
+            metrics(JobSubmissionEvent(EVENT_JOB_SUBMITTED, "create_escrows_job", "default", [scheduled]))
+        with patch("apps.aps.scheduler.timezone.now", return_value=finished):
+            metrics(JobExecutionEvent(code, "create_escrows_job", "default", scheduled))
+
+    def test_records_lag_and_duration(self):
+        metrics = JobMetrics()
+        scheduled = timezone.now()
+        self.run_job(metrics, EVENT_JOB_EXECUTED, scheduled,
+                     scheduled + timedelta(seconds=2), scheduled + timedelta(seconds=7))
+        self.run_job(metrics, EVENT_JOB_ERROR, scheduled + timedelta(minutes=1),
+                     scheduled + timedelta(minutes=1, seconds=1), scheduled + timedelta(minutes=1, seconds=2))
+
+        stat = JobRunStat.objects.get(job_id="create_escrows_job")
+        self.assertEqual((stat.runs, stat.failures, stat.last_status), (2, 1, "error"))
+        self.assertEqual((stat.last_lag, stat.last_duration), (1.0, 1.0))
+        self.assertEqual((stat.max_lag, stat.max_duration), (2.0, 5.0))
+        self.assertEqual(stat.average_duration, 3.0)
 
-# Create your tests here.
+    def test_listens_to_job_events(self):
+        scheduler = MagicMock()
+        metrics = JobMetrics()
+        metrics.listen(scheduler)
+        scheduler.add_listener.assert_called_once()
+        self.assertIs(scheduler.add_listener.call_args.args[0], metrics)
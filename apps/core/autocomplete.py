@@ -0,0 +1,328 @@
+"""
+In-memory autocomplete for SearchSuggestions.
+
+Each process keeps a sorted array of the terms found in published product
+names, brands, categories and designer brands, a posting set per term and
+a ready-to-serve payload (thumbnail included) per product. A keystroke is a
+binary search over the term array plus a popularity-ordered top-k; answers
+are memoised per query until the index next changes. The request path
+never touches the database once the index is loaded.
+
+The index stays current three ways:
+  - product/media signals patch it in-process (brand, category and
+    designer renames are re-indexed by a one-shot job, which patches the
+    index of the process running it);
+  - every REFRESH_SECONDS a background thread pulls products updated since
+    the last pull (changes saved by other processes);
+  - every REBUILD_SECONDS it is rebuilt from scratch (deletes, bulk updates).
+"""
+import bisect
+import functools
+import heapq
+import logging
+import threading
+import time
+
+from django.db import connection
+
+from apps.core.search import ProductSearchIndex, tokenize
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=8192)
+def _shared_terms(text):
+    """Tokens of brand/category/designer names, which repeat across products."""
+    return tuple(tokenize(text))
+
+
+class AutocompleteIndex:
+    LIMIT = 6
+    REFRESH_SECONDS = 30
+    REBUILD_SECONDS = 15 * 60
+    MAX_CACHED_QUERIES = 5000
+    BACKGROUND_REFRESH = True  # pull other processes' changes on a worker thread
+    # Product.values() paths whose tokens are completed
+    SOURCE_PATHS = (
+        "name",
+        "brand__name",
+        "category__name",
+        "subcategory__name",
+        "user__designer_profile__brand_name",
+    )
+    # Product fields whose change alters a suggestion
+    PRODUCT_FIELDS = frozenset({
+        "name", "slug", "price", "popularity_score", "is_published", "is_admin_published",
+        "is_active", "brand", "brand_id", "category", "category_id", "subcategory",
+        "subcategory_id", "user", "user_id",
+    })
+
+    def __init__(self):
+        self._terms = []        # sorted unique terms
+        self._postings = {}     # term -> set(product id)
+        self._leaders = {}      # term -> its LIMIT best (-popularity, name, product id), sorted
+        self._entries = {}      # product id -> (-popularity, name, slug, price, thumbnail, terms)
+        self._results = {}      # query tokens -> [product id, ...]
+        self._loaded = False
+        self._built_at = 0.0
+        self._refreshed_at = 0.0
+        self._watermark = None  # newest Product.updated_at seen
+        self._lock = threading.RLock()
+        self._refreshing = threading.Lock()
+
+    # ---------- reads ----------
+
+    def suggest(self, query, limit=None) -> list:
+        """Suggestion payloads for `query` (at most LIMIT), most popular first."""
+        limit = min(limit or self.LIMIT, self.LIMIT)
+        tokens = tuple(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        if not self._ensure_loaded():
+            return self._suggest_from_db(query, limit)
+
+        with self._lock:
+            ids = self._results.get(tokens)
+            if ids is None:
+                ids = self._top(tokens, self.LIMIT)
+                if len(self._results) >= self.MAX_CACHED_QUERIES:
+                    self._results.clear()
+                self._results[tokens] = ids
+            entries = [(pk, self._entries[pk]) for pk in ids[:limit]]
+        return [self._payload(pk, entry) for pk, entry in entries]
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _payload(pk, entry):
+        _, name, slug, price, thumbnail, _ = entry
+        return {"id": pk, "name": name, "slug": slug, "price": price, "thumbnail": thumbnail}
+
+    def _suggest_from_db(self, query, limit):
+        """Keyword-index answer used while this process is still loading."""
+        from apps.core.models import Product
+
+        ids = list(
+            ProductSearchIndex.search(
+                Product.objects.filter(is_published=True, is_admin_published=True, is_active=True),
+                query,
+            ).values_list("pk", flat=True)[:limit]
+        )
+        rows = {row["id"]: row for row in self._load_rows(product_ids=ids)}
+        return [self._payload(pk, self._entry(rows[pk])) for pk in ids if pk in rows]
+
+    def _top(self, tokens, k):
+        if len(tokens) == 1:
+            # A product in the top k for the prefix is in the top k of one of
+            # its terms, so merging the per-term leaders is exact.
+            lo, hi = self._range(tokens[0])
+            ids = []
+            for *_, pk in heapq.merge(*(self._leaders[term] for term in self._terms[lo:hi])):
+                if pk not in ids:
+                    ids.append(pk)
+                    if len(ids) == k:
+                        break
+            return ids
+
+        # Drive from the token with the fewest candidates, check the rest
+        candidates = sorted((self._matching(token) for token in tokens), key=len)
+        ids = candidates[0]
+        for other in candidates[1:]:
+            ids = ids & other
+        # Most popular first, then by name as the old name-ordered listing
+        return [
+            pk for *_, pk in heapq.nsmallest(
+                k, ((*self._entries[pk][:2], pk) for pk in ids)
+            )
+        ]
+
+    def _range(self, prefix):
+        """Slice of the term array starting with `prefix`."""
+        lo = bisect.bisect_left(self._terms, prefix)
+        return lo, bisect.bisect_left(self._terms, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo)
+
+    def _matching(self, prefix) -> set:
+        lo, hi = self._range(prefix)
+        if hi - lo == 1:
+            return self._postings[self._terms[lo]]
+        ids = set()
+        for term in self._terms[lo:hi]:
+            ids |= self._postings[term]
+        return ids
+
+    # ---------- updates ----------
+
+    def upsert(self, rows) -> None:
+        """Add or replace products from _load_rows() rows; drop ineligible ones."""
+        with self._lock:
+            for row in rows:
+                self._remove(row["id"])
+                if row["eligible"]:
+                    self._add(row)
+            self._results.clear()
+
+    def remove(self, product_ids) -> None:
+        with self._lock:
+            for pk in product_ids:
+                self._remove(pk)
+            self._results.clear()
+
+    @classmethod
+    def _entry(cls, row):
+        terms = set(tokenize(row["name"]))
+        for path in cls.SOURCE_PATHS[1:]:
+            terms.update(_shared_terms(row[path]))
+        return (
+            -(row["popularity_score"] or 0),
+            row["name"],
+            row["slug"],
+            str(row["price"]),
+            row["thumbnail"],
+            tuple(terms),
+        )
+
+    def _add(self, row):
+        pk = row["id"]
+        entry = self._entries[pk] = self._entry(row)
+        key = (*entry[:2], pk)
+        for term in entry[-1]:
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = set()
+                self._leaders[term] = []
+                bisect.insort(self._terms, term)
+            posting.add(pk)
+            leaders = self._leaders[term]
+            if len(leaders) < self.LIMIT or key < leaders[-1]:
+                bisect.insort(leaders, key)
+                del leaders[self.LIMIT:]
+
+    def _remove(self, pk):
+        entry = self._entries.pop(pk, None)
+        if entry is None:
+            return
+        for term in entry[-1]:
+            posting = self._postings[term]
+            posting.discard(pk)
+            if not posting:
+                del self._postings[term]
+                del self._leaders[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+            elif any(key[-1] == pk for key in self._leaders[term]):
+                self._leaders[term] = heapq.nsmallest(
+                    self.LIMIT, ((*self._entries[other][:2], other) for other in posting)
+                )
+
+    # ---------- loading ----------
+
+    def _ensure_loaded(self) -> bool:
+        """Start a load/refresh when due; False until the first load is done."""
+        if not self.BACKGROUND_REFRESH:
+            if not self._loaded:
+                self.rebuild()
+            return True
+        if (
+            time.monotonic() - self._refreshed_at >= self.REFRESH_SECONDS
+            and not self._refreshing.locked()
+        ):
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+        return self._loaded
+
+    def _refresh_in_background(self):
+        if not self._refreshing.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() - self._built_at >= self.REBUILD_SECONDS:
+                self.rebuild()
+            else:
+                self.refresh()
+        except Exception:
+            logger.exception("[autocomplete] background refresh failed")
+        finally:
+            self._refreshing.release()
+            connection.close()
+
+    def rebuild(self) -> int:
+        """Load every eligible product into a fresh index and swap it in."""
+        started = time.monotonic()
+        fresh = AutocompleteIndex()
+        rows = self._load_rows()
+        fresh.upsert(rows)
+        with self._lock:
+            self._terms, self._postings, self._entries = fresh._terms, fresh._postings, fresh._entries
+            self._leaders = fresh._leaders
+            self._results = {}
+            self._watermark = max((row["updated_at"] for row in rows), default=None)
+            self._built_at = self._refreshed_at = time.monotonic()
+            self._loaded = True
+        logger.info(
+            "[autocomplete] indexed %d products, %d terms in %.2fs",
+            len(self._entries), len(self._terms), time.monotonic() - started,
+        )
+        return len(self._entries)
+
+    def refresh(self) -> int:
+        """Apply products updated since the last load; returns rows applied."""
+        watermark = self._watermark
+        if watermark is None:
+            return self.rebuild()
+        rows = self._load_rows(updated_since=watermark)
+        if rows:
+            self.upsert(rows)
+            self._watermark = max(watermark, *(row["updated_at"] for row in rows))
+        self._refreshed_at = time.monotonic()
+        return len(rows)
+
+    def reload(self, product_ids) -> None:
+        """Re-read `product_ids` from the database (signal handlers)."""
+        if not self._loaded:
+            return  # first use loads everything anyway
+        product_ids = list(product_ids)
+        rows = self._load_rows(product_ids=product_ids) if product_ids else []
+        self.upsert(rows)
+        self.remove(set(product_ids) - {row["id"] for row in rows})
+
+    @classmethod
+    def _load_rows(cls, product_ids=None, updated_since=None) -> list:
+        from apps.core.models import MediaAsset, Product
+
+        products = Product.objects.order_by()
+        if product_ids is not None:
+            products = products.filter(pk__in=product_ids)
+        if updated_since is not None:
+            products = products.filter(updated_at__gte=updated_since)
+        rows = list(products.values(
+            "id", "slug", "price", "popularity_score", "updated_at",
+            "is_published", "is_admin_published", "is_active", *cls.SOURCE_PATHS,
+        ))
+        for row in rows:
+            row["eligible"] = row["is_published"] and row["is_admin_published"] and row["is_active"]
+            row["thumbnail"] = None
+
+        # Newest image per product, as product.media.filter(media_type="image").first()
+        by_id = {row["id"]: row for row in rows if row["eligible"]}
+        images = Product.media.through.objects.filter(mediaasset__media_type=MediaAsset.MediaType.IMAGE)
+        if product_ids is not None or updated_since is not None:
+            images = images.filter(product_id__in=list(by_id))
+        images = images.order_by("product_id", "-mediaasset__created_at").values_list(
+            "product_id", "mediaasset__file"
+        )
+        for product_id, name in images:
+            row = by_id.get(product_id)
+            if row is not None and row["thumbnail"] is None and name:
+                row["thumbnail"] = MediaAsset(file=name).file.url
+        return rows
+
+
+_index = AutocompleteIndex()
+
+
+def get_index() -> AutocompleteIndex:
+    return _index
+
+
+def set_index(index) -> None:
+    """Swap the process-wide index (tests)."""
+    global _index
+    _index = index
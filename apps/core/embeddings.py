@@ -0,0 +1,455 @@
+"""
+Product embeddings for semantic search in AI mode.
+
+Vectors come from a pluggable local encoder (`settings.EMBEDDING_ENCODER`)
+and are stored per product in `ProductEmbedding.vector` as float32 bytes.
+`python manage.py generate_embeddings` encodes new or changed products and
+exports every vector as a memory-mapped index:
+
+    <EMBEDDING_INDEX_DIR>/CURRENT           name of the live generation
+    <EMBEDDING_INDEX_DIR>/<generation>/
+        vectors.npy    float32 (n, d), L2-normalised, rows grouped by list
+        ids.npy        product ids, row order
+        offsets.npy    row range of each IVF list (lists + 1,)
+        centroids.npy  float32 (lists, d)
+        meta.json      encoder name, dimensions, rows
+
+A query is a cosine top-k: one matrix-vector product over every row for
+small catalogues, or over the rows of the NPROBE nearest IVF lists above
+EXACT_MAX rows. Writers build a new generation and swap CURRENT
+atomically, so running workers pick it up on their next reload check.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from apps.core.search import tokenize
+from apps.utils.db import upsert_options
+
+logger = logging.getLogger(__name__)
+
+
+def normalise(vectors: np.ndarray) -> np.ndarray:
+    """Row-wise L2 normalisation (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# ---------- encoders ----------
+
+class TextEncoder:
+    """Encoder interface: `encode(texts)` -> float32 (len(texts), dimensions), L2-normalised."""
+
+    name = ""
+    dimensions = 0
+
+    def encode(self, texts) -> np.ndarray:
+        raise NotImplementedError
+
+
+class HashingEncoder(TextEncoder):
+    """
+    Dependency-free local encoder: signed feature hashing of words, word
+    pairs and character trigrams into a fixed-width vector. Captures shared
+    vocabulary and spelling variants ("ankara"/"ankaras"), not synonyms.
+    """
+
+    dimensions = 384
+    name = f"hashing-v1-{dimensions}"
+    WORD_WEIGHT = 1.0
+    PAIR_WEIGHT = 0.5
+    TRIGRAM_WEIGHT = 0.25
+
+    def encode(self, texts) -> np.ndarray:
+        out = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            buckets, weights = self._features(text)
+            if len(buckets):
+                np.add.at(out[row], buckets, weights)
+        return normalise(out)
+
+    def _features(self, text):
+        tokens = tokenize(text)
+        features = []
+        for i, token in enumerate(tokens):
+            features.append((token, self.WORD_WEIGHT))
+            if i:
+                features.append((f"{tokens[i - 1]} {token}", self.PAIR_WEIGHT))
+            padded = f"<{token}>"
+            features.extend(
+                (padded[j:j + 3], self.TRIGRAM_WEIGHT) for j in range(len(padded) - 2)
+            )
+        buckets = np.empty(len(features), dtype=np.int64)
+        weights = np.empty(len(features), dtype=np.float32)
+        for i, (feature, weight) in enumerate(features):
+            h = zlib.crc32(feature.encode())
+            buckets[i] = h % self.dimensions
+            weights[i] = weight if h & 0x80000000 else -weight
+        return buckets, weights
+
+
+class SentenceTransformerEncoder(TextEncoder):
+    """
+    Local transformer model via the optional `sentence-transformers`
+    package; `settings.EMBEDDING_MODEL` names the model.
+    """
+
+    def __init__(self, model_name=None):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as exc:
+            raise ImproperlyConfigured(
+                "SentenceTransformerEncoder needs `pip install sentence-transformers`"
+            ) from exc
+        model_name = model_name or getattr(settings, "EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        self._model = SentenceTransformer(model_name)
+        self.name = f"st:{model_name}"
+        self.dimensions = self._model.get_sentence_embedding_dimension()
+
+    def encode(self, texts) -> np.ndarray:
+        vectors = self._model.encode(
+            list(texts), batch_size=64, normalize_embeddings=True, convert_to_numpy=True
+        )
+        return vectors.astype(np.float32, copy=False)
+
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def get_encoder() -> TextEncoder:
+    """Process-wide encoder named by `settings.EMBEDDING_ENCODER`."""
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                path = getattr(settings, "EMBEDDING_ENCODER", None)
+                _encoder = import_string(path)() if path else HashingEncoder()
+    return _encoder
+
+
+def set_encoder(encoder) -> None:
+    """Swap the process-wide encoder (tests, alternative models)."""
+    global _encoder
+    _encoder = encoder
+
+
+# ---------- encoding products ----------
+
+TEXT_PATHS = (
+    "name", "brand__name", "category__name", "subcategory__name",
+    "user__designer_profile__brand_name", "material", "occasion", "print_type", "description",
+)
+
+
+def product_texts(product_ids) -> dict:
+    """Embedding text per product id: name first, then attributes, colours, description."""
+    from apps.core.models import Color, Product
+
+    colors = {}
+    for product_id, name in Color.objects.filter(product_id__in=product_ids).values_list("product_id", "name"):
+        colors.setdefault(product_id, []).append(name)
+
+    texts = {}
+    for row in Product.objects.filter(pk__in=product_ids).values("pk", *TEXT_PATHS):
+        parts = [row[path] for path in TEXT_PATHS[:-1] if row[path] and row[path] != "other"]
+        parts.extend(colors.get(row["pk"], []))
+        parts.append(row["description"] or "")
+        texts[row["pk"]] = " ".join(p.strip() for p in parts if p and p.strip())
+    return texts
+
+
+def encode_products(product_ids=None, force=False, batch_size=256) -> dict:
+    """
+    Encode products whose text or encoder changed (all of them with
+    `force`) and upsert their ProductEmbedding rows.
+    """
+    from apps.core.models import Product, ProductEmbedding
+
+    encoder = get_encoder()
+    if product_ids is None:
+        product_ids = Product.objects.order_by().values_list("pk", flat=True)
+    product_ids = list(product_ids)
+
+    stats = {"products": len(product_ids), "encoded": 0, "unchanged": 0}
+    for start in range(0, len(product_ids), batch_size):
+        chunk = product_ids[start:start + batch_size]
+        texts = product_texts(chunk)
+        current = {
+            row["product_id"]: row
+            for row in ProductEmbedding.objects.filter(product_id__in=chunk)
+            .values("product_id", "embedding_text", "encoder")
+        }
+        stale = [
+            pk for pk, text in texts.items()
+            if force
+            or pk not in current
+            or current[pk]["embedding_text"] != text
+            or current[pk]["encoder"] != encoder.name
+        ]
+        stats["unchanged"] += len(texts) - len(stale)
+        if not stale:
+            continue
+
+        vectors = encoder.encode([texts[pk] for pk in stale])
+        now = timezone.now()
+        ProductEmbedding.objects.bulk_create(
+            [
+                ProductEmbedding(
+                    product_id=pk,
+                    embedding_text=texts[pk],
+                    vector=vector.astype("<f4").tobytes(),
+                    dimensions=encoder.dimensions,
+                    encoder=encoder.name,
+                    updated_at=now,
+                )
+                for pk, vector in zip(stale, vectors)
+            ],
+            **upsert_options(
+                ProductEmbedding,
+                ["product"],
+                ["embedding_text", "vector", "dimensions", "encoder", "updated_at"],
+            ),
+        )
+        stats["encoded"] += len(stale)
+    return stats
+
+
+# ---------- index files ----------
+
+def _kmeans(vectors, lists, iterations=8, sample=20000, seed=0):
+    """Spherical k-means centroids trained on a sample of `vectors`."""
+    rng = np.random.default_rng(seed)
+    train = vectors[rng.choice(len(vectors), min(sample, len(vectors)), replace=False)]
+    centroids = train[rng.choice(len(train), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(train @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, train)
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]  # keep the old centroid for empty lists
+        centroids = normalise(sums)
+    return centroids
+
+
+def _assign(vectors, centroids, chunk=16384):
+    return np.concatenate([
+        np.argmax(vectors[i:i + chunk] @ centroids.T, axis=1)
+        for i in range(0, len(vectors), chunk)
+    ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+
+def export_index(directory=None) -> dict:
+    """Write every stored vector of the current encoder as a new index generation."""
+    from apps.core.models import ProductEmbedding
+
+    directory = str(directory or settings.EMBEDDING_INDEX_DIR)
+    encoder = get_encoder()
+    rows = list(
+        ProductEmbedding.objects.filter(encoder=encoder.name, dimensions=encoder.dimensions)
+        .order_by("product_id")
+        .values_list("product_id", "vector")
+    )
+    ids = np.array([pk for pk, _ in rows], dtype=str)
+    vectors = np.empty((len(rows), encoder.dimensions), dtype=np.float32)
+    for i, (_, blob) in enumerate(rows):
+        vectors[i] = np.frombuffer(bytes(blob), dtype="<f4")
+
+    if len(rows) > ProductVectorIndex.EXACT_MAX:
+        centroids = _kmeans(vectors, int(np.sqrt(len(rows))))
+        assign = _assign(vectors, centroids)
+        order = np.argsort(assign, kind="stable")
+        ids, vectors = ids[order], vectors[order]
+        counts = np.bincount(assign, minlength=len(centroids))
+    else:
+        centroids = normalise(vectors.mean(axis=0, keepdims=True)) if len(rows) else np.zeros(
+            (1, encoder.dimensions), dtype=np.float32
+        )
+        counts = np.array([len(rows)])
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    generation = timezone.now().strftime("%Y%m%d%H%M%S%f")
+    path = os.path.join(directory, generation)
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "vectors.npy"), np.ascontiguousarray(vectors), allow_pickle=False)
+    np.save(os.path.join(path, "ids.npy"), ids, allow_pickle=False)
+    np.save(os.path.join(path, "offsets.npy"), offsets, allow_pickle=False)
+    np.save(os.path.join(path, "centroids.npy"), centroids.astype(np.float32), allow_pickle=False)
+    meta = {"encoder": encoder.name, "dimensions": encoder.dimensions, "rows": len(rows), "lists": len(centroids)}
+    with open(os.path.join(path, "meta.json"), "w") as fh:
+        json.dump(meta, fh)
+
+    current = os.path.join(directory, "CURRENT")
+    with open(f"{current}.tmp", "w") as fh:
+        fh.write(generation)
+    previous = _read_current(directory)
+    os.replace(f"{current}.tmp", current)
+
+    # Keep the generation readers may still have mapped; drop older ones
+    for name in os.listdir(directory):
+        full = os.path.join(directory, name)
+        if os.path.isdir(full) and name not in (generation, previous):
+            shutil.rmtree(full, ignore_errors=True)
+    logger.info("[embeddings] exported generation %s: %s", generation, meta)
+    return {"generation": generation, **meta}
+
+
+def _read_current(directory):
+    try:
+        with open(os.path.join(directory, "CURRENT")) as fh:
+            return fh.read().strip() or None
+    except OSError:
+        return None
+
+
+def current_meta(directory=None) -> dict:
+    """meta.json of the live generation, {} when there is none."""
+    directory = str(directory or settings.EMBEDDING_INDEX_DIR)
+    generation = _read_current(directory)
+    if generation is None:
+        return {}
+    try:
+        with open(os.path.join(directory, generation, "meta.json")) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+class ProductVectorIndex:
+    """Cosine top-k over the memory-mapped index generation in `directory`."""
+
+    EXACT_MAX = 100000  # rows searched exhaustively (~20 ms at 384 dims); IVF above this
+    NPROBE = 32
+    RELOAD_CHECK_SECONDS = 60
+
+    def __init__(self, directory=None):
+        self.directory = str(directory or settings.EMBEDDING_INDEX_DIR)
+        self.meta = {}
+        self._generation = None
+        self._vectors = self._ids = self._offsets = self._centroids = None
+        self._checked_at = None
+        self._missing_logged = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        self._ensure_loaded()
+        return 0 if self._ids is None else len(self._ids)
+
+    def search(self, vector, k=50) -> list:
+        """[(product id, cosine similarity)] best first; [] when no index is loaded."""
+        self._ensure_loaded()
+        if self._ids is None or not len(self._ids):
+            return []
+        query = normalise(np.asarray(vector, dtype=np.float32).reshape(-1))
+        if query.shape[0] != self._vectors.shape[1]:
+            logger.warning("[embeddings] query has %d dims, index has %d", query.shape[0], self._vectors.shape[1])
+            return []
+
+        lists = len(self._offsets) - 1
+        if lists == 1:
+            rows = np.arange(len(self._ids))
+            scores = self._vectors @ query
+        else:
+            nearest = np.argsort(self._centroids @ query)[::-1][:self.NPROBE]
+            rows = np.concatenate([
+                np.arange(self._offsets[c], self._offsets[c + 1]) for c in nearest
+            ])
+            scores = np.concatenate([
+                self._vectors[self._offsets[c]:self._offsets[c + 1]] @ query for c in nearest
+            ])
+        if not len(scores):
+            return []
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(str(self._ids[rows[i]]), float(scores[i])) for i in top]
+
+    def _ensure_loaded(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.RELOAD_CHECK_SECONDS:
+            return
+        with self._lock:
+            self._checked_at = now
+            generation = _read_current(self.directory)
+            if generation is None:
+                if not self._missing_logged:
+                    logger.warning(
+                        "[embeddings] no index in %s; run `manage.py generate_embeddings`", self.directory
+                    )
+                    self._missing_logged = True
+                return
+            if generation == self._generation:
+                return
+            path = os.path.join(self.directory, generation)
+            try:
+                with open(os.path.join(path, "meta.json")) as fh:
+                    meta = json.load(fh)
+                vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r", allow_pickle=False)
+                ids = np.load(os.path.join(path, "ids.npy"), allow_pickle=False)
+                offsets = np.load(os.path.join(path, "offsets.npy"), allow_pickle=False)
+                centroids = np.load(os.path.join(path, "centroids.npy"), allow_pickle=False)
+            except (OSError, ValueError) as exc:
+                logger.warning("[embeddings] could not load %s: %s", path, exc)
+                return
+            self._vectors, self._ids, self._offsets, self._centroids = vectors, ids, offsets, centroids
+            self._generation, self.meta = generation, meta
+            logger.info("[embeddings] loaded generation %s (%d rows)", generation, len(ids))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> ProductVectorIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ProductVectorIndex()
+    return _index
+
+
+def set_index(index) -> None:
+    """Swap the process-wide index (tests)."""
+    global _index
+    _index = index
+
+
+def semantic_search(text, k=50) -> list:
+    """Product ids most similar to `text`, best first; [] without a usable index."""
+    index = get_index()
+    encoder = get_encoder()
+    if not text or not len(index):
+        return []
+    if index.meta.get("encoder") != encoder.name:
+        logger.warning(
+            "[embeddings] index built with %s but encoder is %s; re-run generate_embeddings",
+            index.meta.get("encoder"), encoder.name,
+        )
+        return []
+    return [pk for pk, _ in index.search(encoder.encode([text])[0], k)]
+
+
+def refresh_product_embeddings() -> dict:
+    """Scheduled job: encode changed products and export a new index generation when needed."""
+    from apps.core.models import ProductEmbedding
+
+    stats = encode_products()
+    encoder = get_encoder()
+    meta = current_meta()
+    stored = ProductEmbedding.objects.filter(encoder=encoder.name).count()
+    if stats["encoded"] or meta.get("encoder") != encoder.name or meta.get("rows") != stored:
+        stats["index"] = export_index()
+    logger.info("[embeddings] %s", stats)
+    return stats
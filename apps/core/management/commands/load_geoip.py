@@ -0,0 +1,119 @@
+"""
+Management command to build or refresh the local GeoIP range table.
+
+Accepted sources (local paths or http(s) URLs, optionally .gz):
+  - MaxMind GeoLite2 country blocks CSV (`network,geoname_id,...`),
+    together with the matching `--locations` CSV
+  - CIDR CSV: `network,country`
+  - Range CSV (DB-IP / IP2Location lite style): `start_ip,end_ip,country`
+
+Usage:
+    python manage.py load_geoip dbip-country-lite.csv.gz
+    python manage.py load_geoip GeoLite2-Country-Blocks-IPv4.csv \\
+        GeoLite2-Country-Blocks-IPv6.csv --locations GeoLite2-Country-Locations-en.csv
+"""
+import csv
+import gzip
+import io
+import ipaddress
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.utils.geoip import RangeTableResolver, build_table, save_table
+
+
+def open_source(source):
+    if source.startswith(("http://", "https://")):
+        resp = requests.get(source, timeout=120)
+        resp.raise_for_status()
+        raw = resp.content
+        if source.endswith(".gz"):
+            raw = gzip.decompress(raw)
+        return io.StringIO(raw.decode("utf-8"))
+    if source.endswith(".gz"):
+        return gzip.open(source, "rt", encoding="utf-8", newline="")
+    return open(source, encoding="utf-8", newline="")
+
+
+def read_locations(source):
+    with open_source(source) as fh:
+        return {
+            row["geoname_id"]: row["country_iso_code"]
+            for row in csv.DictReader(fh)
+            if row.get("country_iso_code")
+        }
+
+
+def read_ranges(source, locations):
+    """Yield (start_ip, end_ip, country) from one source file."""
+    with open_source(source) as fh:
+        reader = csv.reader(fh)
+        header = next(reader, None)
+        if header is None:
+            return
+        if "network" in header and "geoname_id" in header:
+            network_col = header.index("network")
+            geo_cols = [
+                header.index(col)
+                for col in ("geoname_id", "registered_country_geoname_id")
+                if col in header
+            ]
+            for row in reader:
+                geoname = next((row[c] for c in geo_cols if row[c]), None)
+                country = locations.get(geoname)
+                if country:
+                    network = ipaddress.ip_network(row[network_col], strict=False)
+                    yield network[0], network[-1], country
+            return
+
+        try:
+            first = _parse_row(header)
+        except ValueError:
+            first = None  # a real header line
+        if first:
+            yield first
+        for row in reader:
+            if row:
+                yield _parse_row(row)
+
+
+def _parse_row(row):
+    if len(row) >= 3:
+        return ipaddress.ip_address(row[0]), ipaddress.ip_address(row[1]), row[2].strip()
+    network = ipaddress.ip_network(row[0], strict=False)
+    return network[0], network[-1], row[1].strip()
+
+
+class Command(BaseCommand):
+    help = "Build the local GeoIP range table used for IP -> country lookups"
+
+    def add_arguments(self, parser):
+        parser.add_argument("sources", nargs="+", help="CSV files or URLs with IP ranges")
+        parser.add_argument("--locations", help="MaxMind country locations CSV (geoname_id -> ISO code)")
+        parser.add_argument("--output", default=None, help="Output path (default: settings.GEOIP_DATABASE)")
+
+    def handle(self, *args, **options):
+        output = options["output"] or settings.GEOIP_DATABASE
+        locations = read_locations(options["locations"]) if options["locations"] else {}
+
+        ranges = []
+        for source in options["sources"]:
+            before = len(ranges)
+            try:
+                ranges.extend(read_ranges(source, locations))
+            except (OSError, ValueError, IndexError, requests.RequestException) as exc:
+                raise CommandError(f"Could not read {source}: {exc}")
+            self.stdout.write(f"{source}: {len(ranges) - before} ranges")
+
+        if not ranges:
+            raise CommandError("No ranges found; refusing to replace the existing table.")
+
+        table = build_table(ranges)
+        save_table(table, output)
+
+        probe = RangeTableResolver(output)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(probe)} merged ranges to {output}"
+        ))
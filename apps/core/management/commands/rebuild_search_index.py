@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.search import ProductSearchIndex
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product keyword search index from scratch."
+
+    def handle(self, *args, **options):
+        stats = ProductSearchIndex.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {stats['products']} products: {stats['terms_written']} terms written, "
+            f"{stats['terms_removed']} orphaned terms removed"
+        ))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_alter_product_availability_type'),
+        ('designers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('field', models.CharField(max_length=16)),
+                ('weight', models.FloatField(default=1.0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='core.product')),
+            ],
+            options={
+                'db_table': 'product_search_terms',
+                'unique_together': {('term', 'field', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_product_search_terms'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='productembedding',
+            name='embedding',
+        ),
+        migrations.AddField(
+            model_name='productembedding',
+            name='encoder',
+            field=models.CharField(blank=True, help_text='Encoder that produced the vector; a change forces re-encoding', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='productembedding',
+            name='vector',
+            field=models.BinaryField(blank=True, default=b'', help_text='L2-normalised float32 embedding (little-endian bytes)'),
+        ),
+    ]
@@ -660,10 +660,15 @@ class ProductEmbedding(models.Model):
         on_delete=models.CASCADE,
         related_name="embedding",
     )
-    embedding = models.JSONField(
-        default=list,
+    vector = models.BinaryField(
+        default=b"",
         blank=True,
-        help_text="Vector embedding (list of floats) for semantic search",
+        help_text="L2-normalised float32 embedding (little-endian bytes)",
+    )
+    encoder = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="Encoder that produced the vector; a change forces re-encoding",
     )
     embedding_text = models.TextField(
         blank=True,
@@ -679,6 +684,32 @@ class ProductEmbedding(models.Model):
         return f"Embedding({self.product.name}, {self.dimensions}d)"
 
 
+# ---------------------------
+# Keyword Search (Inverted Index)
+# ---------------------------
+class ProductSearchTerm(models.Model):
+    """
+    One posting of the product keyword index: `term` occurs in `field` of
+    `product`. `weight` is the field boost times the term's frequency
+    there. Maintained by apps.core.search.ProductSearchIndex.
+    """
+    product = models.ForeignKey(
+        "core.Product",
+        on_delete=models.CASCADE,
+        related_name="search_terms",
+    )
+    term = models.CharField(max_length=64)
+    field = models.CharField(max_length=16)
+    weight = models.FloatField(default=1.0)
+
+    class Meta:
+        db_table = "product_search_terms"
+        unique_together = ("term", "field", "product")
+
+    def __str__(self):
+        return f"{self.term} ({self.field}) -> {self.product_id}"
+
+
 class SubscriptionPlan(models.Model):
     class Tier(models.TextChoices):
         FREE = "free", "Free"
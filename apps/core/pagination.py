@@ -1,6 +1,116 @@
+import base64
+import datetime
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = "page_size"
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder cuts times to milliseconds; a cursor needs them exact."""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination:
+    """
+    Cursor pagination for infinite scroll.
+
+    The opaque `cursor` encodes the sort-key values of the last row served;
+    the next page is selected with a WHERE on those values instead of an
+    OFFSET, so page N costs the same as page 1. `ordering` must end with a
+    unique field (id) to break ties. The total is only counted when asked
+    for (`include_count=true`) and is cached per query.
+    """
+
+    max_limit = 100
+    count_cache_ttl = 60 * 5
+
+    def __init__(self, ordering, default_limit=20):
+        self.ordering = list(ordering)
+        self.default_limit = default_limit
+
+    @staticmethod
+    def is_requested(request) -> bool:
+        """Keyset mode is opt-in: `?cursor=` (empty for the first page)."""
+        return "cursor" in request.GET
+
+    # ---------- cursor encoding ----------
+
+    def encode_cursor(self, obj) -> str:
+        values = [getattr(obj, field.lstrip("-")) for field in self.ordering]
+        raw = json.dumps(values, cls=_CursorEncoder, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor: str):
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (ValueError, TypeError):
+            raise ValidationError({"cursor": "Invalid cursor."})
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise ValidationError({"cursor": "Invalid cursor."})
+        return values
+
+    def after(self, values) -> Q:
+        """Rows strictly after `values` in `ordering` (lexicographic)."""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    # ---------- paging ----------
+
+    def get_limit(self, request) -> int:
+        try:
+            limit = int(request.GET.get("limit", self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        return max(1, min(limit, self.max_limit))
+
+    def count(self, queryset) -> int:
+        key = "keyset_count:" + hashlib.md5(str(queryset.query).encode()).hexdigest()
+        total = cache.get(key)
+        if total is None:
+            total = queryset.count()
+            cache.set(key, total, self.count_cache_ttl)
+        return total
+
+    def paginate(self, queryset, request):
+        """Return (rows, pagination metadata) for the requested page."""
+        limit = self.get_limit(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        page_qs = queryset
+        cursor = request.GET.get("cursor")
+        if cursor:
+            page_qs = page_qs.filter(self.after(self.decode_cursor(cursor)))
+
+        rows = list(page_qs[:limit + 1])
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+
+        pagination = {
+            "next_cursor": self.encode_cursor(rows[-1]) if has_next else None,
+            "has_next": has_next,
+            "limit": limit,
+        }
+        if request.GET.get("include_count") == "true":
+            pagination["total_items"] = self.count(queryset)
+        return rows, pagination
@@ -0,0 +1,230 @@
+"""
+Product keyword search.
+
+Products are tokenised into an inverted index (`ProductSearchTerm`, one
+row per term/field/product) so a search is a handful of indexed prefix
+lookups instead of a chain of `icontains` scans across five joined tables.
+
+  - Tokens are lower-cased, accent-stripped, split on anything that is not
+    a letter or digit, stopword-filtered and lightly de-pluralised
+    ("dresses" -> "dress"), both when indexing and when querying.
+  - Every query token must match (AND) as a prefix of an indexed term, so
+    "sil dre" finds "Silk Dress".
+  - Ranking sums the field boosts of the matched terms; exact term hits
+    count fully, prefix hits count half.
+
+The index is kept current by the signals in apps.core.signals. Existing
+products are indexed (and the index rebuilt from scratch) with
+`python manage.py rebuild_search_index`, which must run once after the
+migration that creates ProductSearchTerm.
+"""
+import logging
+import re
+import unicodedata
+
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in",
+    "is", "it", "of", "on", "or", "the", "this", "that", "to", "with",
+})
+
+_SPLIT = re.compile(r"[^a-z0-9]+")
+
+
+def _singular(token: str) -> str:
+    if len(token) <= 3 or token.endswith(("ss", "us", "is")):
+        return token
+    if token.endswith("sses") or token.endswith("shes") or token.endswith("ches"):
+        return token[:-2]
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    if token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text, limit=None) -> list:
+    """Normalised search tokens for `text`, in order, duplicates kept."""
+    if not text:
+        return []
+    text = str(text)
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    tokens = []
+    for token in _SPLIT.split(text.lower()):
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        tokens.append(_singular(token)[:64])
+        if limit and len(tokens) >= limit:
+            break
+    return tokens
+
+
+class ProductSearchIndex:
+    # Indexed field -> (Product.values() path, boost)
+    FIELDS = {
+        "name": ("name", 3.0),
+        "designer": ("user__designer_profile__brand_name", 2.5),
+        "brand": ("brand__name", 2.0),
+        "category": ("category__name", 1.5),
+        "subcategory": ("subcategory__name", 1.5),
+        "description": ("description", 0.5),
+    }
+    DEFAULT_FIELDS = ("name", "designer", "brand", "category", "subcategory")
+    # Product fields whose change means the product must be re-indexed
+    SOURCE_FIELDS = frozenset({
+        "name", "description", "brand", "brand_id", "category", "category_id",
+        "subcategory", "subcategory_id", "user", "user_id",
+    })
+    MAX_DESCRIPTION_TERMS = 60
+    MAX_QUERY_TERMS = 8
+    PREFIX_WEIGHT = 0.5
+    CHUNK_SIZE = 500
+
+    # ---------- querying ----------
+
+    @classmethod
+    def matching(cls, query, fields=None):
+        """
+        Q() restricting Product to rows matching every token of `query`,
+        or None when the query has no usable tokens.
+        """
+        tokens = list(dict.fromkeys(tokenize(query, limit=cls.MAX_QUERY_TERMS)))
+        if not tokens:
+            return None
+        from apps.core.models import ProductSearchTerm
+
+        fields = tuple(fields or cls.DEFAULT_FIELDS)
+        condition = Q()
+        for token in tokens:
+            postings = ProductSearchTerm.objects.filter(cls._prefix(token), field__in=fields)
+            condition &= Q(pk__in=postings.values("product_id"))
+        return condition
+
+    @classmethod
+    def filter(cls, queryset, query, fields=None):
+        """
+        `queryset` narrowed to products matching `query`. A query made only
+        of stopwords or punctuation falls back to a name substring match.
+        """
+        condition = cls.matching(query, fields)
+        if condition is None:
+            query = (query or "").strip()
+            return queryset.filter(name__icontains=query) if query else queryset
+        return queryset.filter(condition)
+
+    @classmethod
+    def rank(cls, queryset, query, fields=None):
+        """Annotate `search_rank` (sum of matched term weights, 0 if none)."""
+        tokens = list(dict.fromkeys(tokenize(query, limit=cls.MAX_QUERY_TERMS)))
+        if not tokens:
+            return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+        from apps.core.models import ProductSearchTerm
+
+        matched = Q()
+        for token in tokens:
+            matched |= cls._prefix(token)
+        score = (
+            ProductSearchTerm.objects
+            .filter(matched, product_id=OuterRef("pk"), field__in=tuple(fields or cls.DEFAULT_FIELDS))
+            .order_by()
+            .values("product_id")
+            .annotate(total=Sum(Case(
+                When(term__in=tokens, then=F("weight")),
+                default=F("weight") * cls.PREFIX_WEIGHT,
+                output_field=FloatField(),
+            )))
+            .values("total")
+        )
+        return queryset.annotate(
+            search_rank=Coalesce(Subquery(score, output_field=FloatField()), Value(0.0))
+        )
+
+    @classmethod
+    def search(cls, queryset, query, fields=None):
+        """Matching products, best first."""
+        return cls.rank(cls.filter(queryset, query, fields), query, fields).order_by("-search_rank", "name")
+
+    @staticmethod
+    def _prefix(token):
+        # Terms and tokens are both normalised to [a-z0-9]. SQLite compares
+        # bytewise, so a half-open range uses the term index. On MySQL
+        # istartswith is a plain LIKE 'x%' under the column's _ci collation,
+        # which can range-scan the index; startswith would become
+        # LIKE BINARY, which cannot.
+        if connection.vendor == "sqlite":
+            return Q(term__gte=token, term__lt=token[:-1] + chr(ord(token[-1]) + 1))
+        return Q(term__istartswith=token)
+
+    # ---------- maintenance ----------
+
+    @classmethod
+    def postings(cls, row: dict) -> list:
+        """(term, field, weight) for one Product.values() row."""
+        out = []
+        for field, (path, boost) in cls.FIELDS.items():
+            limit = cls.MAX_DESCRIPTION_TERMS if field == "description" else None
+            counts = {}
+            for token in tokenize(row.get(path), limit=limit):
+                counts[token] = counts.get(token, 0) + 1
+            out.extend((term, field, boost * count) for term, count in counts.items())
+        return out
+
+    @classmethod
+    def index_products(cls, product_ids) -> int:
+        """Replace the postings of `product_ids`; returns rows written."""
+        from apps.core.models import Product, ProductSearchTerm
+
+        product_ids = list(product_ids)
+        paths = [path for path, _ in cls.FIELDS.values()]
+        written = 0
+        for start in range(0, len(product_ids), cls.CHUNK_SIZE):
+            chunk = product_ids[start:start + cls.CHUNK_SIZE]
+            rows = [
+                ProductSearchTerm(product_id=row["pk"], term=term, field=field, weight=weight)
+                for row in Product.objects.filter(pk__in=chunk).values("pk", *paths)
+                for term, field, weight in cls.postings(row)
+            ]
+            with transaction.atomic():
+                ProductSearchTerm.objects.filter(product_id__in=chunk).delete()
+                ProductSearchTerm.objects.bulk_create(rows, batch_size=cls.CHUNK_SIZE)
+            written += len(rows)
+        return written
+
+    @classmethod
+    def rebuild(cls) -> dict:
+        """Re-index every product and drop postings of deleted ones."""
+        from apps.core.models import Product, ProductSearchTerm
+
+        product_ids = list(Product.objects.order_by().values_list("pk", flat=True))
+        rows = cls.index_products(product_ids)
+        removed, _ = ProductSearchTerm.objects.exclude(
+            product_id__in=Product.objects.order_by().values("pk")
+        ).delete()
+        stats = {"products": len(product_ids), "terms_written": rows, "terms_removed": removed}
+        logger.info("[search_index] %s", stats)
+        return stats
+
+
+def reindex_related_products(kind: str, pk) -> int:
+    """
+    Scheduled job entry point: re-index the products of a renamed brand,
+    category or designer (`kind`; `pk` is the designer's user id).
+    """
+    from apps.core.autocomplete import get_index
+    from apps.core.models import Product
+
+    related = {
+        "brand": Q(brand_id=pk),
+        "category": Q(category_id=pk) | Q(subcategory_id=pk),
+        "designer": Q(user_id=pk),
+    }[kind]
+    product_ids = list(Product.objects.filter(related).values_list("pk", flat=True))
+    ProductSearchIndex.index_products(product_ids)
+    get_index().reload(product_ids)
+    return len(product_ids)
@@ -1,3 +1,5 @@
+import logging
+
 from django.db import models
 from apps.core.models import Color
 # core/serializers.py
@@ -12,6 +14,8 @@ from .models import (
     SizeRecommendation, UserLookbook, SubscriptionPlan, UserSubscription,
 )
 
+logger = logging.getLogger(__name__)
+
 
 class CountrySerializer(serializers.ModelSerializer):
     class Meta:
@@ -80,6 +84,23 @@ class BrandSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class ProductListSerializer(serializers.ListSerializer):
+    """Primes the request's pricing context with the whole page before serializing it."""
+
+    def to_representation(self, data):
+        request = self.context.get('request')
+        if request is None:
+            return super().to_representation(data)
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        try:
+            from apps.pay.services.pricing import PricingContext
+            PricingContext.for_request(request).prime(items)
+        except Exception:
+            # Per-item pricing below still falls back to the model price
+            logger.warning("Failed to prime pricing for product list", exc_info=True)
+        return super().to_representation(items)
+
+
 class ProductSerializer(serializers.ModelSerializer):
     media = MediaAssetSerializer(many=True, read_only=True)
     colors = ColorSerializer(many=True, read_only=True)
@@ -91,6 +112,7 @@ class ProductSerializer(serializers.ModelSerializer):
     country_of_origin = CountrySerializer(read_only=True)
     fit_me_image = serializers.ImageField(required=False, allow_null=True)
     avg_rating = serializers.SerializerMethodField(read_only=True)
+    review_count = serializers.SerializerMethodField(read_only=True)
     currency_code = serializers.SerializerMethodField(read_only=True)
     thumbnail = serializers.SerializerMethodField(read_only=True)
     designer_name = serializers.SerializerMethodField(read_only=True)
@@ -106,6 +128,7 @@ class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
+        list_serializer_class = ProductListSerializer
         fields = (
             "id",
             "name",
@@ -143,14 +166,62 @@ class ProductSerializer(serializers.ModelSerializer):
             "fit_me_image",
             "has_try_on",
             "avg_rating",
+            "review_count",
             "colors_input",
         )
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Load everything list serialization reads in a fixed number of
+        queries: related rows via select_related / prefetch_related and the
+        approved-review rating and count as correlated subqueries, so a page
+        costs the same number of queries whatever its size.
+        """
+        approved = Review.objects.filter(
+            product=models.OuterRef("pk"), is_approved=True
+        ).order_by().values("product")
+        return (
+            queryset
+            .select_related(
+                "user",
+                "user__designer_profile",
+                "currency",
+                "category",
+                "subcategory",
+                "brand",
+                "country_of_origin",
+            )
+            .prefetch_related(
+                "media",
+                "categories",
+                "sizes",
+                "colors",
+                "user__designer_profile__lookbook_files",
+            )
+            .annotate(
+                rating_avg=models.Subquery(
+                    approved.annotate(avg=models.Avg("rating")).values("avg"),
+                    output_field=models.FloatField(),
+                ),
+                rating_count=models.Subquery(
+                    approved.annotate(count=models.Count("id")).values("count"),
+                    output_field=models.IntegerField(),
+                ),
+            )
+        )
+
     def get_currency_code(self, obj):
         return obj.currency.code if obj.currency else "USD"
 
     def get_thumbnail(self, obj):
-        first_image = obj.media.filter(media_type="image").first()
+        if "media" in getattr(obj, "_prefetched_objects_cache", {}):
+            # Prefetched in the model's default ordering, same as .first()
+            first_image = next(
+                (m for m in obj.media.all() if m.media_type == "image"), None
+            )
+        else:
+            first_image = obj.media.filter(media_type="image").first()
         if first_image and first_image.file:
             return first_image.file.url
         return None
@@ -166,13 +237,21 @@ class ProductSerializer(serializers.ModelSerializer):
         return bool(obj.fit_me_image)
 
     def get_avg_rating(self, obj):
-        avg = obj.reviews.filter(is_approved=True).aggregate(
-            avg=models.Avg("rating")
-        )["avg"]
+        if hasattr(obj, "rating_avg"):
+            avg = obj.rating_avg
+        else:
+            avg = obj.reviews.filter(is_approved=True).aggregate(
+                avg=models.Avg("rating")
+            )["avg"]
         if avg is None:
             return None
         return round(avg, 1)
 
+    def get_review_count(self, obj):
+        if hasattr(obj, "rating_count"):
+            return obj.rating_count or 0
+        return obj.reviews.filter(is_approved=True).count()
+
     def validate(self, attrs):
         request = self.context.get("request")
         raw = getattr(request, "data", {}) if request else {}
@@ -378,10 +457,11 @@ class ProductSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         data = super().to_representation(instance)
         try:
-            designer = Designer.objects.get(user=instance.user)
-            data['designer'] = DesignerSerializer(designer).data
+            # Reverse one-to-one: served from select_related when eager loaded
+            designer = instance.user.designer_profile if instance.user_id else None
         except Designer.DoesNotExist:
-            data['designer'] = None
+            designer = None
+        data['designer'] = DesignerSerializer(designer).data if designer else None
         data['category'] = CategorySerializer(instance.category).data if instance.category else None
         data['categories'] = CategorySerializer(instance.categories, many=True).data
         data['subcategory'] = CategorySerializer(instance.subcategory).data if instance.subcategory else None
@@ -389,19 +469,12 @@ class ProductSerializer(serializers.ModelSerializer):
         data['sizes'] = SizesSerializer(instance.sizes, many=True).data
         data['colors'] = ColorSerializer(instance.colors, many=True).data
 
-        # Dynamic geo-IP pricing calculation
+        # Dynamic geo-IP pricing calculation (buyer located once per request)
         request = self.context.get('request')
         if request:
             try:
-                x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-                if x_forwarded_for:
-                    ip = x_forwarded_for.split(',')[0].strip()
-                else:
-                    ip = request.META.get('REMOTE_ADDR')
-
-                from apps.pay.services.pricing import get_country_from_ip, calculate_product_price_breakdown
-                buyer_country = get_country_from_ip(ip)
-                breakdown = calculate_product_price_breakdown(instance, buyer_country)
+                from apps.pay.services.pricing import PricingContext
+                breakdown = PricingContext.for_request(request).breakdown(instance)
                 
                 data['price'] = float(breakdown['total_price'])
                 data['currency_code'] = "USD"  # Keep stable base USD so frontend convert() works seamlessly
@@ -1,11 +1,83 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.conf import settings
+from django.utils import timezone
 
-from .models import UserSettings
+from apps.designers.models import Designer
+
+from .autocomplete import get_index
+from .models import Brand, Category, Product, UserSettings
+from .search import ProductSearchIndex, reindex_related_products
+
+# Models whose name is indexed with their products: sender -> (kind, name field)
+RENAMES = {
+    Brand: ("brand", "name"),
+    Category: ("category", "name"),
+    Designer: ("designer", "brand_name"),
+}
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_settings(sender, instance, created, **kwargs):
     if created:
         UserSettings.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, created, update_fields=None, **kwargs):
+    """Keep the product's search postings and suggestion entry in step with it."""
+    if created or update_fields is None or set(update_fields) & ProductSearchIndex.SOURCE_FIELDS:
+        ProductSearchIndex.index_products([instance.pk])
+    if created or update_fields is None or set(update_fields) & get_index().PRODUCT_FIELDS:
+        get_index().reload([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_index().remove([instance.pk])
+
+
+@receiver(m2m_changed, sender=Product.media.through)
+def reload_product_thumbnail(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        get_index().reload([instance.pk])
+    elif pk_set:
+        get_index().reload(pk_set)
+
+
+@receiver(pre_save, sender=Brand)
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Designer)
+def note_rename(sender, instance, update_fields=None, **kwargs):
+    _, field = RENAMES[sender]
+    instance._search_renamed = (
+        not instance._state.adding
+        and (update_fields is None or field in update_fields)
+        and sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first() != getattr(instance, field)
+    )
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Designer)
+def reindex_renamed_products(sender, instance, **kwargs):
+    """A rename re-indexes every related product: run it as a one-shot job after commit."""
+    if not getattr(instance, "_search_renamed", False):
+        return
+    kind, _ = RENAMES[sender]
+    pk = instance.user_id if sender is Designer else instance.pk
+    if pk is None:
+        return
+
+    def enqueue():
+        from apps.aps.scheduler import schedule_once
+
+        schedule_once(
+            reindex_related_products, timezone.now(),
+            job_id=f"reindex_related_products:{kind}:{pk}", args=[kind, pk],
+        )
+
+    transaction.on_commit(enqueue)
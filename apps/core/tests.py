@@ -1,3 +1,542 @@
-from django.test import TestCase
+"""
+Tests for apps.core product listing.
 
-# Create your tests here.
+Tests cover:
+  - Opt-in keyset (cursor) pagination for ProductListView / TrendingProducts
+  - Constant-query list serialization of ProductSerializer
+  - Local GeoIP table build (load_geoip) and lookups
+  - Product keyword index: tokenising, prefix/AND matching, ranking, upkeep
+  - In-memory search suggestions: no queries per keystroke, signal upkeep
+  - Product embeddings: encoder, generate_embeddings, IVF index, AI search tier
+  - AI search fallback tiers picked from a single candidate query
+"""
+import os
+import tempfile
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django_apscheduler.models import DjangoJob
+from rest_framework.test import APIClient
+
+from apps.core.models import (
+    Brand, Category, Color, MediaAsset, Product, ProductEmbedding, ProductSearchTerm, Review, Sizes,
+)
+from apps.core import autocomplete, embeddings
+from apps.core.search import ProductSearchIndex, reindex_related_products, tokenize
+from apps.core.serializers import ProductSerializer
+from apps.customers.models import Customer
+from apps.designers.models import Designer
+from apps.pay.services.pricing import get_country_from_ip
+from apps.utils import geoip
+
+User = get_user_model()
+
+LOCMEM_CACHE = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            username="designer", email="designer@example.com", password="password123"
+        )
+        size = Sizes.objects.create(name="M", description="Medium")
+        media = MediaAsset.objects.create(file="look.jpg")
+        cls.products = []
+        for i in range(12):
+            product = Product.objects.create(
+                user=user,
+                name=f"Product {i:02d}",
+                description="Listed",
+                price=100 + (i % 4) * 10,  # repeated prices exercise the id tiebreak
+                popularity_score=i % 3,
+                is_published=True,
+                is_admin_published=True,
+            )
+            product.media.add(media)
+            product.sizes.add(size)
+            Color.objects.create(product=product, name="Red")
+            cls.products.append(product)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def walk(self, url, **params):
+        ids, cursor, pages = [], "", 0
+        while True:
+            response = self.client.get(url, {**params, "cursor": cursor})
+            self.assertEqual(response.status_code, 200)
+            ids += [row["id"] for row in response.data["data"]]
+            pages += 1
+            cursor = response.data["pagination"]["next_cursor"]
+            if not response.data["pagination"]["has_next"]:
+                self.assertIsNone(cursor)
+                return ids, pages
+
+    def test_cursor_pages_match_offset_order(self):
+        url = reverse("core-products")
+        for sort in ("price_asc", "price_desc", "name_asc", "newest"):
+            legacy = self.client.get(url, {"sort": sort, "limit": 100}).data["data"]
+            ids, pages = self.walk(url, sort=sort, limit=5)
+            self.assertEqual(ids, [row["id"] for row in legacy])
+            self.assertEqual(pages, 3)
+
+    def test_trending_cursor_walk(self):
+        ids, _ = self.walk(reverse("trending-products"), limit=4)
+        expected = sorted(
+            self.products, key=lambda p: (p.popularity_score, p.created_at, p.id), reverse=True
+        )
+        self.assertEqual(ids, [p.id for p in expected])
+
+    def test_microsecond_apart_rows_are_neither_skipped_nor_repeated(self):
+        base = self.products[0].created_at.replace(microsecond=0)
+        for i, product in enumerate(self.products):
+            # All within one millisecond
+            Product.objects.filter(pk=product.pk).update(created_at=base + timedelta(microseconds=i * 50))
+        ids, _ = self.walk(reverse("core-products"), sort="newest", limit=5)
+        self.assertEqual(ids, [p.id for p in reversed(self.products)])
+
+    def test_count_is_opt_in(self):
+        url = reverse("core-products")
+        response = self.client.get(url, {"cursor": "", "limit": 5})
+        self.assertNotIn("total_items", response.data["pagination"])
+        response = self.client.get(url, {"cursor": "", "limit": 5, "include_count": "true"})
+        self.assertEqual(response.data["pagination"]["total_items"], 12)
+
+    def test_deep_page_costs_same_as_first(self):
+        url = reverse("core-products")
+        first = self.client.get(url, {"cursor": "", "limit": 4})
+        second = self.client.get(
+            url, {"cursor": first.data["pagination"]["next_cursor"], "limit": 4}
+        )
+        with CaptureQueriesContext(connection) as page_one:
+            self.client.get(url, {"cursor": "", "limit": 4})
+        with CaptureQueriesContext(connection) as page_three:
+            self.client.get(
+                url, {"cursor": second.data["pagination"]["next_cursor"], "limit": 4}
+            )
+        self.assertEqual(len(page_one), len(page_three))
+        self.assertFalse(any(q["sql"].upper().startswith("SELECT COUNT(") for q in page_three))
+        self.assertFalse(any("OFFSET" in q["sql"].upper() for q in page_three))
+
+    def test_invalid_cursor_rejected(self):
+        response = self.client.get(reverse("core-products"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ProductSerializerQueryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = Customer.objects.create(user=User.objects.create_user(
+            username="buyer", email="buyer@example.com", password="password123"
+        ))
+        category = Category.objects.create(name="Dresses", slug="dresses")
+        size = Sizes.objects.create(name="M", description="Medium")
+        for i in range(10):
+            designer_user = User.objects.create_user(
+                username=f"designer{i}", email=f"designer{i}@example.com", password="password123"
+            )
+            designer = Designer.objects.create(user=designer_user, brand_name=f"Brand {i}", country="NG")
+            designer.lookbook_files.add(MediaAsset.objects.create(file=f"lookbook{i}.jpg"))
+            product = Product.objects.create(
+                user=designer_user, name=f"Dress {i}", description="Listed",
+                price=100, category=category,
+            )
+            product.categories.add(category)
+            product.sizes.add(size)
+            Color.objects.create(product=product, name="Red")
+            product.media.add(
+                MediaAsset.objects.create(file=f"video{i}.mp4", media_type="video"),
+                MediaAsset.objects.create(file=f"front{i}.jpg"),
+                MediaAsset.objects.create(file=f"back{i}.jpg"),
+            )
+            for rating, approved in ((5, True), (2, True), (1, False)):
+                Review.objects.create(
+                    product=product, customer=customer, rating=rating, is_approved=approved
+                )
+
+    def serialize(self, limit):
+        queryset = ProductSerializer.setup_eager_loading(Product.objects.order_by("name"))
+        with CaptureQueriesContext(connection) as queries:
+            data = ProductSerializer(queryset[:limit], many=True).data
+        return data, len(queries)
+
+    def test_query_count_independent_of_page_size(self):
+        _, small = self.serialize(2)
+        _, large = self.serialize(10)
+        self.assertEqual(small, large)
+
+    def test_eager_output_matches_lazy_output(self):
+        eager, _ = self.serialize(10)
+        lazy = ProductSerializer(Product.objects.order_by("name"), many=True).data
+        self.assertEqual(eager, lazy)
+        self.assertEqual((eager[0]["avg_rating"], eager[0]["review_count"]), (3.5, 2))
+        self.assertTrue(eager[0]["thumbnail"].endswith("back0.jpg"))  # newest image
+        self.assertEqual(eager[0]["designer"]["brand_name"], "Brand 0")
+
+
+class GeoIPTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_path = os.path.join(self.tmp.name, "ip_country.npy")
+        self.addCleanup(geoip.set_resolver, None)
+
+    def load(self, *lines):
+        source = os.path.join(self.tmp.name, "ranges.csv")
+        with open(source, "w") as fh:
+            fh.write("\n".join(lines) + "\n")
+        call_command("load_geoip", source, output=self.db_path, stdout=open(os.devnull, "w"))
+        resolver = geoip.RangeTableResolver(self.db_path)
+        geoip.set_resolver(resolver)
+        return resolver
+
+    def test_range_and_cidr_rows(self):
+        resolver = self.load(
+            "41.58.0.0,41.58.255.255,NG",
+            "41.59.0.0/16,NG",           # adjacent, merged with the row above
+            "81.2.69.0/24,GB",
+            "2a02:c7c::,2a02:c7f:ffff:ffff:ffff:ffff:ffff:ffff,GB",
+        )
+        self.assertEqual(len(resolver), 3)
+        self.assertEqual(resolver.country("41.58.0.0"), "NG")
+        self.assertEqual(resolver.country("41.59.255.255"), "NG")
+        self.assertEqual(resolver.country("81.2.69.160"), "GB")
+        self.assertEqual(resolver.country("2a02:c7d::1"), "GB")
+        self.assertIsNone(resolver.country("41.60.0.0"))
+        self.assertIsNone(resolver.country("1.1.1.1"))
+
+    def test_maxmind_blocks_with_locations(self):
+        locations = os.path.join(self.tmp.name, "locations.csv")
+        with open(locations, "w") as fh:
+            fh.write("geoname_id,locale_code,country_iso_code\n2328926,en,NG\n")
+        blocks = os.path.join(self.tmp.name, "blocks.csv")
+        with open(blocks, "w") as fh:
+            fh.write("network,geoname_id,registered_country_geoname_id\n102.88.0.0/16,2328926,2328926\n")
+        call_command("load_geoip", blocks, locations=locations, output=self.db_path,
+                     stdout=open(os.devnull, "w"))
+        self.assertEqual(geoip.RangeTableResolver(self.db_path).country("102.88.1.2"), "NG")
+
+    def test_country_from_ip_is_local(self):
+        self.load("41.58.0.0/16,NG")
+        with patch("requests.get") as mock_get:
+            self.assertEqual(get_country_from_ip("41.58.3.4"), "NG")
+            self.assertEqual(get_country_from_ip("8.8.8.8"), "US")      # not in table
+            self.assertEqual(get_country_from_ip("192.168.1.5"), "US")  # private
+            self.assertEqual(get_country_from_ip("not-an-ip"), "US")
+        mock_get.assert_not_called()
+
+    def test_missing_database_falls_back(self):
+        geoip.set_resolver(geoip.RangeTableResolver(os.path.join(self.tmp.name, "missing.npy")))
+        self.assertEqual(get_country_from_ip("41.58.3.4"), "US")
+
+
+class ProductSearchIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            username="atelier", email="atelier@example.com", password="password123"
+        )
+        Designer.objects.create(user=user, brand_name="Lagos Atelier", country="NG")
+        dresses = Category.objects.create(name="Dresses")
+        cls.silk = Product.objects.create(
+            user=user, name="Silk Wrap Dress", description="Hand-dyed adire silk",
+            price=120, category=dresses,
+        )
+        cls.linen = Product.objects.create(
+            user=user, name="Linen Trousers", description="Relaxed fit, pairs with a silk top",
+            price=80,
+        )
+        cls.plain = Product.objects.create(name="Café Tote", description="Canvas bag", price=30)
+
+    def search(self, query, fields=None):
+        return set(ProductSearchIndex.filter(Product.objects.all(), query, fields))
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("The Silk-Wrap DRESSES, in Café!"), ["silk", "wrap", "dress", "cafe"])
+        self.assertEqual(tokenize("a & of"), [])
+
+    def test_prefix_and_all_terms_match(self):
+        self.assertEqual(self.search("sil dre"), {self.silk})
+        self.assertEqual(self.search("dresses"), {self.silk})
+        self.assertEqual(self.search("cafe"), {self.plain})
+        self.assertEqual(self.search("lagos"), {self.silk, self.linen})  # designer brand
+        self.assertEqual(self.search("silk"), {self.silk})  # description not searched by default
+        self.assertEqual(self.search("silk", fields=tuple(ProductSearchIndex.FIELDS)), {self.silk, self.linen})
+        self.assertEqual(self.search("silk velvet"), set())
+
+    def test_ranking_uses_field_boosts(self):
+        ranked = list(ProductSearchIndex.search(
+            Product.objects.all(), "silk", fields=tuple(ProductSearchIndex.FIELDS)
+        ))
+        self.assertEqual(ranked, [self.silk, self.linen])
+        self.assertGreater(ranked[0].search_rank, ranked[1].search_rank)
+
+    def test_index_follows_saves(self):
+        self.plain.name = "Velvet Clutch"
+        self.plain.save()
+        self.assertEqual(self.search("velvet"), {self.plain})
+        self.assertEqual(self.search("tote"), set())
+
+        brand = Brand.objects.create(name="Kente House")
+        self.plain.brand = brand
+        self.plain.save(update_fields=["brand"])
+        self.assertEqual(self.search("kente"), {self.plain})
+
+    def test_renames_reindex_products_in_a_deferred_job(self):
+        brand = Brand.objects.create(name="Kente House")
+        self.plain.brand = brand
+        self.plain.save(update_fields=["brand"])
+        with self.captureOnCommitCallbacks(execute=True):
+            brand.name = "Kente Studio"
+            brand.save()
+        self.assertEqual(self.search("studio"), set())  # not re-indexed inside the request
+        job = DjangoJob.objects.get(id=f"reindex_related_products:brand:{brand.pk}")
+        self.assertEqual(reindex_related_products("brand", brand.pk), 1)  # what the leader runs
+        self.assertEqual(self.search("studio"), {self.plain})
+        job.delete()
+
+        designer = Designer.objects.get(user=self.silk.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            designer.save()  # name unchanged
+            designer.brand_name = "Abuja Atelier"
+            designer.save(update_fields=["country"])  # name not saved
+        self.assertFalse(DjangoJob.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            designer.save(update_fields=["brand_name"])
+        self.assertEqual(reindex_related_products("designer", designer.user_id), 2)
+        self.assertEqual(self.search("abuja"), {self.silk, self.linen})
+        self.assertEqual(self.search("atelier"), {self.silk, self.linen})
+
+    def test_rebuild_drops_orphans(self):
+        ProductSearchTerm.objects.create(product=self.plain, term="stale", field="name", weight=1)
+        stats = ProductSearchIndex.rebuild()
+        self.assertEqual(stats["products"], 3)
+        self.assertFalse(ProductSearchTerm.objects.filter(term="stale").exists())
+
+
+class AutocompleteIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            username="studio", email="studio@example.com", password="password123"
+        )
+        Designer.objects.create(user=user, brand_name="Accra Studio", country="GH")
+        listed = dict(user=user, price=50, is_published=True, is_admin_published=True)
+        cls.kaftan = Product.objects.create(name="Kente Kaftan", description="-", popularity_score=5, **listed)
+        cls.kimono = Product.objects.create(name="Kente Kimono", description="-", popularity_score=9, **listed)
+        cls.draft = Product.objects.create(name="Kente Draft", description="-", user=user, price=50)
+        cls.kimono.media.add(
+            MediaAsset.objects.create(file="old.jpg"),
+            MediaAsset.objects.create(file="clip.mp4", media_type="video"),
+        )
+        cls.kimono.media.add(MediaAsset.objects.create(file="new.jpg"))
+
+    def setUp(self):
+        self.index = autocomplete.AutocompleteIndex()
+        self.index.BACKGROUND_REFRESH = False
+        autocomplete.set_index(self.index)
+        self.addCleanup(autocomplete.set_index, autocomplete.AutocompleteIndex())
+        self.client = APIClient()
+
+    def names(self, query):
+        return [row["name"] for row in self.index.suggest(query)]
+
+    def test_keystrokes_do_not_query_the_database(self):
+        url = reverse("core-search-suggestions")
+        self.client.get(url, {"q": "ka"})  # first use loads the index
+        with CaptureQueriesContext(connection) as queries:
+            for prefix in ("ke", "ken", "kent", "kente k", "kente ki"):
+                response = self.client.get(url, {"q": prefix})
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(response.data["data"][0]["name"], "Kente Kimono")
+        self.assertEqual(response.data["data"][0]["price"], "50.00")
+        self.assertTrue(response.data["data"][0]["thumbnail"].endswith("new.jpg"))
+
+    def test_prefix_popularity_and_fields(self):
+        self.assertEqual(self.names("kente"), ["Kente Kimono", "Kente Kaftan"])  # draft excluded
+        self.assertEqual(self.names("kente ka"), ["Kente Kaftan"])
+        self.assertEqual(self.names("accra"), ["Kente Kimono", "Kente Kaftan"])  # designer brand
+        self.assertEqual(self.names("silk"), [])
+
+    def test_signals_update_the_index(self):
+        self.index.suggest("kente")
+        self.kaftan.name = "Adire Kaftan"
+        self.kaftan.save()
+        self.draft.is_published = self.draft.is_admin_published = True
+        self.draft.save(update_fields=["is_published", "is_admin_published"])
+        self.kaftan.media.add(MediaAsset.objects.create(file="kaftan.jpg"))
+
+        self.assertEqual(self.names("kente"), ["Kente Kimono", "Kente Draft"])
+        self.assertTrue(self.index.suggest("adire")[0]["thumbnail"].endswith("kaftan.jpg"))
+
+        self.kimono.delete()
+        self.assertEqual(self.names("kente"), ["Kente Draft"])
+
+    def test_refresh_picks_up_changes_from_other_processes(self):
+        self.index.suggest("kente")
+        Product.objects.filter(pk=self.kaftan.pk).update(
+            popularity_score=20, updated_at=self.kaftan.updated_at + timedelta(seconds=1)
+        )
+        self.assertEqual(self.names("kente")[0], "Kente Kimono")  # no signal fired
+        self.index.refresh()
+        self.assertEqual(self.names("kente")[0], "Kente Kaftan")
+
+
+@override_settings(CACHES=LOCMEM_CACHE, GEMINI_SECRET_KEY="test-key")
+class ProductEmbeddingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            username="weaver", email="weaver@example.com", password="password123"
+        )
+        media = MediaAsset.objects.create(file="gown.jpg")
+        listed = dict(user=user, price=90, stock=3, is_published=True, is_admin_published=True)
+        cls.gowns = []
+        for i in range(6):
+            product = Product.objects.create(
+                name=f"Ankara Ball Gown {i}", description="Flowing ankara print evening gown", **listed
+            )
+            product.media.add(media)
+            Color.objects.create(product=product, name="Emerald")
+            cls.gowns.append(product)
+        cls.loafer = Product.objects.create(name="Suede Loafer", description="Leather shoe", **listed)
+        cls.loafer.media.add(media)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.settings_override = override_settings(EMBEDDING_INDEX_DIR=self.tmp.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        embeddings.set_index(embeddings.ProductVectorIndex(self.tmp.name))
+        self.addCleanup(embeddings.set_index, None)
+
+    def generate(self, **options):
+        call_command("generate_embeddings", stdout=open(os.devnull, "w"), **options)
+
+    def test_encoder_is_deterministic_and_normalised(self):
+        encoder = embeddings.HashingEncoder()
+        a, b, c = encoder.encode(["ankara gowns", "Ankara gown for a party", "suede loafers"])
+        self.assertAlmostEqual(float(a @ a), 1.0, places=5)
+        self.assertGreater(a @ b, a @ c)
+        self.assertTrue((encoder.encode(["ankara gowns"])[0] == a).all())
+
+    def test_generate_embeddings_is_incremental(self):
+        self.generate()
+        row = ProductEmbedding.objects.get(product=self.loafer)
+        self.assertEqual(row.dimensions, embeddings.HashingEncoder.dimensions)
+        self.assertEqual(len(bytes(row.vector)), row.dimensions * 4)
+        self.assertIn("Emerald", ProductEmbedding.objects.get(product=self.gowns[0]).embedding_text)
+
+        self.assertEqual(embeddings.encode_products()["encoded"], 0)
+        self.loafer.name = "Suede Driving Loafer"
+        self.loafer.save()
+        self.assertEqual(embeddings.encode_products()["encoded"], 1)
+
+        self.assertEqual(embeddings.semantic_search("suede loafers", k=1), [self.loafer.id])
+
+    def test_ivf_probe_matches_exact_search(self):
+        self.generate()
+        exact = embeddings.ProductVectorIndex(self.tmp.name).search(
+            embeddings.get_encoder().encode(["evening gown"])[0], k=7
+        )
+        with patch.object(embeddings.ProductVectorIndex, "EXACT_MAX", 2):
+            info = embeddings.export_index(self.tmp.name)
+        self.assertGreater(info["lists"], 1)
+        index = embeddings.ProductVectorIndex(self.tmp.name)
+        index.NPROBE = info["lists"]
+        probed = index.search(embeddings.get_encoder().encode(["evening gown"])[0], k=7)
+        self.assertEqual(dict(probed).keys(), dict(exact).keys())
+        for (_, got), (_, want) in zip(probed, exact):
+            self.assertAlmostEqual(got, want, places=5)
+
+    def test_missing_index_is_skipped(self):
+        self.assertEqual(embeddings.semantic_search("gown"), [])
+
+    def test_ai_search_semantic_tier(self):
+        self.generate()
+        filters = {"is_support": False, "search": "emerald ankara maxi gown", "style_note": "Here you go."}
+        with patch("apps.core.views._call_gemini", return_value=filters, create=True):
+            response = APIClient().post(reverse("core-ai-search"), {"query": "emerald ankara maxi gown"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["fallback_reason"], "semantic")
+        self.assertEqual({row["id"] for row in response.data["data"]}, {p.id for p in self.gowns})
+
+
+@override_settings(CACHES=LOCMEM_CACHE, GEMINI_SECRET_KEY="test-key")
+class AiSearchTierTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            username="kente", email="kente@example.com", password="password123"
+        )
+        media = MediaAsset.objects.create(file="kente.jpg")
+
+        def listed(name, popularity, **fields):
+            fields = {"price": 100, "occasion": "wedding", **fields}
+            product = Product.objects.create(
+                user=user, name=name, stock=2, is_published=True, is_admin_published=True,
+                popularity_score=popularity, **fields,
+            )
+            product.media.add(media)
+            return product
+
+        cls.dress = listed("Kente Wrap Dress", 5, is_sustainable=True)
+        cls.skirt = listed("Kente Wrap Skirt", 9, price=80)
+        cls.blazer = listed("Kente Work Blazer", 1, price=300, occasion="work")
+        cls.shirt = listed("Linen Shirt", 20, price=50, occasion="casual")
+
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        embeddings.set_index(embeddings.ProductVectorIndex(tmp.name))  # no semantic tier
+        self.addCleanup(embeddings.set_index, None)
+
+    def search(self, **filters):
+        filters = {"is_support": False, "style_note": "Here you go.", **filters}
+        with patch("apps.core.views._call_gemini", return_value=filters, create=True):
+            response = APIClient().post(reverse("core-ai-search"), {"query": filters["search"]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.data["fallback_reason"], [row["id"] for row in response.data["data"]]
+
+    def test_tiers(self):
+        wedding = {"search": "kente", "occasion": "wedding", "is_sustainable": True}
+        self.assertEqual(self.search(**wedding), (None, [self.dress.id]))
+        self.assertEqual(self.search(**wedding, max_price=90), ("loosened", [self.skirt.id]))
+        self.assertEqual(
+            self.search(search="kente", occasion="party"),
+            ("keyword_only", [self.skirt.id, self.dress.id, self.blazer.id]),
+        )
+        self.assertEqual(
+            self.search(search="velvet", max_price=150),
+            ("trending_fallback", [self.shirt.id, self.skirt.id, self.dress.id]),
+        )
+        self.assertEqual(self.search(search="velvet", max_price=10), ("budget_empty", []))
+
+    def test_fallback_costs_no_extra_queries(self):
+        with CaptureQueriesContext(connection) as exact:
+            self.search(search="kente", occasion="wedding")
+        with CaptureQueriesContext(connection) as fallback:
+            self.assertEqual(self.search(search="velvet")[0], "trending_fallback")
+        self.assertEqual(len(fallback), len(exact))
@@ -39,7 +39,6 @@ from .views import (
     SupportTicketReplyView,
     SmartCollectionListView,
     SmartCollectionDetailView,
-    TrackEventsView,
     DesignerAnalyticsView,
     LoyaltyBalanceView,
     LoyaltyHistoryView,
@@ -153,7 +152,7 @@ urlpatterns += [
     path("subscribe", SubscribeView.as_view(), name="core-subscribe"),
 
     # �📊 Tracking & Analytics
-    path("track", TrackEventsView.as_view(), name="track-events"),
+    # POST /core/track is served by apps.algorithm (buffered ingestion)
     path("designers/analytics", DesignerAnalyticsView.as_view(), name="designer-analytics"),
 
     # 🎁 Loyalty
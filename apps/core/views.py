@@ -6,7 +6,7 @@ from django.core.cache import cache
 from django.core.paginator import Paginator
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
-from django.db.models import Avg, Prefetch, Sum, Count
+from django.db.models import Avg, BooleanField, Case, Exists, IntegerField, OuterRef, Prefetch, Sum, Count, Value, When
 from google import genai
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -15,9 +15,13 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from apps.designers.models import DesignerStory
 from apps.designers.serializers import StorySerializer
 from apps.utils.email_sender import resend_sendmail
+from .pagination import KeysetPagination
+from .autocomplete import get_index as get_autocomplete_index
+from .embeddings import semantic_search
+from .search import ProductSearchIndex
 from django.db.models.functions import Lower
 from .models import (
-    Brand, Country, Currency, Category, MediaAsset, Product, Review, Sizes,
+    Brand, Color, Country, Currency, Category, MediaAsset, Product, Review, Sizes,
     UserSettings, SmartCollection, ProductView, DesignerDailyAnalytics,
     LoyaltyPoints, LoyaltyBalance, SizeRecommendation, UserLookbook,
     SubscriptionPlan, UserSubscription,
@@ -494,25 +498,15 @@ class ProductListView(APIView):
         # -----------------------
         queryset = (
             Product.objects.filter(is_published=True, is_admin_published=True, is_active=True)
-            .annotate(media_count=Count("media"))
-            .filter(media_count__gt=0)
-            .annotate(color_count=Count("colors", distinct=True))
-            .annotate(size_count=Count("sizes", distinct=True))
-            .filter(color_count__gt=0, size_count__gt=0)
-            .select_related(
-                "user",
-                "currency",
-                "category",
-                "subcategory",
-                "brand",
-                "country_of_origin",
-            )
-            .prefetch_related(
-                "media",
-                "sizes",
-                "user__designer_profile",
+            # Listable products need media, colours and sizes; EXISTS keeps
+            # the query free of GROUP BY so pages stay cheap
+            .filter(
+                Exists(Product.media.through.objects.filter(product_id=OuterRef("pk"))),
+                Exists(Color.objects.filter(product_id=OuterRef("pk"))),
+                Exists(Product.sizes.through.objects.filter(product_id=OuterRef("pk"))),
             )
         )
+        queryset = ProductSerializer.setup_eager_loading(queryset)
 
         # -----------------------
         # SORTING (Frontend Driven)
@@ -523,47 +517,44 @@ class ProductListView(APIView):
         search = request.GET.get("search", "").strip()
 
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(brand__name__icontains=search) |
-                Q(category__name__icontains=search) |
-                Q(subcategory__name__icontains=search) |
-                Q(user__designer_profile__brand_name__icontains=search)
-            )
+            queryset = ProductSearchIndex.filter(queryset, search)
 
         sort = request.GET.get("sort")
 
+        # Every ordering ends with id so pages (and cursors) are stable
         if sort:
             if sort == "price_asc":
-                queryset = queryset.order_by("price")
+                ordering = ["price", "id"]
 
             elif sort == "price_desc":
-                queryset = queryset.order_by("-price")
+                ordering = ["-price", "-id"]
 
             elif sort == "name_asc":
-                queryset = queryset.order_by("name")
+                ordering = ["name", "id"]
 
             elif sort == "newest":
-                queryset = queryset.order_by("-created_at")
+                ordering = ["-created_at", "-id"]
 
             else:
-                queryset = queryset.order_by("-created_at")
+                ordering = ["-created_at", "-id"]
 
         else:
             # fallback to tab behavior if no explicit sort
             tab = request.GET.get("tab", "new")
 
             if tab == "new":
-                queryset = queryset.order_by("-created_at")
+                ordering = ["-created_at", "-id"]
 
             elif tab == "trending":
-                queryset = queryset.order_by("-popularity_score", "-created_at")
+                ordering = ["-popularity_score", "-created_at", "-id"]
 
             elif tab == "sustainable":
-                queryset = queryset.filter(is_sustainable=True).order_by("-created_at")
+                queryset = queryset.filter(is_sustainable=True)
+                ordering = ["-created_at", "-id"]
 
             else:
-                queryset = queryset.order_by("-created_at")
+                ordering = ["-created_at", "-id"]
+        queryset = queryset.order_by(*ordering)
         # -----------------------
         # DESIGNER COUNTRY FILTER
         # -----------------------
@@ -643,6 +634,16 @@ class ProductListView(APIView):
         # -----------------------
         # PAGINATION (Infinite Scroll)
         # -----------------------
+        if KeysetPagination.is_requested(request):
+            products, pagination = KeysetPagination(ordering, default_limit=20).paginate(
+                queryset.distinct(), request
+            )
+            serializer = ProductSerializer(products, many=True)
+            return Response(
+                {"status": "success", "data": serializer.data, "pagination": pagination},
+                status=status.HTTP_200_OK,
+            )
+
         page = int(request.GET.get("page", 1))
         limit = int(request.GET.get("limit", 20))
 
@@ -680,20 +681,21 @@ class TrendingProducts(APIView):
         queryset = (
             Product.objects.filter(is_published=True,is_admin_published = True, is_active=True)
             .exclude(media=False)
-            .select_related(
-                "user",
-                "currency",
-                "category",
-                "subcategory",
-                "brand",
-            )
-            .prefetch_related(
-                "media",
-                "user__designer_profile",
-            )
         )
+        queryset = ProductSerializer.setup_eager_loading(queryset)
 
-        queryset = queryset.order_by("-popularity_score", "-created_at")
+        ordering = ["-popularity_score", "-created_at", "-id"]
+        queryset = queryset.order_by(*ordering)
+
+        if KeysetPagination.is_requested(request):
+            products, pagination = KeysetPagination(ordering, default_limit=10).paginate(
+                queryset.distinct(), request
+            )
+            serializer = ProductSerializer(products, many=True)
+            return Response(
+                {"status": "success", "data": serializer.data, "pagination": pagination},
+                status=status.HTTP_200_OK,
+            )
 
         page = int(request.GET.get("page", 1))
         limit = int(request.GET.get("limit", 10))
@@ -946,26 +948,7 @@ class SearchSuggestions(APIView):
         if not query:
             return Response({"data": []})
 
-        products = (
-            Product.objects
-            .filter(name__icontains=query, is_published=True, is_admin_published=True, is_active=True)
-            .prefetch_related("media")
-            .order_by("name")
-            .distinct()[:6]
-        )
-
-        data = []
-        for product in products:
-            first_image = product.media.filter(media_type="image").first()
-            data.append({
-                "id": product.id,
-                "name": product.name,
-                "slug": product.slug,
-                "price": str(product.price),
-                "thumbnail": first_image.file.url if first_image else None,
-            })
-
-        return Response({"data": data})
+        return Response({"data": get_autocomplete_index().suggest(query)})
 
 
 
@@ -1381,50 +1364,6 @@ class SmartCollectionDetailView(APIView):
         return Response({"status": "success", "data": serializer.data})
 
 
-# -------------------------------
-# Event Tracking (Phase 2)
-# -------------------------------
-class TrackEventsView(APIView):
-    """POST /core/track — batch event ingestion from frontend."""
-    permission_classes = [AllowAny]
-
-    def post(self, request):
-        events = request.data if isinstance(request.data, list) else [request.data]
-        created = 0
-        for ev in events:
-            product_id = ev.get("metadata", {}).get("product_id") or ev.get("product_id")
-            designer_id = ev.get("metadata", {}).get("designer_id") or ev.get("designer_id")
-            source = ev.get("metadata", {}).get("source", "organic")
-            event_type = ev.get("event_type", "product_view")
-            session_id = ev.get("session_id", "")
-
-            if not product_id:
-                continue
-
-            product = Product.objects.filter(id=product_id).first()
-            if not product:
-                continue
-
-            designer = None
-            if designer_id:
-                try:
-                    designer = Designer.objects.get(id=designer_id)
-                except Designer.DoesNotExist:
-                    pass
-
-            ProductView.objects.create(
-                product=product,
-                designer=designer,
-                session_id=session_id,
-                event_type=event_type,
-                source=source,
-                metadata=ev.get("metadata", {}),
-            )
-            created += 1
-
-        return Response({"status": "success", "tracked": created}, status=status.HTTP_201_CREATED)
-
-
 # -------------------------------
 # Designer Analytics (Phase 2)
 # -------------------------------
@@ -1555,64 +1494,105 @@ class AiSearchView(APIView):
     Accepts a natural language query, uses Gemini 1.5 Flash to parse it into
     structured filters, queries the database and returns matching products.
 
-    Fallback tiers (applied when results < MIN_RESULTS):
+    Fallback tiers (each applied when the previous one matched nothing):
       1. Exact Gemini filters
-      2. Drop price / availability / sustainability constraints
-      3. Keyword-only match
-      4. Trending products
+      2. Semantic (embedding) neighbours of the query, exact filters kept
+      3. Drop availability / sustainability constraints
+      4. Keyword-only match
+      5. Trending products
+    The budget is kept in every tier. All tiers are picked in memory from a
+    single candidate query (see _candidates).
     """
     permission_classes = [AllowAny]
-    MIN_RESULTS = 6
+    SEMANTIC_CANDIDATES = 200
+    CANDIDATES = 200  # rows fetched for tier selection; also caps total_items
 
     # ── DB helpers ────────────────────────────────────────────────────────
 
-    def _base_qs(self):
+    def _listed_qs(self):
         return (
             Product.objects
             .filter(is_published=True, is_admin_published=True, is_active=True, stock__gt=0)
             .exclude(media=False)
-            .select_related("user", "currency", "category", "subcategory", "brand", "country_of_origin")
-            .prefetch_related("media", "sizes", "user__designer_profile")
         )
 
-    def _apply_keyword(self, qs, term):
+    def _base_qs(self):
+        return ProductSerializer.setup_eager_loading(self._listed_qs())
+
+    # Each tier's constraints as a Q(); ANY matches every row.
+    ANY = Q(pk__isnull=False)
+
+    def _keyword_q(self, term):
         if not term:
-            return qs
-        return qs.filter(
-            Q(name__icontains=term) |
-            Q(brand__name__icontains=term) |
-            Q(category__name__icontains=term) |
-            Q(subcategory__name__icontains=term) |
-            Q(description__icontains=term) |
-            Q(user__designer_profile__brand_name__icontains=term)
-        )
+            return self.ANY
+        condition = ProductSearchIndex.matching(term, fields=tuple(ProductSearchIndex.FIELDS))
+        if condition is None:
+            term = term.strip()
+            return Q(name__icontains=term) if term else self.ANY
+        return condition
+
+    def _budget_q(self, f):
+        q = self.ANY
+        if f.get("min_price"):
+            q &= Q(price__gte=f["min_price"])
+        if f.get("max_price"):
+            q &= Q(price__lte=f["max_price"])
+        return q
 
-    def _apply_exact_filters(self, qs, f):
+    def _loose_q(self, f):
+        """Loosen non-price filters only — budget is applied to every tier."""
+        q = self.ANY
         if f.get("occasion"):
-            qs = qs.filter(occasion=f["occasion"])
+            q &= Q(occasion=f["occasion"])
         if f.get("print_type"):
-            qs = qs.filter(print_type=f["print_type"])
+            q &= Q(print_type=f["print_type"])
+        return q
+
+    def _exact_q(self, f):
+        q = self._loose_q(f)
         if f.get("availability_type"):
-            qs = qs.filter(availability_type__icontains=f["availability_type"])
+            q &= Q(availability_type__icontains=f["availability_type"])
         if f.get("is_sustainable") is True:
-            qs = qs.filter(is_sustainable=True)
-        if f.get("min_price"):
-            qs = qs.filter(price__gte=f["min_price"])
-        if f.get("max_price"):
-            qs = qs.filter(price__lte=f["max_price"])
-        return qs
+            q &= Q(is_sustainable=True)
+        return q
 
-    def _apply_loose_filters(self, qs, f):
-        """Loosen non-price filters only — always preserve budget constraints."""
-        if f.get("occasion"):
-            qs = qs.filter(occasion=f["occasion"])
-        if f.get("print_type"):
-            qs = qs.filter(print_type=f["print_type"])
-        if f.get("min_price"):
-            qs = qs.filter(price__gte=f["min_price"])
-        if f.get("max_price"):
-            qs = qs.filter(price__lte=f["max_price"])
-        return qs
+    def _candidates(self, f, semantic_ids, size):
+        """
+        One query for every tier: the listed, in-budget products with a flag
+        per tier constraint, ordered by the best tier each satisfies and
+        then popularity. A tier is only tried once every earlier tier came
+        up empty, so its rows are never pushed out of the first `size` by
+        rows of earlier tiers.
+        """
+        search = f.get("search")
+        keyword, exact, loose = self._keyword_q(search), self._exact_q(f), self._loose_q(f)
+        semantic = Q(id__in=semantic_ids) & exact if semantic_ids else None
+
+        def flag(condition):
+            if condition is None:
+                return Value(False)
+            return Case(When(condition, then=Value(True)), default=Value(False), output_field=BooleanField())
+
+        best_tier = [When(keyword & exact, then=Value(1))]
+        if semantic is not None:
+            best_tier.append(When(semantic, then=Value(2)))
+        best_tier.append(When(keyword & loose, then=Value(3)))
+        if search:
+            best_tier.append(When(keyword, then=Value(4)))
+        return list(
+            self._listed_qs()
+            .filter(self._budget_q(f))
+            .annotate(
+                is_keyword=flag(keyword),
+                is_exact=flag(exact),
+                is_loose=flag(loose),
+                is_semantic=flag(semantic),
+                best_tier=Case(*best_tier, default=Value(5), output_field=IntegerField()),
+            )
+            .order_by("best_tier", "-popularity_score", "-created_at")
+            .values("id", "popularity_score", "created_at", "is_keyword", "is_exact", "is_loose", "is_semantic")
+            [:size]
+        )
 
     # ── Canonical cache helpers ───────────────────────────────────────────
 
@@ -1906,27 +1886,34 @@ class AiSearchView(APIView):
         limit = int(request.GET.get("limit", 6))
         is_fallback = False
         fallback_reason = None
+        search = parsed_filters.get("search")
+
+        # Step 2 — One candidate fetch; every tier below is picked from it.
+        # The semantic ids come from the in-memory vector index, not the DB.
+        semantic_ids = semantic_search(f"{search} {message}", k=self.SEMANTIC_CANDIDATES) if search else []
+        candidates = self._candidates(parsed_filters, semantic_ids, max(limit, self.CANDIDATES, len(semantic_ids)))
+
+        def _popular(rows):
+            return sorted(rows, key=lambda c: (c["popularity_score"], c["created_at"]), reverse=True)
 
-        def _has_enough(queryset, min_needed):
-            """Check if queryset has >= min_needed results without a full COUNT."""
-            return queryset[:min_needed].exists()
-
-        # Step 2 — Tier 1: Exact filters
-        qs = self._base_qs()
-        qs = self._apply_keyword(qs, parsed_filters.get("search"))
-        qs = self._apply_exact_filters(qs, parsed_filters)
-        qs = qs.order_by("-popularity_score", "-created_at").distinct()
-        has_results = _has_enough(qs, self.MIN_RESULTS)
-
-        # Step 3 — Tier 2: Loosen price/availability/sustainability
-        if not has_results:
-            qs2 = self._base_qs()
-            qs2 = self._apply_keyword(qs2, parsed_filters.get("search"))
-            qs2 = self._apply_loose_filters(qs2, parsed_filters)
-            qs2 = qs2.order_by("-popularity_score", "-created_at").distinct()
-            if _has_enough(qs2, self.MIN_RESULTS):
-                qs = qs2
-                has_results = True
+        # Tier 1: Exact filters
+        rows = _popular(c for c in candidates if c["is_keyword"] and c["is_exact"])
+
+        # Tier 2: Semantic neighbours, same filters, closest first
+        if not rows and semantic_ids:
+            closeness = {pk: rank for rank, pk in enumerate(semantic_ids)}
+            rows = sorted((c for c in candidates if c["is_semantic"]), key=lambda c: closeness[c["id"]])
+            if rows:
+                is_fallback, fallback_reason = True, "semantic"
+                parsed_filters["style_note"] = (
+                    f"{parsed_filters.get('style_note', '')} I couldnt find an exact match for those words, "
+                    f"so here are the pieces closest to what you described."
+                ).strip()
+
+        # Tier 3: Loosen availability/sustainability
+        if not rows:
+            rows = _popular(c for c in candidates if c["is_keyword"] and c["is_loose"])
+            if rows:
                 is_fallback, fallback_reason = True, "loosened"
                 original = parsed_filters.get("style_note", "")
                 if parsed_filters.get("max_price"):
@@ -1935,34 +1922,20 @@ class AiSearchView(APIView):
                         f"so Ive loosened the style filters while keeping your budget in mind."
                     )
 
-        # Step 4 — Tier 3: Keyword-only + budget preserved
-        if not has_results and parsed_filters.get("search"):
-            qs3 = self._base_qs()
-            qs3 = self._apply_keyword(qs3, parsed_filters.get("search"))
-            if parsed_filters.get("min_price"):
-                qs3 = qs3.filter(price__gte=parsed_filters["min_price"])
-            if parsed_filters.get("max_price"):
-                qs3 = qs3.filter(price__lte=parsed_filters["max_price"])
-            qs3 = qs3.order_by("-popularity_score", "-created_at").distinct()
-            if _has_enough(qs3, self.MIN_RESULTS):
-                qs = qs3
-                has_results = True
+        # Tier 4: Keyword-only + budget preserved
+        if not rows and search:
+            rows = _popular(c for c in candidates if c["is_keyword"])
+            if rows:
                 is_fallback, fallback_reason = True, "keyword_only"
                 parsed_filters["style_note"] = (
                     "I couldnt find an exact match, but here are the closest pieces "
                     "our designers have to offer \u2014 styled with your vibe in mind."
                 )
 
-        # Step 5 — Tier 4: Trending fallback with budget preserved
-        if not has_results:
-            qs4 = self._base_qs().order_by("-popularity_score", "-created_at").distinct()
-            if parsed_filters.get("min_price"):
-                qs4 = qs4.filter(price__gte=parsed_filters["min_price"])
-            if parsed_filters.get("max_price"):
-                qs4 = qs4.filter(price__lte=parsed_filters["max_price"])
-            if _has_enough(qs4, self.MIN_RESULTS):
-                qs = qs4
-                has_results = True
+        # Tier 5: Trending fallback with budget preserved
+        if not rows:
+            rows = _popular(candidates)
+            if rows:
                 is_fallback, fallback_reason = True, "trending_fallback"
                 parsed_filters["style_note"] = (
                     "I couldnt find pieces that exactly match your description right now \u2014 "
@@ -1970,16 +1943,18 @@ class AiSearchView(APIView):
                 )
             else:
                 # Budget too tight — be honest rather than showing over-budget items
-                qs = qs4
                 is_fallback, fallback_reason = True, "budget_empty"
                 parsed_filters["style_note"] = (
                     f"I couldnt find anything in that price range right now. "
                     f"Would you like me to broaden the budget or suggest alternatives?"
                 )
 
-        paginator = Paginator(qs, limit)
+        # Counted within the candidates, which always hold the full first page
+        paginator = Paginator([c["id"] for c in rows], limit)
         page_obj = paginator.get_page(1)
-        serializer = ProductSerializer(page_obj, many=True)
+        id_order = {pk: idx for idx, pk in enumerate(page_obj)}
+        products = sorted(self._base_qs().filter(id__in=list(page_obj)), key=lambda p: id_order[p.id])
+        serializer = ProductSerializer(products, many=True)
 
         style_note = parsed_filters.get("style_note", "Here are the pieces I found for you.")
         # Final safeguard: if we have products, ensure the message isn't the off-topic one
@@ -2303,8 +2278,8 @@ class AiOutfitBuilderView(APIView):
                 return Response({"status": "error", "message": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
         elif query:
             # Quick keyword search for primary
-            primary = Product.objects.filter(
-                Q(name__icontains=query) | Q(description__icontains=query)
+            primary = ProductSearchIndex.filter(
+                Product.objects.all(), query, fields=("name", "description")
             ).select_related("user__designer_profile", "category").annotate(
                 avg_rating=Avg("reviews__rating", filter=Q(reviews__is_approved=True))
             ).order_by("-avg_rating").first()
@@ -2472,10 +2447,8 @@ class AiSmartCollectionView(APIView):
         if product_ids:
             products = list(Product.objects.filter(id__in=product_ids))
         else:
-            products = list(Product.objects.filter(
-                Q(name__icontains=query) |
-                Q(description__icontains=query) |
-                Q(category__name__icontains=query)
+            products = list(ProductSearchIndex.search(
+                Product.objects.all(), query, fields=("name", "description", "category")
             )[:20])
 
         if not products:
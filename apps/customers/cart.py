@@ -0,0 +1,72 @@
+"""
+Cart reconciliation.
+
+The cart is read on nearly every page view. load_cart() fetches the items
+with everything CartItemSerializer reads in a fixed number of queries,
+reconcile_cart() sorts them in memory into kept, clamped and removed, and the
+outcome is written back with at most one bulk delete and one bulk update.
+"""
+from django.db import transaction
+from django.db.models import Prefetch
+
+from apps.core.models import Product
+from apps.core.serializers import ProductSerializer
+
+from .models import CartItem
+
+
+def load_cart(customer) -> list:
+    """The customer's cart items, products eager loaded for serialization."""
+    return list(
+        CartItem.objects.filter(customer=customer)
+        .select_related("color", "size")
+        .prefetch_related(
+            Prefetch(
+                "product",
+                # account_detail: pricing falls back to it for the ship-from country
+                queryset=ProductSerializer.setup_eager_loading(Product.objects.select_related("user__account_detail")),
+            )
+        )
+        .order_by("pk")
+    )
+
+
+def reconcile_cart(items) -> tuple:
+    """
+    (valid items, removed_items report). Unavailable and out-of-stock items
+    are deleted; quantities above stock are clamped to it.
+    """
+    valid, removed, doomed, clamped = [], [], [], []
+    for item in items:
+        product = item.product
+        # Product no longer exists, inactive, or unpublished
+        if not product or not product.is_active or not product.is_published:
+            removed.append({"name": product.name if product else "Unknown", "reason": "no_longer_available"})
+            doomed.append(item.pk)
+            continue
+
+        if product.stock <= 0:
+            removed.append({"name": product.name, "reason": "out_of_stock"})
+            doomed.append(item.pk)
+            continue
+
+        # Quantity exceeds available stock — clamp to stock instead of removing
+        if product.stock < item.quantity:
+            removed.append({
+                "name": product.name,
+                "reason": "quantity_adjusted",
+                "old_quantity": item.quantity,
+                "new_quantity": product.stock,
+            })
+            item.quantity = product.stock
+            clamped.append(item)
+
+        valid.append(item)
+
+    if doomed or clamped:
+        with transaction.atomic():
+            if doomed:
+                CartItem.objects.filter(pk__in=doomed).delete()
+            if clamped:
+                CartItem.objects.bulk_update(clamped, ["quantity"])
+    return valid, removed
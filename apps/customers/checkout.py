@@ -0,0 +1,151 @@
+"""
+Checkout writes.
+
+CheckoutView prices the cart once, then places the order in a single
+transaction:
+
+  - stock for every line is reserved with one conditional UPDATE
+    (`stock >= quantity` per product), so two buyers racing for the last
+    units cannot both succeed and nothing is decremented unless every line
+    fits;
+  - order items, designer orders and notifications are bulk inserted;
+  - work that must not run for a rolled-back order (the scoring updates
+    the OrderItem post_save receiver would have queued) is published with
+    transaction.on_commit.
+"""
+from random import random
+
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Q, When
+from django.utils import timezone
+
+from apps.core.models import Product
+from apps.designers.models import DesignerOrder, Notification
+from apps.utils.masking import generate_masked_email, generate_masked_phone
+
+from .models import OrderItem
+
+LOW_STOCK = 5
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id):
+        super().__init__(f"Not enough stock for product {product_id}")
+        self.product_id = product_id
+
+
+class _Short(Exception):
+    pass
+
+
+def reserve_stock(quantities: dict) -> dict:
+    """
+    Take {product pk: quantity} out of stock in one statement. Must run
+    inside transaction.atomic(). Raises OutOfStock for the first product
+    that no longer fits, leaving every row untouched. Returns
+    {product pk: stock left}.
+    """
+    fits = Q()
+    for pk, quantity in quantities.items():
+        fits |= Q(pk=pk, stock__gte=quantity)
+    try:
+        with transaction.atomic():
+            updated = Product.objects.filter(fits).update(
+                stock=Case(
+                    *[When(pk=pk, then=F("stock") - quantity) for pk, quantity in quantities.items()],
+                    output_field=IntegerField(),
+                ),
+                updated_at=timezone.now(),
+            )
+            if updated != len(quantities):
+                raise _Short
+    except _Short:
+        # The savepoint is rolled back, so these are the competing buyers' numbers
+        current = dict(Product.objects.filter(pk__in=list(quantities)).values_list("pk", "stock"))
+        raise OutOfStock(next(
+            (pk for pk, quantity in quantities.items() if current.get(pk, 0) < quantity),
+            next(iter(quantities)),
+        ))
+    return dict(Product.objects.filter(pk__in=list(quantities)).values_list("pk", "stock"))
+
+
+def create_order_items(order, customer, lines) -> list:
+    """
+    Bulk insert the order's items and their designer orders. `lines` are
+    dicts of OrderItem field values (product, quantity, color, size,
+    properties, sub_total, amount).
+    """
+    stamp = timezone.now().strftime('%Y%m%d%H%M')
+    items = []
+    for line in lines:
+        item = OrderItem(order=order, **line)
+        # OrderItem.save() fills these; bulk_create does not call it
+        item.tracking_number = f"URBITR-{order.pk}-{stamp}-{(random() * 99999999990).__round__()}"
+        item.designer_id = item.product.user_id
+        item.masked_email = generate_masked_email(customer.user.email)
+        item.masked_phone = generate_masked_phone(customer.phone)
+        items.append(item)
+    OrderItem.objects.bulk_create(items)
+
+    if not connection.features.can_return_rows_from_bulk_insert:
+        # MySQL: read the ids back by the (unique) tracking numbers
+        ids = dict(
+            OrderItem.objects.filter(order=order).values_list("tracking_number", "id")
+        )
+        for item in items:
+            item.pk = ids[item.tracking_number]
+
+    DesignerOrder.objects.bulk_create(
+        [DesignerOrder(order_item=item, user_id=item.product.user_id) for item in items]
+    )
+    return items
+
+
+def notify_designers(items, stock_left: dict) -> None:
+    """New-order notification per item, low-stock alert per product."""
+    notifications = [
+        Notification(
+            user_id=item.product.user_id,
+            title="New order received",
+            message=f"You have a new order for {item.product.name} (Qty: {item.quantity}).",
+            notification_type=Notification.Type.ORDER,
+            link=f"/orders/{item.pk}",
+        )
+        for item in items
+    ]
+    products = {item.product.pk: item.product for item in items}
+    for pk, product in products.items():
+        left = stock_left.get(pk)
+        if left is not None and 0 <= left <= LOW_STOCK:
+            notifications.append(Notification(
+                user_id=product.user_id,
+                title="Low stock alert",
+                message=f"Your product '{product.name}' is running low. Only {left} units left in stock.",
+                notification_type=Notification.Type.PRODUCT,
+                link=f"/products/edit/{pk}",
+            ))
+    Notification.objects.bulk_create(notifications)
+
+
+def publish_order_placed(items) -> None:
+    """
+    After commit, queue what OrderItem's post_save receiver does for each
+    purchase (bulk_create skips it): one rescore per product and one
+    designer score per designer.
+    """
+    product_ids = {item.product_id for item in items if item.product_id}
+    designer_ids = {item.designer_id for item in items if item.designer_id}
+
+    def publish():
+        from apps.algorithm.services import ProductScoringEngine
+
+        for product_id in product_ids:
+            ProductScoringEngine.schedule_rescore(product_id)
+        try:
+            from celery import current_app
+            for designer_id in designer_ids:
+                current_app.send_task("apps.algorithm.tasks.compute_designer_score", args=[designer_id])
+        except Exception:
+            pass
+
+    transaction.on_commit(publish)
@@ -78,6 +78,14 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
     def get_subtotal(self, obj):
+        request = self.context.get('request')
+        if request:
+            try:
+                from apps.pay.services.pricing import PricingContext
+                breakdown = PricingContext.for_request(request).breakdown(obj.product)
+                return breakdown['total_price'] * obj.quantity
+            except Exception as e:
+                print(f"[Dynamic Pricing Warning] Failed to price cart item {obj.id}: {str(e)}")
         return obj.subtotal()
     def to_representation(self, instance):
         data = super().to_representation(instance)
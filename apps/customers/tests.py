@@ -1,3 +1,208 @@
-from django.test import TestCase
+"""
+Tests for apps.customers checkout.
 
-# Create your tests here.
+Tests cover:
+  - Checkout reserves stock, bulk-writes items/designer orders/notifications
+  - A buyer losing the race for the last units writes nothing
+  - Parallel checkouts never sell more than the stock
+  - Cart reads reconcile stock in a fixed number of queries
+"""
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.core.models import MediaAsset, Product
+from apps.customers.models import Address, CartItem, Customer, Order, OrderItem
+from apps.designers.models import DesignerOrder, Notification
+from apps.designers.shipping_quotes import ShippingQuoteTable
+from apps.pay.models import Invoice
+from apps.pay.services.pricing import PricingContext
+
+User = get_user_model()
+
+LOCMEM_CACHE = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+def make_buyer(username):
+    user = User.objects.create_user(username=username, email=f"{username}@example.com", password="password123")
+    customer = Customer.objects.create(user=user, phone="+233 20 123 4567")
+    address = Address.objects.create(
+        customer=customer, line1="1 Ring Road", city="Accra", state="GA", country="US", postal_code="00233",
+    )
+    return user, customer, address
+
+
+class CheckoutMixin:
+
+    def setUp(self):
+        patcher = patch.object(ShippingQuoteTable, "BACKGROUND_REFRESH", False)  # no Shippo threads
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def checkout(self, user, address):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(reverse("checkout"), {"shipping_address_id": address.id}, format="json")
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CheckoutTests(CheckoutMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        designer = User.objects.create_user(username="tailor", email="tailor@example.com", password="password123")
+        cls.wrap = Product.objects.create(user=designer, name="Kente Wrap", price=120, stock=3)
+        cls.scarf = Product.objects.create(user=designer, name="Adire Scarf", price=30, stock=10)
+        cls.user, cls.customer, cls.address = make_buyer("ama")
+
+    def fill_cart(self):
+        CartItem.objects.create(customer=self.customer, product=self.wrap, quantity=2)
+        CartItem.objects.create(customer=self.customer, product=self.scarf, quantity=1)
+
+    def test_checkout_reserves_stock_and_bulk_writes(self):
+        self.fill_cart()
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.checkout(self.user, self.address)
+        self.assertEqual(response.status_code, 201, response.data)
+
+        self.wrap.refresh_from_db()
+        self.scarf.refresh_from_db()
+        self.assertEqual((self.wrap.stock, self.scarf.stock), (1, 9))
+
+        items = OrderItem.objects.filter(order__order_id=response.data["data"]["order_id"])
+        self.assertEqual(sorted(items.values_list("quantity", flat=True)), [1, 2])
+        for item in items:
+            self.assertEqual(item.designer_id, self.wrap.user_id)
+            self.assertTrue(item.masked_email.startswith("ama-"))
+            self.assertEqual(item.masked_phone, "**** 4567")
+        self.assertEqual(DesignerOrder.objects.filter(order_item__in=items).count(), 2)
+        self.assertEqual(
+            sorted(Notification.objects.values_list("title", flat=True)),
+            ["Low stock alert", "New order received", "New order received"],
+        )
+        self.assertFalse(CartItem.objects.filter(customer=self.customer).exists())
+        # after commit: scoring is published once and the order's day is marked stale
+        self.assertEqual(len(callbacks), 2)
+
+    def test_lost_race_writes_nothing(self):
+        self.fill_cart()
+        prime = PricingContext.prime
+
+        def rival_buys_meanwhile(context, products):
+            # Runs after the cart (stock 3) was read, before the order transaction
+            prime(context, products)
+            Product.objects.filter(pk=self.wrap.pk).update(stock=1)
+
+        with patch.object(PricingContext, "prime", rival_buys_meanwhile):
+            response = self.checkout(self.user, self.address)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["message"], "Kente Wrap is out of stock")
+
+        self.wrap.refresh_from_db()
+        self.scarf.refresh_from_db()
+        self.assertEqual((self.wrap.stock, self.scarf.stock), (1, 10))
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(Invoice.objects.exists())
+        self.assertEqual(CartItem.objects.filter(customer=self.customer).count(), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ParallelCheckoutTests(CheckoutMixin, TransactionTestCase):
+    BUYERS = 8
+    STOCK = 3
+
+    def test_parallel_checkouts_never_oversell(self):
+        designer = User.objects.create_user(username="weaver", email="weaver@example.com", password="password123")
+        product = Product.objects.create(user=designer, name="Kente Stole", price=50, stock=self.STOCK)
+        buyers = []
+        for i in range(self.BUYERS):
+            user, customer, address = make_buyer(f"buyer{i}")
+            CartItem.objects.create(customer=customer, product=product, quantity=1)
+            buyers.append((user, address))
+
+        start = threading.Barrier(self.BUYERS)
+        statuses = []
+
+        def buy(user, address):
+            try:
+                start.wait()
+                statuses.append(self.checkout(user, address).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=buyer) for buyer in buyers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # SQLite test databases may refuse some buyers with "table is
+        # locked"; whatever got through must add up.
+        product.refresh_from_db()
+        sold = sum(OrderItem.objects.filter(product=product).values_list("quantity", flat=True))
+        self.assertLessEqual(statuses.count(201), sold)
+        self.assertLessEqual(sold, self.STOCK)
+        self.assertEqual(product.stock, self.STOCK - sold)
+        self.assertGreater(sold, 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CartViewTests(CheckoutMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        designer = User.objects.create_user(username="dyer", email="dyer@example.com", password="password123")
+        media = MediaAsset.objects.create(file="adire.jpg")
+        cls.products = []
+        for i in range(4):
+            product = Product.objects.create(
+                user=designer, name=f"Adire Tunic {i}", price=40, stock=5, is_published=True,
+            )
+            product.media.add(media)
+            cls.products.append(product)
+        cls.user, cls.customer, _ = make_buyer("kofi")
+
+    def get_cart(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        ShippingQuoteTable.clear()  # count the lane read every time
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse("customer-cart"))
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_reconciles_in_bulk(self):
+        hidden, sold_out, short, fine = self.products
+        Product.objects.filter(pk=hidden.pk).update(is_published=False)
+        Product.objects.filter(pk=sold_out.pk).update(stock=0)
+        Product.objects.filter(pk=short.pk).update(stock=2)
+        for product in self.products:
+            CartItem.objects.create(customer=self.customer, product=product, quantity=3)
+
+        data, _ = self.get_cart()
+        self.assertEqual(
+            [(row["name"], row["reason"]) for row in data["removed_items"]],
+            [(hidden.name, "no_longer_available"), (sold_out.name, "out_of_stock"), (short.name, "quantity_adjusted")],
+        )
+        self.assertEqual([(row["product"]["id"], row["quantity"]) for row in data["data"]], [(short.id, 2), (fine.id, 3)])
+        self.assertEqual(
+            sorted(CartItem.objects.filter(customer=self.customer).values_list("quantity", flat=True)), [2, 3]
+        )
+        row = data["data"][1]
+        self.assertAlmostEqual(float(row["subtotal"]), row["product"]["price"] * 3, places=2)
+
+    def test_query_count_is_independent_of_cart_size(self):
+        CartItem.objects.create(customer=self.customer, product=self.products[0], quantity=1)
+        _, small = self.get_cart()
+        for product in self.products[1:]:
+            CartItem.objects.create(customer=self.customer, product=product, quantity=1)
+        _, large = self.get_cart()
+        self.assertEqual(large, small)
@@ -1,3 +1,4 @@
+import logging
 import threading
 from random import random
 from django.template.loader import render_to_string
@@ -14,7 +15,7 @@ from .serializers import (
     CustomerSerializer, AddressSerializer, InvoiceSerializer, WishlistSerializer,
     CartItemSerializer, OrderSerializer, ReturnRequestSerializer, DisputeSerializer
 )
-from apps.core.models import MediaAsset, Product, ShippingMethod
+from apps.core.models import Color, MediaAsset, Product, ShippingMethod
 from django.utils import timezone
 from .models import OrderTracking
 from .serializers import OrderTrackingSerializer
@@ -22,7 +23,13 @@ from .models import OrderTracking, CartItem, OrderItem
 from django.core.paginator import Paginator
 from rest_framework import status
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from django.db.models import Q
+from .cart import load_cart, reconcile_cart
+from .checkout import OutOfStock, create_order_items, notify_designers, publish_order_placed, reserve_stock
+
+logger = logging.getLogger(__name__)
+
 
 def check_promo_qualifies(product, promotion):
     if not promotion:
@@ -86,9 +93,13 @@ class CheckoutPreviewView(APIView):
                 })
 
             from decimal import Decimal
-            from apps.pay.services.pricing import calculate_product_price_breakdown
+            from apps.pay.services.pricing import PricingContext
             from apps.core.models import ShippingMethod
 
+            # One indexed lookup for every product's precomputed price
+            pricing = PricingContext(buyer_country)
+            pricing.prime(item.product for item in cart_items)
+
             promo_code = request.data.get('promo_code')
             promotion = None
             if promo_code:
@@ -117,9 +128,8 @@ class CheckoutPreviewView(APIView):
                     item_promo_discount = promotion.discount_percentage
                     promo_applied = True
 
-                breakdown = calculate_product_price_breakdown(
+                breakdown = pricing.breakdown(
                     item.product,
-                    buyer_country,
                     promo_discount=item_promo_discount
                 )
                 qty = Decimal(str(item.quantity))
@@ -131,7 +141,7 @@ class CheckoutPreviewView(APIView):
                 duties_amount += item_duties
 
                 if item_promo_discount is not None:
-                    normal_breakdown = calculate_product_price_breakdown(item.product, buyer_country)
+                    normal_breakdown = pricing.breakdown(item.product)
                     savings_per_unit = normal_breakdown['total_price'] - breakdown['total_price']
                     if savings_per_unit > 0:
                         promo_savings += savings_per_unit * qty
@@ -147,9 +157,8 @@ class CheckoutPreviewView(APIView):
                     item_promo_discount = None
                     if promotion and check_promo_qualifies(item.product, promotion):
                         item_promo_discount = promotion.discount_percentage
-                    breakdown = calculate_product_price_breakdown(
+                    breakdown = pricing.breakdown(
                         item.product,
-                        buyer_country,
                         promo_discount=item_promo_discount
                     )
                     qty = Decimal(str(item.quantity))
@@ -227,7 +236,7 @@ class CheckoutView(APIView):
 
             # 3️⃣ Calculate totals with dynamic pricing & trade bloc surcharges
             from decimal import Decimal
-            from apps.pay.services.pricing import calculate_product_price_breakdown
+            from apps.pay.services.pricing import PricingContext
 
             buyer_country = shipping_address.country or 'US'
 
@@ -235,7 +244,7 @@ class CheckoutView(APIView):
             inline_items = request.data.get('items')
             if inline_items and isinstance(inline_items, list):
                 product_ids = [i.get('product_id') for i in inline_items if i.get('product_id')]
-                products = Product.objects.filter(id__in=product_ids)
+                products = Product.objects.filter(id__in=product_ids).select_related('user__designer_profile')
                 product_map = {p.id: p for p in products}
                 cart_items = []
                 for i in inline_items:
@@ -250,16 +259,24 @@ class CheckoutView(APIView):
                                 self.properties = {}
                         cart_items.append(InlineItem(
                             product_map[pid],
-                            i.get('quantity', 1),
+                            int(i.get('quantity', 1)),
                             i.get('color', ''),
                             i.get('size', '')
                         ))
             else:
-                cart_items = list(CartItem.objects.filter(customer=customer).select_related('product'))
+                cart_items = list(
+                    CartItem.objects.filter(customer=customer)
+                    .select_related('product__user__designer_profile', 'color', 'size')
+                )
 
             if not cart_items:
                 return Response({"status":"error", "message":"Cart is empty."}, status=400)
+
+            pricing = PricingContext(buyer_country)
+            pricing.prime(item.product for item in cart_items)
             for item in cart_items:
+                if not isinstance(item.quantity, int) or item.quantity < 1:
+                    return Response({"status":"error", "message":f'Invalid quantity for {item.product.name}'}, status=400)
                 if item.product.stock < item.quantity:
                     return Response({"status":"error", "message":f'{item.product.name} is out of stock'}, status=400)
 
@@ -274,22 +291,22 @@ class CheckoutView(APIView):
                         active=True,
                         approval_status='approved',
                         start_date__lte=now,
-                        end_date__ge=now
+                        end_date__gte=now
                     )
                 except Promotion.DoesNotExist:
                     return Response({'status': 'error', 'message': 'Invalid or expired promotion code.'}, status=400)
 
             sub_total = Decimal("0.00")
             duties_amount = Decimal("0.00")
+            cart_shipping = Decimal("0.00")
             item_breakdowns = []
             for item in cart_items:
                 item_promo_discount = None
                 if promotion and check_promo_qualifies(item.product, promotion):
                     item_promo_discount = promotion.discount_percentage
 
-                breakdown = calculate_product_price_breakdown(
+                breakdown = pricing.breakdown(
                     item.product,
-                    buyer_country,
                     promo_discount=item_promo_discount
                 )
                 qty = Decimal(str(item.quantity))
@@ -302,6 +319,7 @@ class CheckoutView(APIView):
 
                 sub_total += item_base
                 duties_amount += item_duties
+                cart_shipping += item_shipping
 
                 item_breakdowns.append({
                     'item': item,
@@ -320,172 +338,163 @@ class CheckoutView(APIView):
                 shipping_amount = Decimal(str(shipping_rate['amount']))
             else:
                 shipping_method = request.data.get('shipping_method', 'Designer Fulfilled')
-                shipping_amount = Decimal("0.00")
-                for item in cart_items:
-                    item_promo_discount = None
-                    if promotion and check_promo_qualifies(item.product, promotion):
-                        item_promo_discount = promotion.discount_percentage
-                    breakdown = calculate_product_price_breakdown(
-                        item.product,
-                        buyer_country,
-                        promo_discount=item_promo_discount
-                    )
-                    qty = Decimal(str(item.quantity))
-                    shipping_amount += breakdown['shipping_cost'] * qty
+                shipping_amount = cart_shipping
 
             total_amount = sub_total + shipping_amount + duties_amount
 
-            # 4️⃣ Create Payment record
-            invoice = Invoice.objects.create(
-                amount=total_amount,
-                user = request.user
-            )
+            quantities = {}
+            for item in cart_items:
+                quantities[item.product.pk] = quantities.get(item.product.pk, 0) + item.quantity
 
-            # 5️⃣ Create Order
-            order = Order.objects.create(
-                invoice=invoice,
-                order_id= f"URBON-{round(random())*9}-{timezone.now().strftime('%Y%m%d%H%M')}-{(random() * 99999999990).__round__()}",
-                customer=customer,
-                shipping_address=shipping_address,
-                shipping_method=shipping_method,
-                total_amount=total_amount,
-                sub_total=sub_total,
-                shipping_amount=shipping_amount,
-                status='pending'
-            )
+            with transaction.atomic():
+                # Reserve first: a sold-out line aborts before anything is written
+                stock_left = reserve_stock(quantities)
+
+                # 4️⃣ Create Payment record
+                invoice = Invoice.objects.create(
+                    amount=total_amount,
+                    user = request.user
+                )
 
-            # 6️⃣ Build per-group shipping addresses when ship_all_to_same is false
-            ship_all_to_same = request.data.get('ship_all_to_same', True)
-            group_addresses_payload = request.data.get('group_addresses', [])
+                # 5️⃣ Create Order
+                order = Order.objects.create(
+                    invoice=invoice,
+                    order_id= f"URBON-{round(random())*9}-{timezone.now().strftime('%Y%m%d%H%M')}-{(random() * 99999999990).__round__()}",
+                    customer=customer,
+                    shipping_address=shipping_address,
+                    shipping_method=shipping_method,
+                    total_amount=total_amount,
+                    sub_total=sub_total,
+                    shipping_amount=shipping_amount,
+                    status='pending'
+                )
 
-            from collections import defaultdict
-            designer_groups_checkout = defaultdict(list)
-            for item in cart_items:
-                product = item.product
-                designer = getattr(product, 'user', None)
-                profile = getattr(designer, 'designer_profile', None) if designer else None
-                designer_id = getattr(profile, 'id', 'default') if profile else 'default'
-                designer_groups_checkout[designer_id].append(item)
-
-            group_address_map = {}
-            if not ship_all_to_same and group_addresses_payload:
-                for g_idx, (designer_id, group_items) in enumerate(designer_groups_checkout.items()):
-                    if g_idx < len(group_addresses_payload):
-                        ga = group_addresses_payload[g_idx]
-                        saved_addr_id = ga.get('saved_address_id')
-                        if saved_addr_id:
-                            try:
-                                group_addr = customer.addresses.get(id=saved_addr_id)
-                            except Address.DoesNotExist:
-                                group_addr = shipping_address
+                # 6️⃣ Build per-group shipping addresses when ship_all_to_same is false
+                ship_all_to_same = request.data.get('ship_all_to_same', True)
+                group_addresses_payload = request.data.get('group_addresses', [])
+
+                from collections import defaultdict
+                designer_groups_checkout = defaultdict(list)
+                for item in cart_items:
+                    product = item.product
+                    designer = getattr(product, 'user', None)
+                    profile = getattr(designer, 'designer_profile', None) if designer else None
+                    designer_id = getattr(profile, 'id', 'default') if profile else 'default'
+                    designer_groups_checkout[designer_id].append(item)
+
+                group_address_map = {}
+                if not ship_all_to_same and group_addresses_payload:
+                    for g_idx, (designer_id, group_items) in enumerate(designer_groups_checkout.items()):
+                        if g_idx < len(group_addresses_payload):
+                            ga = group_addresses_payload[g_idx]
+                            saved_addr_id = ga.get('saved_address_id')
+                            if saved_addr_id:
+                                try:
+                                    group_addr = customer.addresses.get(id=saved_addr_id)
+                                except Address.DoesNotExist:
+                                    group_addr = shipping_address
+                            else:
+                                group_addr, _ = Address.objects.get_or_create(
+                                    customer=customer,
+                                    line1=ga.get('line1', shipping_address.line1),
+                                    line2=ga.get('line2', shipping_address.line2),
+                                    city=ga.get('city', shipping_address.city),
+                                    state=ga.get('state', shipping_address.state),
+                                    postal_code=ga.get('postal_code', shipping_address.postal_code),
+                                    country=ga.get('country', shipping_address.country),
+                                    defaults={
+                                        'recipient_name': ga.get('recipient_name', shipping_address.recipient_name),
+                                        'phone': ga.get('phone', shipping_address.phone or ''),
+                                    }
+                                )
+                            group_address_map[designer_id] = group_addr
                         else:
-                            group_addr, _ = Address.objects.get_or_create(
-                                customer=customer,
-                                line1=ga.get('line1', shipping_address.line1),
-                                line2=ga.get('line2', shipping_address.line2),
-                                city=ga.get('city', shipping_address.city),
-                                state=ga.get('state', shipping_address.state),
-                                postal_code=ga.get('postal_code', shipping_address.postal_code),
-                                country=ga.get('country', shipping_address.country),
-                                defaults={
-                                    'recipient_name': ga.get('recipient_name', shipping_address.recipient_name),
-                                    'phone': ga.get('phone', shipping_address.phone or ''),
-                                }
-                            )
-                        group_address_map[designer_id] = group_addr
-                    else:
+                            group_address_map[designer_id] = shipping_address
+                else:
+                    for designer_id in designer_groups_checkout:
                         group_address_map[designer_id] = shipping_address
-            else:
-                for designer_id in designer_groups_checkout:
-                    group_address_map[designer_id] = shipping_address
-
-            # 7️⃣ Order Items
-            for entry in item_breakdowns:
-                item = entry['item']
-                breakdown = entry['breakdown']
-
-                # Determine which group this item belongs to
-                product = item.product
-                designer = getattr(product, 'user', None)
-                profile = getattr(designer, 'designer_profile', None) if designer else None
-                item_designer_id = getattr(profile, 'id', 'default') if profile else 'default'
-                item_shipping_address = group_address_map.get(item_designer_id, shipping_address)
-
-                # Persist details in item properties
-                item_properties = {
-                    **(item.properties or {}),
-                    'base_price': float(breakdown['base_price']),
-                    'shipping_cost': float(breakdown['shipping_cost']),
-                    'duties_buffer': float(breakdown['duties_buffer']),
-                    'platform_margin': float(breakdown['platform_margin']),
-                    'total_price': float(breakdown['total_price']),
-                    'shipping_address_id': item_shipping_address.id,
-                    'shipping_address_str': f"{item_shipping_address.line1}, {item_shipping_address.city}, {item_shipping_address.country}",
-                }
 
+                # 7️⃣ Order Items
                 # Resolve color/size strings to model instances (for AI inline items)
-                color_obj = item.color
-                size_obj = item.size
-                if isinstance(item.color, str) and item.color:
-                    color_obj = item.product.colors.filter(name__iexact=item.color).first()
-                if isinstance(item.size, str) and item.size:
-                    size_obj = item.product.sizes.filter(name__iexact=item.size).first()
-
-                order_item = OrderItem.objects.create(
+                color_names = {item.color.lower() for item in cart_items if isinstance(item.color, str) and item.color}
+                size_names = {item.size.lower() for item in cart_items if isinstance(item.size, str) and item.size}
+                colors, sizes = {}, {}
+                if color_names:
+                    for color in Color.objects.filter(product_id__in=list(quantities)).order_by('pk'):
+                        colors.setdefault((color.product_id, color.name.lower()), color)
+                if size_names:
+                    for link in (
+                        Product.sizes.through.objects.filter(product_id__in=list(quantities))
+                        .select_related('sizes').order_by('sizes_id')
+                    ):
+                        sizes.setdefault((link.product_id, link.sizes.name.lower()), link.sizes)
+
+                lines = []
+                for entry in item_breakdowns:
+                    item = entry['item']
+                    breakdown = entry['breakdown']
+
+                    # Determine which group this item belongs to
+                    product = item.product
+                    designer = getattr(product, 'user', None)
+                    profile = getattr(designer, 'designer_profile', None) if designer else None
+                    item_designer_id = getattr(profile, 'id', 'default') if profile else 'default'
+                    item_shipping_address = group_address_map.get(item_designer_id, shipping_address)
+
+                    # Persist details in item properties
+                    item_properties = {
+                        **(item.properties or {}),
+                        'base_price': float(breakdown['base_price']),
+                        'shipping_cost': float(breakdown['shipping_cost']),
+                        'duties_buffer': float(breakdown['duties_buffer']),
+                        'platform_margin': float(breakdown['platform_margin']),
+                        'total_price': float(breakdown['total_price']),
+                        'shipping_address_id': item_shipping_address.id,
+                        'shipping_address_str': f"{item_shipping_address.line1}, {item_shipping_address.city}, {item_shipping_address.country}",
+                    }
+
+                    color_obj = item.color
+                    size_obj = item.size
+                    if isinstance(item.color, str):
+                        color_obj = colors.get((product.pk, item.color.lower())) if item.color else None
+                    if isinstance(item.size, str):
+                        size_obj = sizes.get((product.pk, item.size.lower())) if item.size else None
+
+                    lines.append({
+                        'properties': item_properties,
+                        'product': product,
+                        'color': color_obj,
+                        'size': size_obj,
+                        'quantity': item.quantity,
+                        'sub_total': entry['item_total'],
+                        'amount': breakdown['total_price'],
+                    })
+
+                order_items = create_order_items(order, customer, lines)
+                notify_designers(order_items, stock_left)
+                publish_order_placed(order_items)
+
+                # 7️⃣ Clear cart (only if items came from cart, not inline AI items)
+                if not (inline_items and isinstance(inline_items, list)):
+                    CartItem.objects.filter(customer=customer).delete()
+
+                # 8️⃣ Create Tracking
+                estimated_days = 3
+                if shipping_rate and isinstance(shipping_rate, dict):
+                    estimated_days = shipping_rate.get('estimated_days', 3)
+                else:
+                    shipping_method_obj = ShippingMethod.objects.filter(name=shipping_method).first()
+                    if shipping_method_obj:
+                        estimated_days = shipping_method_obj.estimated_days
+                estimated_delivery = timezone.now().date() + timezone.timedelta(days=estimated_days)
+                tracking_number = f"URBOTR-{order.pk}-{timezone.now().strftime('%Y%m%d%H%M')}-{(random() * 99999999990).__round__()}"
+                OrderTracking.objects.create(
                     order=order,
-                    tracking_number = f"URBITR-{order.pk}-{timezone.now().strftime('%Y%m%d%H%M')}-{(random() * 99999999990).__round__()}",
-                    properties = item_properties,
-                    product=item.product,
-                    color=color_obj,
-                    size=size_obj,
-                    quantity=item.quantity,
-                    sub_total=entry['item_total'],
-                    amount=breakdown['total_price']
-                )
-                item.product.stock = item.product.stock - item.quantity if item.product.stock > 0 else 0
-                item.product.save()
-                DesignerOrder.objects.create(order_item = order_item,user=order_item.product.user)
-
-                # Notify designer of new order
-                Notification.objects.create(
-                    user=order_item.product.user,
-                    title="New order received",
-                    message=f"You have a new order for {item.product.name} (Qty: {item.quantity}).",
-                    notification_type=Notification.Type.ORDER,
-                    link=f"/orders/{order_item.id}",
+                    tracking_number=tracking_number,
+                    current_status='Pending',
+                    estimated_delivery=estimated_delivery
                 )
 
-                # Low stock alert
-                if item.product.stock <= 5 and item.product.stock >= 0:
-                    Notification.objects.create(
-                        user=order_item.product.user,
-                        title="Low stock alert",
-                        message=f"Your product '{item.product.name}' is running low. Only {item.product.stock} units left in stock.",
-                        notification_type=Notification.Type.PRODUCT,
-                        link=f"/products/edit/{item.product.id}",
-                    )
-
-            # 7️⃣ Clear cart (only if items came from cart, not inline AI items)
-            if not (inline_items and isinstance(inline_items, list)):
-                CartItem.objects.filter(customer=customer).delete()
-
-            # 8️⃣ Create Tracking
-            estimated_days = 3
-            if shipping_rate and isinstance(shipping_rate, dict):
-                estimated_days = shipping_rate.get('estimated_days', 3)
-            else:
-                shipping_method_obj = ShippingMethod.objects.filter(name=shipping_method).first()
-                if shipping_method_obj:
-                    estimated_days = shipping_method_obj.estimated_days
-            estimated_delivery = timezone.now().date() + timezone.timedelta(days=estimated_days)
-            tracking_number = f"URBOTR-{order.pk}-{timezone.now().strftime('%Y%m%d%H%M')}-{(random() * 99999999990).__round__()}"
-            OrderTracking.objects.create(
-                order=order,
-                tracking_number=tracking_number,
-                current_status='Pending',
-                estimated_delivery=estimated_delivery
-            )
-
             return Response({
                 "status": "success",
                 "message": "Order placed successfully. Proceed to payment.",
@@ -497,9 +506,12 @@ class CheckoutView(APIView):
                     "estimated_delivery": estimated_delivery
                 }
             }, status=201)
-        except Exception as e:
-            print(request.data)
-            print(e)
+        except OutOfStock as e:
+            # Another buyer took the last units between the cart read and the reservation
+            name = next((item.product.name for item in cart_items if item.product.pk == e.product_id), 'An item')
+            return Response({"status":"error", "message":f'{name} is out of stock'}, status=400)
+        except Exception:
+            logger.exception("Checkout failed for user %s", request.user.pk)
             return Response({'status':'error','message':'An error occured'}, status=400)
 
 
@@ -518,10 +530,10 @@ class ShippingMethodListView(APIView):
         })
 
 
-# ---------------- Shipping Rates (Live Shippo) ----------------
+# ---------------- Shipping Rates (Shippo lane table) ----------------
 class ShippingRatesView(APIView):
     """
-    Fetch live shipping rates from Shippo based on cart + selected address.
+    Shipping rates from the Shippo lane table based on cart + selected address.
     Items are grouped by designer — each designer ships from their own location.
     """
     permission_classes = [IsAuthenticated]
@@ -591,7 +603,7 @@ class ShippingRatesView(APIView):
             designer_id = getattr(profile, 'id', 'default') if profile else 'default'
             designer_groups[designer_id].append({'item': item, 'profile': profile, 'product': product})
 
-        from apps.designers.shippo_service import get_shipping_rates
+        from apps.designers.shipping_quotes import ShippingQuoteTable
 
         shipment_groups = []
         all_errors = []
@@ -643,7 +655,8 @@ class ShippingRatesView(APIView):
                 for entry in group_items
             )
 
-            rates_result = get_shipping_rates(
+            # Lane table quote: interpolated / last-known rates, revalidated in the background
+            rates_result = ShippingQuoteTable.rates(
                 from_address=from_address,
                 to_address=group_to_address,
                 weight_kg=group_weight,
@@ -899,44 +912,13 @@ class CartView(APIView):
     def get(self, request):
         customer, _ = Customer.objects.get_or_create(user=request.user)
 
-        cart_items = CartItem.objects.filter(customer=customer).select_related('product')
-        removed_items = []
-        valid_items = []
-
-        for item in cart_items:
-            product = item.product
-            # Product no longer exists, inactive, or unpublished
-            if not product or not product.is_active or not product.is_published:
-                removed_items.append({
-                    "name": product.name if product else "Unknown",
-                    "reason": "no_longer_available"
-                })
-                item.delete()
-                continue
-
-            # Out of stock
-            if product.stock <= 0:
-                removed_items.append({
-                    "name": product.name,
-                    "reason": "out_of_stock"
-                })
-                item.delete()
-                continue
-
-            # Quantity exceeds available stock — clamp to stock instead of removing
-            if product.stock < item.quantity:
-                removed_items.append({
-                    "name": product.name,
-                    "reason": "quantity_adjusted",
-                    "old_quantity": item.quantity,
-                    "new_quantity": product.stock
-                })
-                item.quantity = product.stock
-                item.save()
+        valid_items, removed_items = reconcile_cart(load_cart(customer))
 
-            valid_items.append(item)
+        # One pricing pass for the whole cart; the serializers read from it
+        from apps.pay.services.pricing import PricingContext
+        PricingContext.for_request(request).prime(item.product for item in valid_items)
 
-        serializer = CartItemSerializer(valid_items, many=True)
+        serializer = CartItemSerializer(valid_items, many=True, context={'request': request})
         return Response({
             "status": "success",
             "message": "Cart retrieved successfully.",
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('designers', '0003_remove_designer_local_shipping_fee'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShippingLaneQuote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin_country', models.CharField(max_length=5)),
+                ('destination_country', models.CharField(max_length=5)),
+                ('weight_kg', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('dim_class', models.CharField(max_length=1)),
+                ('rates', models.JSONField(default=list)),
+                ('cheapest_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('is_fallback', models.BooleanField(default=False)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'shipping_lane_quotes',
+                'unique_together': {('origin_country', 'destination_country', 'dim_class', 'weight_kg')},
+            },
+        ),
+    ]
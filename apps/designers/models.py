@@ -322,6 +322,33 @@ class Shipment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
 
+# -------------------------------
+# Shipping lane quotes
+# -------------------------------
+class ShippingLaneQuote(models.Model):
+    """
+    Carrier rates for one lane: origin -> destination country, a weight
+    grid point and a parcel size class. Filled by the shipping quote
+    warm-up job; see apps.designers.shipping_quotes.
+    """
+    origin_country = models.CharField(max_length=5)
+    destination_country = models.CharField(max_length=5)
+    weight_kg = models.DecimalField(max_digits=6, decimal_places=2)
+    dim_class = models.CharField(max_length=1)
+
+    rates = models.JSONField(default=list)
+    cheapest_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    is_fallback = models.BooleanField(default=False)  # zone estimate; Shippo had no rates
+    fetched_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "shipping_lane_quotes"
+        unique_together = ("origin_country", "destination_country", "dim_class", "weight_kg")
+
+    def __str__(self):
+        return f"{self.origin_country}->{self.destination_country} {self.weight_kg}kg/{self.dim_class}"
+
+
 # -------------------------------
 # Notifications
 # -------------------------------
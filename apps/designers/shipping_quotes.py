@@ -0,0 +1,321 @@
+"""
+Shipping quote lane table.
+
+Carrier rates are stored per lane: (origin country, destination country,
+parcel size class) at fixed weight grid points. Reads never call Shippo:
+a weight between grid points is interpolated from its neighbours, a stale
+or missing grid point is served from what is known (or a zone estimate)
+and queued for revalidation on a background thread, and a scheduled job
+keeps the lanes buyers actually use warm.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from apps.designers.models import Designer, ShippingLaneQuote
+from apps.designers.shippo_service import (
+    _normalise_country,
+    build_fallback_rates,
+    get_shipping_rates,
+)
+from apps.utils.db import upsert_options
+
+logger = logging.getLogger(__name__)
+
+
+class ShippingQuoteTable:
+    WEIGHT_GRID = (0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0)  # kg
+    # Size classes by parcel volume (cm3) and the parcel quoted for each
+    DIM_CLASSES = (
+        ("S", 6000, {"length": "30.00", "width": "20.00", "height": "10.00"}),
+        ("M", 24000, {"length": "40.00", "width": "30.00", "height": "20.00"}),
+        ("L", None, {"length": "60.00", "width": "40.00", "height": "40.00"}),
+    )
+    FRESH_FOR = timedelta(hours=6)
+    FALLBACK_FRESH_FOR = timedelta(minutes=30)  # retry Shippo sooner after a miss
+    MEMORY_TTL = 60  # seconds a process keeps a lane's rows before re-reading
+    LOCK_TTL = 120  # seconds one process owns a grid point's refresh
+    BACKGROUND_REFRESH = True  # revalidate on a worker thread instead of the job only
+
+    _lanes = {}  # (origin, destination, dim class) -> {"rows": [...], "loaded_at": monotonic}
+    _pending = set()  # grid points waiting for revalidation
+    _lock = threading.Lock()
+    _refresh_lock = threading.Lock()
+
+    # ---------- reads (no network) ----------
+
+    @classmethod
+    def rates(cls, from_address: dict, to_address: dict, weight_kg, dimensions: dict = None) -> dict:
+        """
+        Same shape as shippo_service.get_shipping_rates(), served from the
+        lane table. `quote` describes how the answer was derived.
+        """
+        origin = _normalise_country(from_address.get("country") or "GH")
+        destination = _normalise_country(to_address.get("country") or "US")
+        weight = max(float(weight_kg or 0), 0.0)
+        dim_class = cls.dim_class(dimensions)
+
+        rows = cls._lane_rows(origin, destination, dim_class)
+        rates, used, missing = cls._interpolate(rows, weight)
+        if rates is None:
+            rates = build_fallback_rates(weight, origin, destination)
+
+        now = timezone.now()
+        stale = [row["weight_kg"] for row in used if cls._is_stale(row, now)]
+        if missing or stale:
+            cls.request_refresh([(origin, destination, dim_class, w) for w in [*missing, *stale]])
+
+        return {
+            "status": "success",
+            "rates": rates,
+            "error": None,
+            "quote": {
+                "origin_country": origin,
+                "destination_country": destination,
+                "dim_class": dim_class,
+                "weight_kg": weight,
+                "source": "lane_table" if used else "estimate",
+                "interpolated": bool(used) and weight not in [row["weight_kg"] for row in used],
+                "stale": bool(stale or missing),
+                "age_seconds": max(
+                    ((now - row["fetched_at"]).total_seconds() for row in used), default=None
+                ),
+            },
+        }
+
+    @classmethod
+    def cheapest(cls, origin: str, destination: str, weight_kg, dimensions: dict = None) -> Decimal:
+        """Cheapest buffered rate (USD) for a parcel on the lane."""
+        result = cls.rates({"country": origin}, {"country": destination}, weight_kg, dimensions)
+        return Decimal(str(min(rate["amount"] for rate in result["rates"])))
+
+    @classmethod
+    def dim_class(cls, dimensions: dict = None) -> str:
+        if not dimensions:
+            return cls.DIM_CLASSES[0][0]
+        try:
+            volume = (
+                float(dimensions.get("length") or 0)
+                * float(dimensions.get("width") or 0)
+                * float(dimensions.get("height") or 0)
+            )
+        except (TypeError, ValueError):
+            return cls.DIM_CLASSES[0][0]
+        for name, max_volume, _ in cls.DIM_CLASSES:
+            if max_volume is None or volume <= max_volume:
+                return name
+        return cls.DIM_CLASSES[-1][0]
+
+    @classmethod
+    def _lane_rows(cls, origin, destination, dim_class):
+        key = (origin, destination, dim_class)
+        entry = cls._lanes.get(key)
+        if entry and time.monotonic() - entry["loaded_at"] < cls.MEMORY_TTL:
+            return entry["rows"]
+
+        rows = [
+            {**row, "weight_kg": float(row["weight_kg"])}
+            for row in ShippingLaneQuote.objects.filter(
+                origin_country=origin, destination_country=destination, dim_class=dim_class,
+            ).order_by("weight_kg").values("weight_kg", "rates", "is_fallback", "fetched_at")
+        ]
+        with cls._lock:
+            cls._lanes[key] = {"rows": rows, "loaded_at": time.monotonic()}
+        return rows
+
+    @classmethod
+    def _interpolate(cls, rows, weight):
+        """
+        (rates, rows used, missing grid weights). Rates are linear in weight
+        between the bracketing grid points, per provider/service level.
+        """
+        grid = cls.WEIGHT_GRID
+        if weight <= grid[0]:
+            wanted = [grid[0]]
+        elif weight >= grid[-1]:
+            wanted = [grid[-2], grid[-1]]
+        else:
+            upper = next(i for i, w in enumerate(grid) if w >= weight)
+            wanted = [grid[upper]] if grid[upper] == weight else [grid[upper - 1], grid[upper]]
+
+        by_weight = {row["weight_kg"]: row for row in rows}
+        missing = [w for w in wanted if w not in by_weight]
+        used = [by_weight[w] for w in wanted if w in by_weight]
+
+        if not used:
+            # Nothing on the grid around this weight: nearest known point
+            if not rows:
+                return None, [], missing
+            nearest = min(rows, key=lambda row: abs(row["weight_kg"] - weight))
+            return cls._scale(nearest, weight), [nearest], missing
+        if len(used) == 1:
+            row = used[0]
+            if row["weight_kg"] == weight or weight <= grid[0]:
+                return [dict(rate, source="lane_table") for rate in row["rates"]], used, missing
+            return cls._scale(row, weight), used, missing
+
+        low, high = used
+        span = high["weight_kg"] - low["weight_kg"]
+        fraction = (weight - low["weight_kg"]) / span
+        low_rates = {(r["provider"], r["service_level"]): r for r in low["rates"]}
+        rates = []
+        for rate in high["rates"]:
+            base = low_rates.get((rate["provider"], rate["service_level"]))
+            if base is None:
+                continue
+            amount = base["amount"] + (rate["amount"] - base["amount"]) * fraction
+            rates.append(dict(
+                rate,
+                amount=round(max(amount, 0.0), 2),
+                estimated_days=max(rate.get("estimated_days") or 0, base.get("estimated_days") or 0),
+                source="lane_table",
+            ))
+        if not rates:  # no common service levels; quote the heavier point
+            rates = [dict(rate, source="lane_table") for rate in high["rates"]]
+        rates.sort(key=lambda r: r["amount"])
+        return rates, used, missing
+
+    @staticmethod
+    def _scale(row, weight):
+        """Single known point: scale proportionally, never below its own price."""
+        factor = max(weight / row["weight_kg"], 1.0) if row["weight_kg"] else 1.0
+        rates = [
+            dict(rate, amount=round(rate["amount"] * factor, 2), source="lane_table")
+            for rate in row["rates"]
+        ]
+        rates.sort(key=lambda r: r["amount"])
+        return rates
+
+    @classmethod
+    def _is_stale(cls, row, now):
+        max_age = cls.FALLBACK_FRESH_FOR if row["is_fallback"] else cls.FRESH_FOR
+        return now - row["fetched_at"] > max_age
+
+    # ---------- revalidation (network, off the request path) ----------
+
+    @classmethod
+    def request_refresh(cls, points) -> None:
+        """Queue grid points for a background fetch; never blocks the caller."""
+        with cls._lock:
+            cls._pending.update(points)
+        if cls.BACKGROUND_REFRESH and not cls._refresh_lock.locked():
+            threading.Thread(target=cls._refresh_in_background, daemon=True).start()
+
+    @classmethod
+    def refresh_pending(cls) -> int:
+        """Drain the revalidation queue; one drainer per process."""
+        if not cls._refresh_lock.acquire(blocking=False):
+            return 0
+        written = 0
+        try:
+            while True:
+                with cls._lock:
+                    points, cls._pending = cls._pending, set()
+                if not points:
+                    return written
+                written += cls.refresh(points)
+        finally:
+            cls._refresh_lock.release()
+
+    @classmethod
+    def _refresh_in_background(cls):
+        try:
+            cls.refresh_pending()
+        except Exception:
+            logger.exception("[shipping_quotes] background refresh failed")
+        finally:
+            connection.close()
+
+    @classmethod
+    def refresh(cls, points) -> int:
+        """Fetch and store (origin, destination, dim class, weight) grid points."""
+        dims = {name: parcel for name, _, parcel in cls.DIM_CLASSES}
+        rows = []
+        for origin, destination, dim_class, weight in sorted(set(points)):
+            lock_key = f"ship_lane_lock:{origin}:{destination}:{dim_class}:{weight}"
+            try:
+                if not cache.add(lock_key, 1, cls.LOCK_TTL):
+                    continue  # another worker is fetching this point
+            except Exception:
+                pass  # cache down: fetch anyway
+            result = get_shipping_rates(
+                {"country": origin}, {"country": destination}, weight, dims[dim_class]
+            )
+            rates = result.get("rates") or build_fallback_rates(weight, origin, destination)
+            rows.append(ShippingLaneQuote(
+                origin_country=origin,
+                destination_country=destination,
+                dim_class=dim_class,
+                weight_kg=Decimal(str(weight)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
+                rates=rates,
+                cheapest_amount=Decimal(str(min(rate["amount"] for rate in rates))),
+                is_fallback=bool(result.get("error")) or not result.get("rates"),
+                fetched_at=timezone.now(),
+            ))
+
+        ShippingLaneQuote.objects.bulk_create(
+            rows,
+            **upsert_options(
+                ShippingLaneQuote,
+                ["origin_country", "destination_country", "dim_class", "weight_kg"],
+                ["rates", "cheapest_amount", "is_fallback", "fetched_at"],
+            ),
+        )
+        with cls._lock:
+            for row in rows:
+                cls._lanes.pop((row.origin_country, row.destination_country, row.dim_class), None)
+        return len(rows)
+
+    @classmethod
+    def warm(cls, destinations=None) -> dict:
+        """
+        Scheduled job: refresh every stale or missing grid point on the
+        lanes in use (designer countries x buyer countries, plus every lane
+        already in the table).
+        """
+        if destinations is None:
+            from apps.pay.services.pricing import PriceBreakdownTable
+            destinations = PriceBreakdownTable.BUYER_COUNTRIES
+
+        origins = {
+            _normalise_country(country)
+            for country in Designer.objects.exclude(country="").values_list("country", flat=True).distinct()
+        }
+        lanes = {(o, d, cls.DIM_CLASSES[0][0]) for o in origins for d in destinations}
+        fetched = {}
+        for row in ShippingLaneQuote.objects.values(
+            "origin_country", "destination_country", "dim_class", "weight_kg", "is_fallback", "fetched_at",
+        ):
+            lane = (row["origin_country"], row["destination_country"], row["dim_class"])
+            lanes.add(lane)
+            fetched[(*lane, float(row["weight_kg"]))] = row
+
+        now = timezone.now()
+        points = [
+            (*lane, weight)
+            for lane in lanes
+            for weight in cls.WEIGHT_GRID
+            if (*lane, weight) not in fetched or cls._is_stale(fetched[(*lane, weight)], now)
+        ]
+        written = cls.refresh(points)
+        stats = {"lanes": len(lanes), "points_refreshed": written}
+        logger.info("[shipping_quotes] %s", stats)
+        return stats
+
+    @classmethod
+    def clear(cls):
+        """Drop the in-process lane rows and queue (tests, forced reload)."""
+        with cls._lock:
+            cls._lanes.clear()
+            cls._pending.clear()
+
+
+def warm_shipping_quotes():
+    """Scheduled job entry point."""
+    return ShippingQuoteTable.warm()
@@ -191,6 +191,35 @@ def create_or_fetch_tracking(carrier: str, tracking_number: str) -> dict:
 
 from shippo.models.components import ShipmentCreateRequest, AddressCreateRequest, ParcelCreateRequest, TransactionCreateRequest
 
+def build_fallback_rates(w, fc, tc):
+    """Zone-based estimate (buffered) used when Shippo has no rates for a lane."""
+    if fc == tc:
+        tiers = [
+            {"provider": "Local Carrier", "service_level": "Domestic Economy", "base": 3.50, "per_kg": 0.80, "days": 5},
+            {"provider": "Local Carrier", "service_level": "Domestic Standard", "base": 5.00, "per_kg": 1.00, "days": 2},
+            {"provider": "Local Carrier", "service_level": "Domestic Express", "base": 8.00, "per_kg": 1.50, "days": 1},
+        ]
+    elif fc in ('NG', 'GH', 'KE', 'ZA') and tc in ('NG', 'GH', 'KE', 'ZA'):
+        tiers = [
+            {"provider": "DHL Africa", "service_level": "Intra-Africa Economy", "base": 10.00, "per_kg": 2.20, "days": 7},
+            {"provider": "DHL Africa", "service_level": "Intra-Africa Standard", "base": 15.00, "per_kg": 3.00, "days": 4},
+            {"provider": "DHL Africa", "service_level": "Intra-Africa Express", "base": 22.00, "per_kg": 4.50, "days": 2},
+        ]
+    else:
+        tiers = [
+            {"provider": "DHL Express", "service_level": "International Economy", "base": 18.00, "per_kg": 5.50, "days": 10},
+            {"provider": "DHL Express", "service_level": "International Standard", "base": 30.00, "per_kg": 8.00, "days": 5},
+            {"provider": "DHL Express", "service_level": "International Priority", "base": 45.00, "per_kg": 12.00, "days": 2},
+        ]
+    rates = []
+    for t in tiers:
+        fee = round((t["base"] + (t["per_kg"] * w)) * (1 + SHIPPING_BUFFER_PERCENT), 2)
+        rates.append({"amount": fee, "currency": "USD", "provider": t["provider"],
+                      "service_level": t["service_level"], "estimated_days": t["days"],
+                      "source": "fallback_buffered"})
+    return rates
+
+
 def get_shipping_rates(from_address: dict, to_address: dict, weight_kg: float, dimensions: dict = None) -> dict:
     """
     Creates a shipment object on Shippo to fetch rates.
@@ -206,34 +235,6 @@ def get_shipping_rates(from_address: dict, to_address: dict, weight_kg: float, d
     # Defaults for dimensions if not provided
     dims = dimensions or {'length': '30.00', 'width': '20.00', 'height': '10.00'}
 
-    # ── Helper: build fallback rates ──────────────────────
-    def _build_fallback(w, fc, tc):
-        if fc == tc:
-            tiers = [
-                {"provider": "Local Carrier", "service_level": "Domestic Economy", "base": 3.50, "per_kg": 0.80, "days": 5},
-                {"provider": "Local Carrier", "service_level": "Domestic Standard", "base": 5.00, "per_kg": 1.00, "days": 2},
-                {"provider": "Local Carrier", "service_level": "Domestic Express", "base": 8.00, "per_kg": 1.50, "days": 1},
-            ]
-        elif fc in ('NG', 'GH', 'KE', 'ZA') and tc in ('NG', 'GH', 'KE', 'ZA'):
-            tiers = [
-                {"provider": "DHL Africa", "service_level": "Intra-Africa Economy", "base": 10.00, "per_kg": 2.20, "days": 7},
-                {"provider": "DHL Africa", "service_level": "Intra-Africa Standard", "base": 15.00, "per_kg": 3.00, "days": 4},
-                {"provider": "DHL Africa", "service_level": "Intra-Africa Express", "base": 22.00, "per_kg": 4.50, "days": 2},
-            ]
-        else:
-            tiers = [
-                {"provider": "DHL Express", "service_level": "International Economy", "base": 18.00, "per_kg": 5.50, "days": 10},
-                {"provider": "DHL Express", "service_level": "International Standard", "base": 30.00, "per_kg": 8.00, "days": 5},
-                {"provider": "DHL Express", "service_level": "International Priority", "base": 45.00, "per_kg": 12.00, "days": 2},
-            ]
-        rates = []
-        for t in tiers:
-            fee = round((t["base"] + (t["per_kg"] * w)) * (1 + SHIPPING_BUFFER_PERCENT), 2)
-            rates.append({"amount": fee, "currency": "USD", "provider": t["provider"],
-                          "service_level": t["service_level"], "estimated_days": t["days"],
-                          "source": "fallback_buffered"})
-        return rates
-
     # ── Try Shippo API ────────────────────────────────────
     shippo_error = None
 
@@ -360,7 +361,7 @@ def get_shipping_rates(from_address: dict, to_address: dict, weight_kg: float, d
 
     # ── Fallback ───────────────────────────────────────────
     w = float(weight_kg)
-    fallback_rates = _build_fallback(w, from_country, to_country)
+    fallback_rates = build_fallback_rates(w, from_country, to_country)
 
     return {
         "status": "success",
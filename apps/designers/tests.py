@@ -1,12 +1,21 @@
 import json
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from django.utils import timezone
 from apps.customers.models import Customer, Address, Order, OrderItem
-from apps.designers.models import Designer, Shipment
+from apps.designers.models import Designer, Shipment, ShippingLaneQuote
+from apps.designers.shipping_quotes import ShippingQuoteTable
 from apps.core.models import Product, Currency
 from apps.pay.models import Invoice, Payment
+from apps.pay.services.pricing import PricingContext
 
 User = get_user_model()
 
@@ -157,3 +166,112 @@ class ShippoIntegrationTests(APITestCase):
         shipment = Shipment.objects.get(order_item=self.order_item)
         self.assertEqual(shipment.tracking_status, "DELIVERED")
 
+
+
+LOCMEM_CACHE = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+def shippo_result(*amounts):
+    return {
+        "status": "success",
+        "error": None,
+        "rates": [
+            {"amount": amount, "currency": "USD", "provider": "DHL Express",
+             "service_level": level, "estimated_days": 3, "source": "shippo_buffered"}
+            for amount, level in zip(amounts, ("Economy", "Express"))
+        ],
+    }
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+@patch.object(ShippingQuoteTable, "BACKGROUND_REFRESH", False)
+class ShippingQuoteTableTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        ShippingQuoteTable.clear()
+        self.addCleanup(ShippingQuoteTable.clear)
+
+    def store(self, weight, *amounts, age=timedelta(0), dim_class="S"):
+        rates = shippo_result(*amounts)["rates"]
+        ShippingLaneQuote.objects.create(
+            origin_country="NG", destination_country="US", dim_class=dim_class,
+            weight_kg=weight, rates=rates, cheapest_amount=min(amounts),
+            fetched_at=timezone.now() - age,
+        )
+
+    @patch("apps.designers.shipping_quotes.get_shipping_rates")
+    def test_miss_serves_estimate_and_queues_fetch(self, mock_ship):
+        mock_ship.return_value = shippo_result(21.0, 40.0)
+
+        result = ShippingQuoteTable.rates({"country": "NG"}, {"country": "US"}, 0.5)
+        self.assertEqual(result["quote"]["source"], "estimate")
+        mock_ship.assert_not_called()
+
+        self.assertEqual(ShippingQuoteTable.refresh_pending(), 1)
+        result = ShippingQuoteTable.rates({"country": "Nigeria"}, {"country": "US"}, 0.5)
+        self.assertEqual(result["quote"]["source"], "lane_table")
+        self.assertEqual([r["amount"] for r in result["rates"]], [21.0, 40.0])
+        self.assertEqual(mock_ship.call_count, 1)
+
+    @patch("apps.designers.shipping_quotes.get_shipping_rates")
+    def test_interpolates_between_grid_points(self, mock_ship):
+        self.store(1, 20.0, 40.0)
+        self.store(2, 30.0, 60.0)
+
+        result = ShippingQuoteTable.rates({"country": "NG"}, {"country": "US"}, 1.5)
+        self.assertEqual([r["amount"] for r in result["rates"]], [25.0, 50.0])
+        self.assertTrue(result["quote"]["interpolated"])
+        self.assertFalse(result["quote"]["stale"])
+        self.assertEqual(ShippingQuoteTable.cheapest("NG", "US", 1.5), Decimal("25.0"))
+        mock_ship.assert_not_called()
+
+    @patch("apps.pay.services.pricing.get_exchange_rate", return_value=None)
+    @patch("apps.designers.shipping_quotes.get_shipping_rates")
+    def test_pricing_context_quotes_each_size_class(self, mock_ship, mock_rate):
+        self.store(1, 20.0, 40.0, dim_class="S")
+        self.store(1, 55.0, 90.0, dim_class="L")
+
+        def product(length, width, height):
+            return SimpleNamespace(
+                price=Decimal("50.00"), discount=Decimal("0"), currency=None, user=None,
+                country_of_origin=SimpleNamespace(code="NG"), weight_kg=1,
+                length_cm=length, width_cm=width, height_cm=height,
+            )
+
+        scarf, rug = product(30, 20, 5), product(60, 40, 40)
+        context = PricingContext("US", use_table=False)
+        context.prime([scarf, rug])
+        self.assertEqual(context.breakdown(scarf)["shipping_cost"], Decimal("20.0"))
+        self.assertEqual(context.breakdown(rug)["shipping_cost"], Decimal("55.0"))
+        mock_ship.assert_not_called()
+
+    @patch("apps.designers.shipping_quotes.get_shipping_rates")
+    def test_stale_quote_served_while_revalidating(self, mock_ship):
+        mock_ship.return_value = shippo_result(22.0, 44.0)
+        self.store(1, 20.0, 40.0, age=ShippingQuoteTable.FRESH_FOR + timedelta(minutes=1))
+
+        result = ShippingQuoteTable.rates({"country": "NG"}, {"country": "US"}, 1)
+        self.assertEqual(result["rates"][0]["amount"], 20.0)
+        self.assertTrue(result["quote"]["stale"])
+
+        ShippingQuoteTable.refresh_pending()
+        ShippingQuoteTable.clear()
+        result = ShippingQuoteTable.rates({"country": "NG"}, {"country": "US"}, 1)
+        self.assertEqual(result["rates"][0]["amount"], 22.0)
+        self.assertFalse(result["quote"]["stale"])
+
+    @patch("apps.designers.shipping_quotes.get_shipping_rates")
+    def test_warm_fills_designer_lanes(self, mock_ship):
+        mock_ship.return_value = shippo_result(20.0)
+        user = User.objects.create_user(username="d", email="d@example.com", password="password123")
+        Designer.objects.create(user=user, brand_name="Brand", country="NG")
+        self.store(1, 20.0)  # fresh, skipped
+
+        stats = ShippingQuoteTable.warm(destinations=["US"])
+        grid = len(ShippingQuoteTable.WEIGHT_GRID)
+        self.assertEqual(stats["points_refreshed"], grid - 1)
+        self.assertEqual(ShippingLaneQuote.objects.count(), grid)
+        self.assertEqual(ShippingQuoteTable.warm(destinations=["US"])["points_refreshed"], 0)
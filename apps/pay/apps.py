@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class PartnersConfig(AppConfig):
     name = 'apps.pay'
+
+    def ready(self):
+        import apps.pay.signals  # noqa: F401
@@ -1,4 +1,3 @@
-import requests
 from decimal import Decimal, ROUND_HALF_UP
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -7,24 +6,13 @@ from rest_framework import status
 import stripe
 from .models import Invoice, PaymentAttempt
 from .config import get_paystack_keys, get_flutterwave_keys, get_stripe_keys
+from .services.fx import ExchangeRateService
 
 
 def get_exchange_rate(from_currency, to_currency):
-    """Fetch live exchange rate from open.er-api.com. Returns Decimal."""
-    if from_currency == to_currency:
-        return Decimal("1")
-    try:
-        resp = requests.get(
-            f"https://open.er-api.com/v6/latest/{from_currency}",
-            timeout=10,
-        )
-        data = resp.json()
-        rate = data.get("rates", {}).get(to_currency)
-        if rate:
-            return Decimal(str(rate))
-    except Exception:
-        pass
-    return None
+    """Cached exchange rate from the FX rate service. Returns Decimal, or None
+    if the pair is unknown. Never waits on the network."""
+    return ExchangeRateService.get_rate(from_currency, to_currency)
 
 
 def get_invoice_currency(invoice):
@@ -33,27 +21,13 @@ def get_invoice_currency(invoice):
 
 
 def convert_to_ngn(amount, from_currency="USD"):
-    """Convert an amount to NGN using live rates.
-    Falls back to realistic static rates if the FX API is unreachable."""
+    """Convert an amount to NGN using the cached FX rates.
+    The rate service falls back to last-known-good, then seed rates."""
     if from_currency == "NGN":
         return Decimal(str(amount))
     rate = get_exchange_rate(from_currency, "NGN")
     if rate is None:
-        # Static fallbacks so payment can still proceed with correct amounts
-        if from_currency == "USD":
-            rate = Decimal("1550.00")
-        elif from_currency == "GBP":
-            rate = Decimal("1980.00")
-        elif from_currency == "EUR":
-            rate = Decimal("1680.00")
-        elif from_currency == "GHS":
-            rate = Decimal("103.00")
-        elif from_currency == "KES":
-            rate = Decimal("11.80")
-        elif from_currency == "CAD":
-            rate = Decimal("1125.00")
-        else:
-            rate = Decimal("1550.00")  # safest default for African market
+        rate = get_exchange_rate("USD", "NGN")  # unknown currency: treat as USD
     return (Decimal(str(amount)) * rate).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
 
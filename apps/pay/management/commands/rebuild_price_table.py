@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.pay.services.pricing import PriceBreakdownTable
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed product price table (changed rows only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--id", action="append", dest="product_ids", help="Product ID (repeatable)")
+        parser.add_argument("--country", action="append", dest="countries", help="Buyer country (repeatable)")
+
+    def handle(self, *args, **options):
+        countries = [c.upper() for c in options["countries"] or []] or None
+        stats = PriceBreakdownTable.rebuild(product_ids=options["product_ids"], countries=countries)
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['products']} products: {stats['rows_written']} rows written, "
+            f"{stats['rows_unchanged']} unchanged, {stats['rows_removed']} removed"
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from apps.pay.services.fx import ExchangeRateService
+
+
+class Command(BaseCommand):
+    help = "Fetch the FX rate tables and publish them to the shared cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--base", action="append", dest="bases",
+            help="Base currency to refresh (repeatable; default: configured bases)",
+        )
+
+    def handle(self, *args, **options):
+        bases = [b.upper() for b in options["bases"] or []] or None
+        report = ExchangeRateService.refresh(bases)
+        for base, info in report.items():
+            line = (
+                f"{base}: {info['currencies']} currencies, "
+                f"source={info['source']}, rate_age_seconds={info['rate_age_seconds']}"
+            )
+            if info["stale"]:
+                self.stdout.write(self.style.WARNING(line))
+            else:
+                self.stdout.write(self.style.SUCCESS(line))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:50
+
+import apps.utils.uuid_generator
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_alter_product_availability_type'),
+        ('pay', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPriceBreakdown',
+            fields=[
+                ('id', models.CharField(default=apps.utils.uuid_generator.generate_custom_id, editable=False, max_length=50, primary_key=True, serialize=False)),
+                ('buyer_country', models.CharField(max_length=5)),
+                ('designer_country', models.CharField(max_length=5)),
+                ('original_base_price', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('base_price', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('shipping_cost', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('duties_buffer', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('platform_margin', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('original_total_price', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_breakdowns', to='core.product')),
+            ],
+            options={
+                'db_table': 'product_price_breakdowns',
+                'unique_together': {('product', 'buyer_country')},
+            },
+        ),
+    ]
@@ -593,4 +593,34 @@ class Transaction(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.user} - {self.transaction_type} - {self.amount}"
\ No newline at end of file
+        return f"{self.user} - {self.transaction_type} - {self.amount}"
+
+# =============================
+# PRECOMPUTED PRICE BREAKDOWNS
+# =============================
+
+class ProductPriceBreakdown(models.Model):
+    """
+    Visible USD price breakdown of a product for one buyer country, as
+    returned by calculate_product_price_breakdown(). Maintained by
+    apps.pay.services.pricing.PriceBreakdownTable.
+    """
+    id = models.CharField(primary_key=True, max_length=50, default=generate_custom_id, editable=False)
+
+    product = models.ForeignKey("core.Product", on_delete=models.CASCADE, related_name="price_breakdowns")
+    buyer_country = models.CharField(max_length=5)
+    designer_country = models.CharField(max_length=5)
+
+    original_base_price = models.DecimalField(max_digits=18, decimal_places=6)
+    base_price = models.DecimalField(max_digits=18, decimal_places=6)
+    shipping_cost = models.DecimalField(max_digits=18, decimal_places=6)
+    duties_buffer = models.DecimalField(max_digits=14, decimal_places=2)
+    platform_margin = models.DecimalField(max_digits=14, decimal_places=2)
+    total_price = models.DecimalField(max_digits=14, decimal_places=2)
+    original_total_price = models.DecimalField(max_digits=14, decimal_places=2)
+
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "product_price_breakdowns"
+        unique_together = ("product", "buyer_country")
@@ -1,8 +1,16 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
 from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 from apps.pay.models import Escrow, Wallet, WalletTransaction
 from django.core.exceptions import ValidationError
 
+logger = logging.getLogger(__name__)
+
 ESCROW_STATUS_CHOICES = ("held", "released", "refunded", "disputed")
 
 
@@ -99,3 +107,178 @@ def hold_escrow_for_return(escrow_id):
     escrow.status = "disputed"
     escrow.save(update_fields=["status"])
     return escrow
+
+
+def calculate_platform_commission(amount):
+    commission_rate = Decimal("0.10")
+    commission = amount * commission_rate
+
+    return commission.quantize(
+        Decimal("0.01"),
+        rounding=ROUND_HALF_UP
+    )
+
+
+class EscrowSettlement:
+    """
+    Set-based escrow jobs for the scheduler.
+
+    Eligible rows are walked in primary-key chunks of CHUNK_SIZE, each in
+    its own short transaction: the chunk is claimed with SELECT ... FOR
+    UPDATE (rows another run already took drop out), escrows and ledger
+    entries are bulk inserted, and each designer wallet gets one
+    `F()` credit for the chunk's total, applied in wallet-id order so
+    concurrent chunks cannot deadlock. A failed chunk rolls back alone.
+    """
+
+    CHUNK_SIZE = 500
+    AUTO_RELEASE_AFTER = timedelta(hours=24)
+
+    @classmethod
+    def _chunks(cls, queryset, fields):
+        """values() rows of `queryset` in pk order, CHUNK_SIZE at a time."""
+        last = None
+        while True:
+            page = queryset.order_by("pk")
+            if last is not None:
+                page = page.filter(pk__gt=last)
+            rows = list(page.values("pk", *fields)[:cls.CHUNK_SIZE])
+            if not rows:
+                return
+            last = rows[-1]["pk"]
+            yield rows
+
+    # ---------- creation ----------
+
+    @classmethod
+    def create_held(cls) -> dict:
+        """Hold an escrow for every paid order item that has none."""
+        from apps.administrator.metrics import DailyMetricsRollup
+        from apps.customers.models import OrderItem
+
+        eligible = OrderItem.objects.filter(
+            escrow__isnull=True,
+            designer__isnull=False,
+            order__invoice__payment__status="success",
+            order__invoice__payment__is_paid=True,
+            order__invoice__payment__is_deleted=False,
+        )
+        stats = {"chunks": 0, "escrows": 0}
+        fields = ("designer_id", "sub_total", "order__invoice__payment_id", "order__invoice__payment__user_id")
+        for rows in cls._chunks(eligible, fields):
+            stats["chunks"] += 1
+            with transaction.atomic():
+                claimed = set(
+                    OrderItem.objects.select_for_update()
+                    .filter(pk__in=[row["pk"] for row in rows], escrow__isnull=True)
+                    .values_list("pk", flat=True)
+                )
+                items, escrows = [], []
+                for row in rows:
+                    if row["pk"] not in claimed:
+                        continue
+                    escrow = Escrow(
+                        payment_id=row["order__invoice__payment_id"],
+                        customer_id=row["order__invoice__payment__user_id"],
+                        designer_id=row["designer_id"],
+                        amount=row["sub_total"],
+                        platform_commission=calculate_platform_commission(row["sub_total"]),
+                        status="held",
+                    )
+                    escrows.append(escrow)
+                    items.append(OrderItem(pk=row["pk"], escrow=escrow))
+                Escrow.objects.bulk_create(escrows)
+                OrderItem.objects.bulk_update(items, ["escrow"])
+            stats["escrows"] += len(escrows)
+            # bulk_create sends no post_save for the dashboard metrics
+            DailyMetricsRollup.mark(*{escrow.created_at for escrow in escrows})
+        logger.info("[escrow] created %s", stats)
+        return stats
+
+    # ---------- release ----------
+
+    @classmethod
+    def release_received(cls) -> dict:
+        """Release held escrows whose item the customer marked received."""
+        return cls._release(
+            Escrow.objects.filter(status="held", order_item__customer_status="received"),
+            transaction_type="escrow_release",
+            reference_prefix="ESCROW",
+        )
+
+    @classmethod
+    def auto_release_delivered(cls) -> dict:
+        """Release held escrows AUTO_RELEASE_AFTER delivery if the customer has not confirmed."""
+        threshold = timezone.now() - cls.AUTO_RELEASE_AFTER
+        return cls._release(
+            Escrow.objects.filter(
+                status="held",
+                order_item__status="delivered",
+                order_item__delivered_at__lte=threshold,
+            ),
+            transaction_type="escrow_auto_release",
+            reference_prefix="AUTO-ESCROW",
+            auto=True,
+        )
+
+    @classmethod
+    def _release(cls, eligible, transaction_type, reference_prefix, auto=False) -> dict:
+        stats = {"chunks": 0, "released": 0, "wallets": 0, "amount": Decimal("0.00")}
+        fields = ("designer_id", "amount", "platform_commission", "payment_id", "order_item__item_id")
+        for rows in cls._chunks(eligible, fields):
+            stats["chunks"] += 1
+            with transaction.atomic():
+                claimed = set(
+                    Escrow.objects.select_for_update()
+                    .filter(pk__in=[row["pk"] for row in rows], status="held")
+                    .values_list("pk", flat=True)
+                )
+                rows = [row for row in rows if row["pk"] in claimed]
+                if not rows:
+                    continue
+                wallets = cls._wallets({row["designer_id"] for row in rows})
+
+                now = timezone.now()
+                credits = defaultdict(Decimal)
+                ledger = []
+                for row in rows:
+                    share = row["amount"] - row["platform_commission"]
+                    wallet_id = wallets[row["designer_id"]]
+                    credits[wallet_id] += share
+                    ledger.append(WalletTransaction(
+                        wallet_id=wallet_id,
+                        user_id=row["designer_id"],
+                        transaction_type=transaction_type,
+                        status="completed",
+                        amount=share,
+                        reference=f"{reference_prefix}-{row['pk']}",
+                        related_payment_id=row["payment_id"],
+                        related_order_id=row["order_item__item_id"] or "",
+                        completed_at=now,
+                    ))
+
+                for wallet_id in sorted(credits):
+                    Wallet.objects.filter(pk=wallet_id).update(
+                        available_balance=F("available_balance") + credits[wallet_id]
+                    )
+                WalletTransaction.objects.bulk_create(ledger)
+                update = {"status": "released", "released_at": now}
+                if auto:
+                    update["is_auto_released"] = True
+                Escrow.objects.filter(pk__in=claimed).update(**update)
+
+            stats["released"] += len(rows)
+            stats["wallets"] += len(credits)
+            stats["amount"] += sum(credits.values())
+        logger.info("[escrow] %s %s", transaction_type, stats)
+        return stats
+
+    @staticmethod
+    def _wallets(user_ids) -> dict:
+        """{user id: wallet id}, creating the missing wallets."""
+        wallets = dict(Wallet.objects.filter(user_id__in=user_ids).values_list("user_id", "pk"))
+        missing = set(user_ids) - set(wallets)
+        if missing:
+            Wallet.objects.bulk_create([Wallet(user_id=user_id) for user_id in missing], ignore_conflicts=True)
+            wallets.update(Wallet.objects.filter(user_id__in=missing).values_list("user_id", "pk"))
+        return wallets
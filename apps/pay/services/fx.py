@@ -0,0 +1,220 @@
+"""
+Exchange-rate service.
+
+Rates are loaded as full tables (one per base currency) by a scheduled
+refresh and read from process memory, falling back to the shared cache and
+then to the static seed table. Reads never touch the network; a failed
+refresh keeps serving the last-known-good table.
+"""
+import logging
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+
+import requests
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+# Seed table (USD base) served until the first successful refresh, so
+# payments can still proceed with realistic amounts on a cold start.
+SEED_RATES = {
+    "USD": Decimal("1.00"),
+    "NGN": Decimal("1500.00"),
+    "GHS": Decimal("15.00"),
+    "KES": Decimal("130.00"),
+    "ZAR": Decimal("19.00"),
+    "GBP": Decimal("0.79"),
+    "EUR": Decimal("0.92"),
+    "CAD": Decimal("1.38"),
+}
+
+
+class ExchangeRateService:
+    API_URL = "https://open.er-api.com/v6/latest/{base}"
+    BASE_CURRENCIES = ("USD",)
+    DEFAULT_BASE = "USD"
+    CACHE_KEY = "fx_rates:{base}"
+    CACHE_TTL = 60 * 60 * 24 * 7      # last-known-good outlives many failed refreshes
+    MEMORY_TTL = 60                   # re-read the shared cache at most once a minute
+    REFRESH_INTERVAL_MINUTES = 60
+    STALE_AFTER = 60 * 60 * 6         # age past which a warning is logged
+    REQUEST_TIMEOUT = 10
+
+    # base -> {"rates": {code: Decimal}, "fetched_at": epoch, "checked_at": monotonic}
+    _tables = {}
+    _missed = {}  # base -> monotonic time of the last empty cache read
+    _lock = threading.Lock()
+
+    # ---------- reads (no network) ----------
+
+    @classmethod
+    def get_rate(cls, from_currency: str, to_currency: str):
+        """
+        Rate converting one unit of `from_currency` into `to_currency`, or
+        None when either currency is unknown. Pairs without a loaded base
+        are crossed through the default base table.
+        """
+        from_currency = (from_currency or "").upper()
+        to_currency = (to_currency or "").upper()
+        if from_currency == to_currency:
+            return Decimal("1")
+
+        if from_currency in cls.BASE_CURRENCIES:
+            rate = cls.get_table(from_currency).get(to_currency)
+            if rate is not None:
+                return rate
+
+        table = cls.get_table(cls.DEFAULT_BASE)
+        from_rate = table.get(from_currency)
+        to_rate = table.get(to_currency)
+        if not from_rate or to_rate is None:
+            return None
+        return to_rate / from_rate
+
+    @classmethod
+    def get_table(cls, base: str = None) -> dict:
+        """Full rate table for `base`: memory, then shared cache, then seed."""
+        base = (base or cls.DEFAULT_BASE).upper()
+        entry = cls._tables.get(base)
+        if entry and time.monotonic() - entry["checked_at"] < cls.MEMORY_TTL:
+            return entry["rates"]
+        if not entry and time.monotonic() - cls._missed.get(base, -cls.MEMORY_TTL) < cls.MEMORY_TTL:
+            return cls._seed_table(base)
+
+        cached = cls._read_cache(base)
+        with cls._lock:
+            if cached and (not entry or cached["fetched_at"] >= entry["fetched_at"]):
+                entry = cls._remember(base, cached["rates"], cached["fetched_at"])
+            elif entry:
+                entry["checked_at"] = time.monotonic()
+            if not entry:
+                cls._missed[base] = time.monotonic()
+        if entry:
+            return entry["rates"]
+        return cls._seed_table(base)
+
+    @classmethod
+    def rate_age_seconds(cls, base: str = None):
+        """Seconds since the `base` table was fetched, or None if never loaded."""
+        base = (base or cls.DEFAULT_BASE).upper()
+        cls.get_table(base)
+        entry = cls._tables.get(base)
+        if not entry:
+            return None
+        return max(0.0, time.time() - entry["fetched_at"])
+
+    @classmethod
+    def status(cls) -> dict:
+        """Rate-age metric per base currency, e.g. for logs and health checks."""
+        report = {}
+        for base in cls.BASE_CURRENCIES:
+            age = cls.rate_age_seconds(base)
+            report[base] = {
+                "rate_age_seconds": None if age is None else round(age, 1),
+                "source": "live" if age is not None else "seed",
+                "stale": age is None or age > cls.STALE_AFTER,
+                "currencies": len(cls.get_table(base)),
+            }
+        return report
+
+    # ---------- refresh (scheduled) ----------
+
+    @classmethod
+    def refresh(cls, bases=None) -> dict:
+        """
+        Fetch the full table for each base and publish it to memory and the
+        shared cache. A failed fetch leaves the last-known-good table in
+        place. Returns `status()`.
+        """
+        for base in bases or cls.BASE_CURRENCIES:
+            base = base.upper()
+            rates = cls._fetch(base)
+            if rates is None:
+                continue
+            fetched_at = time.time()
+            cls._write_cache(base, rates, fetched_at)
+            with cls._lock:
+                cls._remember(base, rates, fetched_at)
+
+        report = cls.status()
+        for base, info in report.items():
+            log = logger.warning if info["stale"] else logger.info
+            log("[fx_rates] base=%s rate_age_seconds=%s currencies=%d",
+                base, info["rate_age_seconds"], info["currencies"])
+        return report
+
+    @classmethod
+    def _fetch(cls, base: str):
+        try:
+            resp = requests.get(cls.API_URL.format(base=base), timeout=cls.REQUEST_TIMEOUT)
+            resp.raise_for_status()
+            data = resp.json()
+            if data.get("result", "success") != "success":
+                raise ValueError(data.get("error-type", "unsuccessful response"))
+            rates = {
+                code.upper(): Decimal(str(value))
+                for code, value in (data.get("rates") or {}).items()
+            }
+        except (requests.RequestException, ValueError, InvalidOperation) as exc:
+            logger.warning("[fx_rates] refresh failed for %s: %s", base, exc)
+            return None
+        if not rates:
+            logger.warning("[fx_rates] refresh for %s returned no rates", base)
+            return None
+        rates[base] = Decimal("1")
+        return rates
+
+    # ---------- storage ----------
+
+    @classmethod
+    def _remember(cls, base, rates, fetched_at):
+        entry = {"rates": rates, "fetched_at": fetched_at, "checked_at": time.monotonic()}
+        cls._tables[base] = entry
+        return entry
+
+    @classmethod
+    def _read_cache(cls, base):
+        try:
+            payload = cache.get(cls.CACHE_KEY.format(base=base))
+        except Exception as exc:
+            logger.warning("[fx_rates] cache read failed for %s: %s", base, exc)
+            return None
+        if not payload:
+            return None
+        try:
+            rates = {code: Decimal(value) for code, value in payload["rates"].items()}
+            return {"rates": rates, "fetched_at": float(payload["fetched_at"])}
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            return None
+
+    @classmethod
+    def _write_cache(cls, base, rates, fetched_at):
+        payload = {
+            "rates": {code: str(value) for code, value in rates.items()},
+            "fetched_at": fetched_at,
+        }
+        try:
+            cache.set(cls.CACHE_KEY.format(base=base), payload, cls.CACHE_TTL)
+        except Exception as exc:
+            logger.warning("[fx_rates] cache write failed for %s: %s", base, exc)
+
+    @classmethod
+    def _seed_table(cls, base):
+        base_rate = SEED_RATES.get(base)
+        if not base_rate:
+            return {}
+        return {code: rate / base_rate for code, rate in SEED_RATES.items()}
+
+    @classmethod
+    def clear(cls):
+        """Drop the in-process tables (tests, forced reload)."""
+        with cls._lock:
+            cls._tables.clear()
+            cls._missed.clear()
+
+
+def refresh_exchange_rates():
+    """Scheduled job entry point."""
+    return ExchangeRateService.refresh()
@@ -1,11 +1,14 @@
 # pay/services/pricing.py
 
+import logging
 from decimal import Decimal, ROUND_HALF_UP
-from django.core.cache import cache
-import requests
+from apps.utils.geoip import country_for_ip
 from django.conf import settings
+from django.utils import timezone
 from apps.pay.initialize import get_exchange_rate
 
+logger = logging.getLogger(__name__)
+
 # Country-Currency Mapping
 COUNTRY_CURRENCY_MAP = {
     'US': 'USD',
@@ -29,34 +32,10 @@ ALL_AFRICA = ECOWAS.union(EAC).union(SADC).union({
 
 def get_country_from_ip(ip_address: str) -> str:
     """
-    Looks up the country code (2-letter ISO) for a given IP address.
-    Falls back to 'US' for local/private IPs or if the external API call fails.
+    Looks up the country code (2-letter ISO) for a given IP address from the
+    local GeoIP table. Falls back to 'US' for local/private or unknown IPs.
     """
-    if not ip_address or ip_address in ('127.0.0.1', '::1', 'localhost'):
-        return 'US'
-        
-    cache_key = f"geoip:{ip_address}"
-    try:
-        cached_country = cache.get(cache_key)
-        if cached_country:
-            return cached_country
-    except Exception:
-        pass  # Redis down → skip cache
-        
-    try:
-        resp = requests.get(f"http://ip-api.com/json/{ip_address}", timeout=3)
-        if resp.status_code == 200:
-            data = resp.json()
-            country_code = data.get('countryCode', 'US').upper().strip()
-            try:
-                cache.set(cache_key, country_code, 86400)
-            except Exception:
-                pass  # Redis down → still return result
-            return country_code
-    except Exception as e:
-        print(f"[GeoIP Warning] Could not resolve IP {ip_address}: {e}")
-        
-    return 'US'
+    return country_for_ip(ip_address, default='US')
 
 
 def get_currency_for_country(country_code: str) -> str:
@@ -64,14 +43,15 @@ def get_currency_for_country(country_code: str) -> str:
     return COUNTRY_CURRENCY_MAP.get(country_code.upper().strip(), 'USD')
 
 
-def convert_currency_with_buffer(amount: Decimal, from_currency: str, to_currency: str) -> Decimal:
+def resolve_exchange_rate(from_currency: str, to_currency: str):
     """
-    Converts a Decimal amount from one currency to another using live exchange rates,
-    injecting a 1.5% buffer cushion to protect against intraday volatility.
+    Live exchange rate with the static local-currency fallbacks used when the
+    FX API is unreachable. Returns None for the same currency or when no
+    rate is known (convert 1:1, without buffer).
     """
     if from_currency == to_currency:
-        return amount
-        
+        return None
+
     rate = get_exchange_rate(from_currency, to_currency)
     if rate is None:
         # Static local currency fallbacks if the FX API is unreachable
@@ -83,16 +63,31 @@ def convert_currency_with_buffer(amount: Decimal, from_currency: str, to_currenc
             rate = Decimal("15.00")
         elif from_currency == "USD" and to_currency == "KES":
             rate = Decimal("130.00")
-        else:
-            return amount  # fallback 1:1
-            
+    return rate
+
+
+def apply_buffered_rate(amount: Decimal, rate) -> Decimal:
+    """Converts with a 1.5% buffer on the rate; a None rate converts 1:1."""
+    if rate is None:
+        return amount  # fallback 1:1
+
     # Inject 1.5% buffer to exchange rate
     buffered_rate = rate * Decimal("1.015")
-    
+
     converted = amount * buffered_rate
     return converted.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
 
+def convert_currency_with_buffer(amount: Decimal, from_currency: str, to_currency: str) -> Decimal:
+    """
+    Converts a Decimal amount from one currency to another using live exchange rates,
+    injecting a 1.5% buffer cushion to protect against intraday volatility.
+    """
+    if from_currency == to_currency:
+        return amount
+    return apply_buffered_rate(amount, resolve_exchange_rate(from_currency, to_currency))
+
+
 def get_duties_surcharge_percent(from_country: str, to_country: str, total_usd_value: Decimal) -> Decimal:
     """
     Calculates the duties and taxes surcharge percentage based on trade/economic blocs.
@@ -130,82 +125,82 @@ def get_duties_surcharge_percent(from_country: str, to_country: str, total_usd_v
     return Decimal("0.15")
 
 
-def calculate_product_price_breakdown(product, buyer_country_code: str, promo_discount=None) -> dict:
-    """
-    Calculates the complete visible price and breakdown for a product in USD.
-    
-    Formula:
-      Visible List Price = Base Price + Dynamic Shipping + Duties/Taxes Buffer + Platform Margin
-    """
-    # 1. Base price in USD
-    product_currency_code = product.currency.code if hasattr(product, 'currency') and product.currency else "USD"
-    raw_price = Decimal(str(product.price))
-    from apps.pay.services.pricing import convert_currency_with_buffer
-    original_base_price = convert_currency_with_buffer(raw_price, product_currency_code, "USD")
-    
+def get_product_currency(product) -> str:
+    return product.currency.code if hasattr(product, 'currency') and product.currency else "USD"
+
+
+def get_discount_percent(product, promo_discount=None) -> Decimal:
     if promo_discount is not None:
-        discount_pct = Decimal(str(promo_discount))
-    else:
-        discount_pct = Decimal(str(product.discount)) if getattr(product, "discount", 0) else Decimal("0.00")
-        
-    base_price = original_base_price * (1 - discount_pct / 100)
-    
-    # Resolve Designer's Origin Country
+        return Decimal(str(promo_discount))
+    return Decimal(str(product.discount)) if getattr(product, "discount", 0) else Decimal("0.00")
+
+
+def get_designer_country(product) -> str:
+    """Resolves the country a product ships from (designer profile, payout account, origin)."""
     designer_country = 'NG'
 
     designer_id = 'default'
-    
+
     is_mock = lambda x: type(x).__name__ in ('MagicMock', 'Mock', 'NonCallableMagicMock', 'NonCallableMock')
-    
+
     if product.user and hasattr(product.user, 'designer_profile') and product.user.designer_profile:
         profile = product.user.designer_profile
         if not is_mock(profile) or (hasattr(profile, 'country') and not is_mock(profile.country)):
             designer_country = str(profile.country) if profile.country else 'NG'
             if hasattr(profile, 'id') and not is_mock(profile.id):
                 designer_id = profile.id
-                
+
     if designer_id == 'default' and product.user and hasattr(product.user, 'account_detail') and product.user.account_detail:
         detail = product.user.account_detail
         if not is_mock(detail) or (hasattr(detail, 'country') and not is_mock(detail.country)):
             designer_country = str(detail.country) if detail.country else 'NG'
-            
+
     if designer_id == 'default' and product.country_of_origin:
         designer_country = product.country_of_origin.code or 'NG'
-        
-    # 2. Query dynamic shipping via Shippo
-    from apps.designers.shippo_service import get_shipping_rates
-    
-    from_address = {'country': designer_country}
-    to_address = {'country': buyer_country_code}
-    weight = float(product.weight_kg)
-    dims = {
+
+    return designer_country
+
+
+def get_parcel_dimensions(product) -> dict:
+    return {
         'length': str(product.length_cm),
         'width': str(product.width_cm),
         'height': str(product.height_cm)
     }
-    
-    # Cache key: ship_cost:{designer_id}:{from_country}:{to_country}:{weight_in_100g_buckets}
-    weight_bucket = int(weight * 10)
-    cache_key = f"ship_cost:{designer_id}:{designer_country}:{buyer_country_code}:{weight_bucket}"
-    cached_ship_cost = None
-    try:
-        cached_ship_cost = cache.get(cache_key)
-    except Exception:
-        pass  # Redis down → skip cache
-    
-    if cached_ship_cost is not None:
-        shipping_cost = Decimal(str(cached_ship_cost))
-    else:
-        rates_res = get_shipping_rates(from_address, to_address, weight, dims)
-        shipping_cost = Decimal("30.00")  # default fallback
-        if rates_res.get('status') == 'success' and rates_res.get('rates'):
-            shipping_cost = Decimal(str(rates_res['rates'][0]['amount']))
-        # Cache for 6 hours
-        try:
-            cache.set(cache_key, float(shipping_cost), 21600)
-        except Exception:
-            pass  # Redis down → still return result
-        
+
+
+def get_shipping_key(product) -> tuple:
+    """
+    What a product's shipping quote depends on besides the buyer: designer
+    country, exact weight (quotes interpolate between grid weights) and
+    parcel size class. Products with the same key share one quote.
+    """
+    from apps.designers.shipping_quotes import ShippingQuoteTable
+
+    return (
+        get_designer_country(product),
+        Decimal(str(product.weight_kg)).normalize(),
+        ShippingQuoteTable.dim_class(get_parcel_dimensions(product)),
+    )
+
+
+def get_shipping_cost(designer_country: str, buyer_country_code: str, product) -> Decimal:
+    """
+    Shipping quote (USD) for a parcel like `product` on the designer → buyer lane,
+    from the shipping lane table (never blocks on the carrier API).
+    """
+    from apps.designers.shipping_quotes import ShippingQuoteTable
+
+    return ShippingQuoteTable.cheapest(
+        designer_country, buyer_country_code, product.weight_kg, get_parcel_dimensions(product)
+    )
+
+
+def compose_price_breakdown(original_base_price: Decimal, discount_pct: Decimal, shipping_cost: Decimal,
+                            designer_country: str, buyer_country_code: str) -> dict:
+    """Pure arithmetic of the visible price once the base price and shipping are known."""
+    base_price = original_base_price * (1 - discount_pct / 100)
+
     # 3. Duties & Taxes Buffer Surcharge
     surcharge_percent = get_duties_surcharge_percent(designer_country, buyer_country_code, base_price)
     duties_buffer = (base_price + shipping_cost) * surcharge_percent
@@ -239,3 +234,227 @@ def calculate_product_price_breakdown(product, buyer_country_code: str, promo_di
         "designer_country": designer_country,
         "buyer_country": buyer_country_code
     }
+
+
+def calculate_product_price_breakdown(product, buyer_country_code: str, promo_discount=None) -> dict:
+    """
+    Calculates the complete visible price and breakdown for a product in USD.
+    
+    Formula:
+      Visible List Price = Base Price + Dynamic Shipping + Duties/Taxes Buffer + Platform Margin
+    """
+    # 1. Base price in USD
+    raw_price = Decimal(str(product.price))
+    original_base_price = convert_currency_with_buffer(raw_price, get_product_currency(product), "USD")
+
+    # 2. Query dynamic shipping via Shippo
+    designer_country = get_designer_country(product)
+    shipping_cost = get_shipping_cost(designer_country, buyer_country_code, product)
+
+    return compose_price_breakdown(
+        original_base_price,
+        get_discount_percent(product, promo_discount),
+        shipping_cost,
+        designer_country,
+        buyer_country_code,
+    )
+
+
+def get_client_ip(request):
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+class PricingContext:
+    """
+    Request-scoped price breakdowns for many products.
+
+    The buyer country is resolved once per request. prime() first reads the
+    precomputed rows for the page with one indexed query; products without a
+    row are grouped by currency and by shipping key (designer country,
+    weight, parcel size class) and each distinct FX rate and shipping quote
+    is looked up once. breakdown() is then pure arithmetic.
+    """
+
+    def __init__(self, buyer_country: str, use_table: bool = True):
+        self.buyer_country = buyer_country
+        self.use_table = use_table
+        self.stored = {}  # product pk -> precomputed breakdown
+        self.looked_up = set()  # product pks already checked against the table
+        self.rates = {}  # currency -> rate to USD (None = 1:1)
+        self.shipping = {}  # get_shipping_key() -> USD cost
+
+    @classmethod
+    def for_request(cls, request) -> "PricingContext":
+        """The request's context, created (and the buyer located) on first use."""
+        context = getattr(request, "_pricing_context", None)
+        if context is None:
+            context = cls(get_country_from_ip(get_client_ip(request)))
+            request._pricing_context = context
+        return context
+
+    def prime(self, products) -> None:
+        """Load precomputed rows, then every distinct FX rate and shipping quote still needed."""
+        products = list(products)
+        if self.use_table:
+            pks = {
+                product.pk for product in products
+                if getattr(product, "pk", None) is not None and product.pk not in self.looked_up
+            }
+            if pks:
+                self.stored.update(PriceBreakdownTable.lookup(pks, self.buyer_country))
+                self.looked_up |= pks
+
+        for product in products:
+            if getattr(product, "pk", None) in self.stored:
+                continue
+            currency = get_product_currency(product)
+            if currency not in self.rates:
+                self.rates[currency] = resolve_exchange_rate(currency, "USD")
+            key = get_shipping_key(product)
+            if key not in self.shipping:
+                self.shipping[key] = get_shipping_cost(key[0], self.buyer_country, product)
+
+    def breakdown(self, product, promo_discount=None) -> dict:
+        """Same result as calculate_product_price_breakdown, from the table or the primed groups."""
+        self.prime([product])
+        stored = self.stored.get(getattr(product, "pk", None))
+        if stored is not None:
+            if promo_discount is None:
+                return dict(stored)
+            return compose_price_breakdown(
+                stored["original_base_price"],
+                get_discount_percent(product, promo_discount),
+                stored["shipping_cost"],
+                stored["designer_country"],
+                self.buyer_country,
+            )
+
+        key = get_shipping_key(product)
+        designer_country = key[0]
+        original_base_price = apply_buffered_rate(
+            Decimal(str(product.price)), self.rates[get_product_currency(product)]
+        )
+        return compose_price_breakdown(
+            original_base_price,
+            get_discount_percent(product, promo_discount),
+            self.shipping[key],
+            designer_country,
+            self.buyer_country,
+        )
+
+
+class PriceBreakdownTable:
+    """
+    Precomputed breakdowns keyed by (product, buyer country).
+
+    rebuild() prices every published product for each buyer country with a
+    table-less PricingContext and writes only the rows whose values changed,
+    so the scheduled run after an FX or shipping refresh touches just the
+    affected products. Saving a product or designer drops that product's rows
+    (invalidate()); readers fall back to live pricing until the next rebuild.
+    """
+
+    BUYER_COUNTRIES = tuple(getattr(settings, "PRICING_BUYER_COUNTRIES", COUNTRY_CURRENCY_MAP))
+    BREAKDOWN_FIELDS = (
+        "original_base_price", "base_price", "shipping_cost", "duties_buffer",
+        "platform_margin", "total_price", "original_total_price", "designer_country",
+    )
+    # Product fields that feed the price; saves touching only others keep the rows
+    PRODUCT_INPUT_FIELDS = frozenset({
+        "price", "discount", "currency", "weight_kg", "length_cm", "width_cm",
+        "height_cm", "country_of_origin", "user",
+    })
+    CHUNK_SIZE = 500
+
+    @classmethod
+    def lookup(cls, product_ids, buyer_country: str) -> dict:
+        """{product pk: breakdown} for the rows present, in one indexed query."""
+        from apps.pay.models import ProductPriceBreakdown
+
+        rows = ProductPriceBreakdown.objects.filter(
+            product_id__in=list(product_ids), buyer_country=buyer_country,
+        ).values("product_id", *cls.BREAKDOWN_FIELDS)
+        return {
+            row.pop("product_id"): {**row, "buyer_country": buyer_country}
+            for row in rows
+        }
+
+    @classmethod
+    def invalidate(cls, product_ids) -> int:
+        from apps.pay.models import ProductPriceBreakdown
+
+        deleted, _ = ProductPriceBreakdown.objects.filter(product_id__in=product_ids).delete()
+        return deleted
+
+    @classmethod
+    def rebuild(cls, product_ids=None, countries=None) -> dict:
+        """Recompute the table (or the given products) and upsert changed rows."""
+        from apps.core.models import Product
+        from apps.pay.models import ProductPriceBreakdown
+        from apps.utils.db import upsert_options
+
+        countries = tuple(countries or cls.BUYER_COUNTRIES)
+        products = (
+            Product.objects.filter(is_published=True, is_active=True)
+            .select_related("currency", "country_of_origin", "user__designer_profile", "user__account_detail")
+            .order_by("pk")
+        )
+        if product_ids is not None:
+            products = products.filter(pk__in=list(product_ids))
+
+        contexts = {country: PricingContext(country, use_table=False) for country in countries}
+        stats = {"products": 0, "rows_written": 0, "rows_unchanged": 0, "rows_removed": 0}
+        now = timezone.now()
+        update_fields = [*cls.BREAKDOWN_FIELDS, "computed_at"]
+
+        pks = list(products.values_list("pk", flat=True))
+        for offset in range(0, len(pks), cls.CHUNK_SIZE):
+            chunk = list(products.filter(pk__in=pks[offset:offset + cls.CHUNK_SIZE]))
+            chunk_pks = [product.pk for product in chunk]
+            stats["products"] += len(chunk)
+
+            existing = {
+                (row.pop("product_id"), row.pop("buyer_country")): row
+                for row in ProductPriceBreakdown.objects.filter(
+                    product_id__in=chunk_pks, buyer_country__in=countries,
+                ).values("product_id", "buyer_country", *cls.BREAKDOWN_FIELDS)
+            }
+
+            changed = []
+            for country, context in contexts.items():
+                context.prime(chunk)
+                for product in chunk:
+                    breakdown = context.breakdown(product)
+                    values = {field: breakdown[field] for field in cls.BREAKDOWN_FIELDS}
+                    if existing.get((product.pk, country)) == values:
+                        stats["rows_unchanged"] += 1
+                        continue
+                    changed.append(ProductPriceBreakdown(
+                        product_id=product.pk, buyer_country=country, computed_at=now, **values,
+                    ))
+
+            ProductPriceBreakdown.objects.bulk_create(
+                changed,
+                batch_size=cls.CHUNK_SIZE,
+                **upsert_options(ProductPriceBreakdown, ["product", "buyer_country"], update_fields),
+            )
+            stats["rows_written"] += len(changed)
+
+        # Rows for products no longer sold, or countries no longer precomputed
+        stale = ProductPriceBreakdown.objects.exclude(
+            product__in=products.order_by().values("pk"), buyer_country__in=countries,
+        )
+        if product_ids is not None:
+            stale = stale.filter(product_id__in=list(product_ids))
+        stats["rows_removed"], _ = stale.delete()
+
+        logger.info("[price_table] %s", stats)
+        return stats
+
+
+def rebuild_price_table():
+    """Scheduled job entry point."""
+    return PriceBreakdownTable.rebuild()
@@ -0,0 +1,32 @@
+"""
+Django signals keeping the precomputed price table in step with its inputs.
+"""
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from apps.core.models import Product
+from apps.designers.models import Designer
+from apps.pay.models import AccountDetail
+from apps.pay.services.pricing import PriceBreakdownTable
+
+
+def _touches(update_fields, fields):
+    return update_fields is None or bool(set(update_fields) & set(fields))
+
+
+@receiver(post_save, sender=Product)
+def on_product_save(sender, instance, created, update_fields=None, **kwargs):
+    """Drop the product's prices when a pricing input may have changed."""
+    if not created and _touches(update_fields, PriceBreakdownTable.PRODUCT_INPUT_FIELDS):
+        PriceBreakdownTable.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Designer)
+@receiver(post_save, sender=AccountDetail)
+def on_ship_from_country_save(sender, instance, created, update_fields=None, **kwargs):
+    """The designer's country decides the shipping lane and duties bloc."""
+    if not created and instance.user_id and _touches(update_fields, {"country"}):
+        PriceBreakdownTable.invalidate(
+            Product.objects.filter(user_id=instance.user_id).values_list("pk", flat=True)
+        )
@@ -0,0 +1,110 @@
+"""
+Unit tests for apps.pay.services.escrow.EscrowSettlement
+
+Tests cover:
+  - Chunked escrow creation for paid order items (idempotent)
+  - Release on customer receipt with one wallet credit per designer
+  - Auto-release after delivery, leaving recent deliveries held
+  - Query count per run independent of the number of escrows
+"""
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.customers.models import Customer, Order, OrderItem
+from apps.pay.models import Escrow, Invoice, Payment, Wallet, WalletTransaction
+from apps.pay.services.escrow import EscrowSettlement
+
+User = get_user_model()
+
+
+class TestEscrowSettlement(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        buyer = User.objects.create_user(username="buyer", email="buyer@example.com", password="password123")
+        cls.ada = User.objects.create_user(username="ada", email="ada@example.com", password="password123")
+        cls.kojo = User.objects.create_user(username="kojo", email="kojo@example.com", password="password123")
+        Wallet.objects.create(user=cls.ada, available_balance=Decimal("5.00"))
+
+        payment = Payment.objects.create(user=buyer, amount=500, payment_method="card", status="success")
+        invoice = Invoice.objects.create(user=buyer, amount=500, payment=payment)
+        order = Order.objects.create(
+            customer=Customer.objects.create(user=buyer), invoice=invoice, order_id="URBON-test", total_amount=500,
+        )
+        unpaid = Order.objects.create(
+            customer=order.customer, invoice=Invoice.objects.create(user=buyer, amount=50),
+            order_id="URBON-unpaid", total_amount=50,
+        )
+        cls.items = [
+            OrderItem.objects.create(
+                order=order, designer=designer, amount=100, sub_total=Decimal("100.00"), tracking_number=f"T-{i}",
+            )
+            for i, designer in enumerate([cls.ada, cls.ada, cls.ada, cls.kojo, cls.kojo])
+        ]
+        OrderItem.objects.create(order=unpaid, designer=cls.kojo, amount=50, sub_total=50, tracking_number="T-unpaid")
+
+    def balance(self, user):
+        return Wallet.objects.get(user=user).available_balance
+
+    def test_create_held_in_chunks(self):
+        with patch.object(EscrowSettlement, "CHUNK_SIZE", 2):
+            stats = EscrowSettlement.create_held()
+        self.assertEqual(stats, {"chunks": 3, "escrows": 5})
+        escrows = Escrow.objects.filter(order_item__in=self.items)
+        self.assertEqual(escrows.count(), 5)
+        self.assertEqual({(e.status, e.amount, e.platform_commission) for e in escrows},
+                         {("held", Decimal("100.00"), Decimal("10.00"))})
+        self.assertFalse(OrderItem.objects.filter(tracking_number="T-unpaid", escrow__isnull=False).exists())
+
+        self.assertEqual(EscrowSettlement.create_held()["escrows"], 0)
+
+    def test_release_received_credits_each_wallet_once(self):
+        EscrowSettlement.create_held()
+        OrderItem.objects.filter(pk__in=[item.pk for item in self.items[1:]]).update(customer_status="received")
+
+        with patch.object(EscrowSettlement, "CHUNK_SIZE", 3):
+            stats = EscrowSettlement.release_received()
+        self.assertEqual((stats["released"], stats["amount"]), (4, Decimal("360.00")))
+        self.assertEqual(self.balance(self.ada), Decimal("185.00"))  # 5 + 2 x 90
+        self.assertEqual(self.balance(self.kojo), Decimal("180.00"))
+        ledger = WalletTransaction.objects.filter(transaction_type="escrow_release")
+        self.assertEqual(ledger.count(), 4)
+        entry = WalletTransaction.objects.get(reference=f"ESCROW-{Escrow.objects.get(order_item=self.items[1]).pk}")
+        self.assertEqual((entry.related_order_id, entry.wallet.user), (self.items[1].item_id, self.ada))
+        self.assertEqual(Escrow.objects.filter(status="held").count(), 1)
+
+        self.assertEqual(EscrowSettlement.release_received()["released"], 0)
+        self.assertEqual(self.balance(self.ada), Decimal("185.00"))
+
+    def test_auto_release_after_delivery(self):
+        EscrowSettlement.create_held()
+        now = timezone.now()
+        OrderItem.objects.filter(pk=self.items[0].pk).update(status="delivered", delivered_at=now - timedelta(days=2))
+        OrderItem.objects.filter(pk=self.items[1].pk).update(status="delivered", delivered_at=now - timedelta(hours=1))
+
+        stats = EscrowSettlement.auto_release_delivered()
+        self.assertEqual(stats["released"], 1)
+        released = Escrow.objects.get(order_item=self.items[0])
+        self.assertEqual((released.status, released.is_auto_released), ("released", True))
+        self.assertEqual(Escrow.objects.get(order_item=self.items[1]).status, "held")
+        self.assertTrue(WalletTransaction.objects.filter(reference=f"AUTO-ESCROW-{released.pk}").exists())
+
+    def test_queries_do_not_grow_with_escrows(self):
+        EscrowSettlement.create_held()
+        Wallet.objects.create(user=self.kojo)
+        received = OrderItem.objects.filter(pk__in=[item.pk for item in self.items])
+
+        received.filter(pk__in=[self.items[0].pk, self.items[3].pk]).update(customer_status="received")
+        with CaptureQueriesContext(connection) as few:
+            EscrowSettlement.release_received()
+        received.update(customer_status="received")
+        with CaptureQueriesContext(connection) as more:
+            self.assertEqual(EscrowSettlement.release_received()["released"], 3)
+        self.assertEqual(len(more), len(few))
@@ -0,0 +1,94 @@
+"""
+Unit tests for apps.pay.services.fx
+
+Tests cover:
+  - Reads served from memory / shared cache without network access
+  - Cross rates through the default base table
+  - Last-known-good fallback when a refresh fails
+  - Rate-age metric
+"""
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+
+import requests
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from apps.pay.initialize import convert_to_ngn, get_exchange_rate
+from apps.pay.services.fx import ExchangeRateService
+
+LOCMEM_CACHE = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "fx-tests",
+    }
+}
+
+
+def api_response(rates):
+    resp = MagicMock()
+    resp.json.return_value = {"result": "success", "base_code": "USD", "rates": rates}
+    resp.raise_for_status.return_value = None
+    return resp
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TestExchangeRateService(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        ExchangeRateService.clear()
+
+    def tearDown(self):
+        ExchangeRateService.clear()
+
+    @patch("apps.pay.services.fx.requests.get")
+    def test_reads_never_hit_network(self, mock_get):
+        self.assertEqual(get_exchange_rate("USD", "NGN"), Decimal("1500.00"))
+        self.assertEqual(convert_to_ngn(Decimal("2.00"), "USD"), Decimal("3000.00"))
+        mock_get.assert_not_called()
+
+    @patch("apps.pay.services.fx.requests.get")
+    def test_refresh_publishes_full_table(self, mock_get):
+        mock_get.return_value = api_response({"USD": 1, "NGN": 1600, "GBP": 0.8})
+        ExchangeRateService.refresh()
+        self.assertEqual(mock_get.call_count, 1)
+
+        self.assertEqual(get_exchange_rate("USD", "NGN"), Decimal("1600"))
+        # GBP -> NGN crossed through the USD table
+        self.assertEqual(get_exchange_rate("GBP", "NGN"), Decimal("1600") / Decimal("0.8"))
+        self.assertIsNone(get_exchange_rate("USD", "XYZ"))
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch("apps.pay.services.fx.requests.get")
+    def test_other_processes_load_from_shared_cache(self, mock_get):
+        mock_get.return_value = api_response({"USD": 1, "NGN": 1600})
+        ExchangeRateService.refresh()
+        ExchangeRateService.clear()  # fresh process, same cache
+
+        self.assertEqual(get_exchange_rate("USD", "NGN"), Decimal("1600"))
+        self.assertIsNotNone(ExchangeRateService.rate_age_seconds())
+
+    @patch("apps.pay.services.fx.requests.get")
+    def test_failed_refresh_keeps_last_known_good(self, mock_get):
+        mock_get.return_value = api_response({"USD": 1, "NGN": 1600})
+        ExchangeRateService.refresh()
+
+        mock_get.side_effect = requests.ConnectionError("down")
+        report = ExchangeRateService.refresh()
+
+        self.assertEqual(get_exchange_rate("USD", "NGN"), Decimal("1600"))
+        self.assertEqual(report["USD"]["source"], "live")
+        self.assertFalse(report["USD"]["stale"])
+
+    def test_rate_age_metric(self):
+        report = ExchangeRateService.status()
+        self.assertEqual(report["USD"]["source"], "seed")
+        self.assertIsNone(report["USD"]["rate_age_seconds"])
+        self.assertTrue(report["USD"]["stale"])
+
+        with patch("apps.pay.services.fx.requests.get",
+                   return_value=api_response({"USD": 1, "NGN": 1600})):
+            ExchangeRateService.refresh()
+        with patch("apps.pay.services.fx.time.time", return_value=ExchangeRateService._tables["USD"]["fetched_at"] + 90):
+            self.assertAlmostEqual(ExchangeRateService.rate_age_seconds(), 90, places=3)
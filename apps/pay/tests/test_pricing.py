@@ -5,18 +5,30 @@ Tests cover:
   - Currency conversion with 1.5% buffer
   - Duties / surcharge logic per economic bloc
   - Full product price breakdown
+  - Request-scoped batched pricing context
+  - Precomputed (product, buyer country) price table
 """
 from decimal import Decimal
+from types import SimpleNamespace
 from unittest.mock import patch, MagicMock
 
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from apps.pay.services.pricing import (
     convert_currency_with_buffer,
     get_currency_for_country,
     get_duties_surcharge_percent,
     calculate_product_price_breakdown,
+    PricingContext,
+    PriceBreakdownTable,
 )
+from apps.core.models import Product
+from apps.designers.models import Designer
+from apps.designers.shipping_quotes import ShippingQuoteTable
+from apps.pay.models import ProductPriceBreakdown
 
 
 class TestCurrencyConversion(TestCase):
@@ -136,6 +148,8 @@ class TestPriceBreakdown(TestCase):
     def _make_mock_product(self, price="50.00", weight=0.5, country_code="NG"):
         product = MagicMock()
         product.price = Decimal(price)
+        product.discount = Decimal("0")
+        product.currency = None  # priced in USD
         product.weight_kg = weight
         product.length_cm = 30
         product.width_cm = 20
@@ -147,13 +161,10 @@ class TestPriceBreakdown(TestCase):
         product.user.account_detail.country = country_code
         return product
 
-    @patch("apps.pay.services.pricing.cache")
-    @patch("apps.designers.shippo_service.get_shipping_rates")
-    def test_ng_to_us_under_de_minimis(self, mock_ship, mock_cache):
+    @patch("apps.designers.shipping_quotes.ShippingQuoteTable.cheapest")
+    def test_ng_to_us_under_de_minimis(self, mock_ship):
         """Nigeria -> US, $50 product (under $800), shipping = $15."""
-        mock_cache.get.return_value = None  # no cache hit
-        mock_cache.set = MagicMock()
-        mock_ship.return_value = {"status": "success", "rates": [{"amount": "15.00"}]}
+        mock_ship.return_value = Decimal("15.00")
 
         product = self._make_mock_product(price="50.00", country_code="NG")
         result = calculate_product_price_breakdown(product, "US")
@@ -167,13 +178,10 @@ class TestPriceBreakdown(TestCase):
         # Total = 50 + 15 + 0 + 5 = 70.00
         self.assertEqual(result["total_price"], Decimal("70.00"))
 
-    @patch("apps.pay.services.pricing.cache")
-    @patch("apps.designers.shippo_service.get_shipping_rates")
-    def test_ng_to_de_eu_vat(self, mock_ship, mock_cache):
+    @patch("apps.designers.shipping_quotes.ShippingQuoteTable.cheapest")
+    def test_ng_to_de_eu_vat(self, mock_ship):
         """Nigeria -> Germany: 20% VAT buffer applied."""
-        mock_cache.get.return_value = None
-        mock_cache.set = MagicMock()
-        mock_ship.return_value = {"status": "success", "rates": [{"amount": "20.00"}]}
+        mock_ship.return_value = Decimal("20.00")
 
         product = self._make_mock_product(price="100.00", country_code="NG")
         result = calculate_product_price_breakdown(product, "DE")
@@ -187,13 +195,10 @@ class TestPriceBreakdown(TestCase):
         # Total = 100 + 20 + 24 + 10 = 154.00
         self.assertEqual(result["total_price"], Decimal("154.00"))
 
-    @patch("apps.pay.services.pricing.cache")
-    @patch("apps.designers.shippo_service.get_shipping_rates")
-    def test_ng_to_gh_ecowas_free_trade(self, mock_ship, mock_cache):
+    @patch("apps.designers.shipping_quotes.ShippingQuoteTable.cheapest")
+    def test_ng_to_gh_ecowas_free_trade(self, mock_ship):
         """ECOWAS intra-bloc -> 0% duty."""
-        mock_cache.get.return_value = None
-        mock_cache.set = MagicMock()
-        mock_ship.return_value = {"status": "success", "rates": [{"amount": "8.00"}]}
+        mock_ship.return_value = Decimal("8.00")
 
         product = self._make_mock_product(price="40.00", country_code="NG")
         result = calculate_product_price_breakdown(product, "GH")
@@ -202,15 +207,167 @@ class TestPriceBreakdown(TestCase):
         # Total = 40 + 8 + 0 + 4 = 52.00
         self.assertEqual(result["total_price"], Decimal("52.00"))
 
-    @patch("apps.pay.services.pricing.cache")
-    @patch("apps.designers.shippo_service.get_shipping_rates")
-    def test_shippo_failure_uses_fallback(self, mock_ship, mock_cache):
-        """When Shippo returns no rates, falls back to $30 shipping."""
-        mock_cache.get.return_value = None
-        mock_cache.set = MagicMock()
-        mock_ship.return_value = {"status": "error", "rates": []}
-
+    @patch("apps.designers.shipping_quotes.get_shipping_rates")
+    def test_shippo_failure_uses_fallback(self, mock_ship):
+        """With no lane quotes yet, shipping is the zone estimate; Shippo is not called inline."""
+        ShippingQuoteTable.clear()
         product = self._make_mock_product(price="60.00", country_code="NG")
-        result = calculate_product_price_breakdown(product, "US")
+        with patch.object(ShippingQuoteTable, "BACKGROUND_REFRESH", False):
+            result = calculate_product_price_breakdown(product, "US")
+
+        # International Economy estimate: (18 + 5.5 * 0.5) * 1.15
+        self.assertEqual(result["shipping_cost"], Decimal("23.86"))
+        mock_ship.assert_not_called()
+
+
+class TestPricingContext(TestCase):
+    """One FX lookup per currency and one shipping quote per lane, per request."""
+
+    def _make_product(self, price="50.00", currency=None, origin="NG", weight=0.5, size=(30, 20, 5)):
+        return SimpleNamespace(
+            price=Decimal(price),
+            discount=Decimal("10"),
+            currency=SimpleNamespace(code=currency) if currency else None,
+            user=None,
+            country_of_origin=SimpleNamespace(code=origin),
+            weight_kg=weight,
+            length_cm=size[0],
+            width_cm=size[1],
+            height_cm=size[2],
+        )
 
-        self.assertEqual(result["shipping_cost"], Decimal("30.00"))
+    def setUp(self):
+        self.products = [
+            self._make_product(price=str(10 * (i + 1)), currency=currency, origin=origin, weight=weight)
+            for i, (currency, origin, weight) in enumerate(
+                [("NGN", "NG", 0.5), (None, "NG", 0.52), ("NGN", "GH", 0.5), ("GHS", "GH", 2.0)] * 3
+            )
+        ]
+
+    @patch("apps.pay.services.pricing.get_exchange_rate", return_value=Decimal("0.0007"))
+    @patch("apps.designers.shipping_quotes.ShippingQuoteTable.cheapest")
+    def test_external_calls_bounded_by_groups(self, mock_ship, mock_rate):
+        mock_ship.return_value = Decimal("12.00")
+
+        context = PricingContext("US")
+        context.prime(self.products)
+        for product in self.products:
+            context.breakdown(product)
+
+        # Currencies: NGN, GHS (USD needs no lookup)
+        self.assertEqual(mock_rate.call_count, 2)
+        # Shipping keys: (NG, 0.5, S), (NG, 0.52, S), (GH, 0.5, S), (GH, 2, S)
+        self.assertEqual(mock_ship.call_count, 4)
+
+    @patch("apps.pay.services.pricing.get_exchange_rate", return_value=None)
+    @patch("apps.designers.shipping_quotes.ShippingQuoteTable.cheapest")
+    def test_quote_not_shared_across_sizes_or_weights(self, mock_ship, mock_rate):
+        def quote(origin, destination, weight, dims):
+            return Decimal(dims["height"]) + Decimal(str(weight))
+
+        mock_ship.side_effect = quote
+        small = self._make_product(weight=0.5)
+        large = self._make_product(weight=0.5, size=(60, 40, 40))
+        heavier = self._make_product(weight=0.52)  # same 100g as `small`
+
+        context = PricingContext("US")
+        context.prime([small, large, heavier])
+        shipping = [context.breakdown(p)["shipping_cost"] for p in (small, large, heavier)]
+        self.assertEqual(shipping, [Decimal("5.5"), Decimal("40.5"), Decimal("5.52")])
+
+    @patch("apps.pay.services.pricing.get_exchange_rate", return_value=Decimal("0.0007"))
+    @patch("apps.designers.shipping_quotes.ShippingQuoteTable.cheapest")
+    def test_breakdown_matches_single_product_formula(self, mock_ship, mock_rate):
+        mock_ship.return_value = Decimal("12.00")
+
+        context = PricingContext("DE")
+        context.prime(self.products)
+        for product in self.products:
+            self.assertEqual(
+                context.breakdown(product),
+                calculate_product_price_breakdown(product, "DE"),
+            )
+
+    @patch("apps.pay.services.pricing.get_country_from_ip", return_value="GH")
+    def test_buyer_country_resolved_once_per_request(self, mock_geo):
+        request = SimpleNamespace(META={"HTTP_X_FORWARDED_FOR": "41.58.0.1, 10.0.0.1"})
+        first = PricingContext.for_request(request)
+        second = PricingContext.for_request(request)
+
+        self.assertIs(first, second)
+        self.assertEqual(first.buyer_country, "GH")
+        mock_geo.assert_called_once_with("41.58.0.1")
+
+
+@patch("apps.pay.services.pricing.get_exchange_rate", return_value=None)
+@patch("apps.designers.shipping_quotes.ShippingQuoteTable.cheapest")
+class TestPriceBreakdownTable(TestCase):
+    """Precomputed rows match live pricing and are rewritten only on change."""
+
+    COUNTRIES = ("US", "GH", "DE")
+
+    def setUp(self):
+        User = get_user_model()
+        self.designer_user = User.objects.create_user(
+            username="designer", email="designer@example.com", password="password123"
+        )
+        Designer.objects.create(user=self.designer_user, brand_name="Brand", country="NG")
+        self.products = [
+            Product.objects.create(
+                user=self.designer_user, name=f"Dress {i}", description="Listed",
+                price=Decimal("40.00") + i, discount=Decimal("10") * (i % 2), is_published=True,
+            )
+            for i in range(4)
+        ]
+
+    def test_rows_match_live_breakdown(self, mock_ship, mock_rate):
+        mock_ship.return_value = Decimal("12.00")
+        stats = PriceBreakdownTable.rebuild(countries=self.COUNTRIES)
+        self.assertEqual(stats["rows_written"], len(self.products) * len(self.COUNTRIES))
+
+        for country in self.COUNTRIES:
+            stored = PriceBreakdownTable.lookup([p.pk for p in self.products], country)
+            for product in self.products:
+                self.assertEqual(stored[product.pk], calculate_product_price_breakdown(product, country))
+
+    def test_rebuild_writes_only_changed_rows(self, mock_ship, mock_rate):
+        mock_ship.return_value = Decimal("12.00")
+        PriceBreakdownTable.rebuild(countries=self.COUNTRIES)
+
+        stats = PriceBreakdownTable.rebuild(countries=self.COUNTRIES)
+        self.assertEqual(stats["rows_written"], 0)
+
+        mock_ship.return_value = Decimal("14.00")  # shipping table refreshed
+        stats = PriceBreakdownTable.rebuild(countries=self.COUNTRIES)
+        self.assertEqual(stats["rows_written"], len(self.products) * len(self.COUNTRIES))
+
+    def test_price_change_invalidates_product_rows(self, mock_ship, mock_rate):
+        mock_ship.return_value = Decimal("12.00")
+        PriceBreakdownTable.rebuild(countries=self.COUNTRIES)
+        first, second = self.products[:2]
+
+        second.name = "Renamed"
+        second.save(update_fields=["name"])
+        first.price = Decimal("99.00")
+        first.save()
+
+        self.assertFalse(ProductPriceBreakdown.objects.filter(product=first).exists())
+        self.assertEqual(ProductPriceBreakdown.objects.filter(product=second).count(), len(self.COUNTRIES))
+
+        stats = PriceBreakdownTable.rebuild(product_ids=[first.pk], countries=self.COUNTRIES)
+        self.assertEqual(stats["rows_written"], len(self.COUNTRIES))
+
+    def test_context_reads_table_with_one_query(self, mock_ship, mock_rate):
+        mock_ship.return_value = Decimal("12.00")
+        PriceBreakdownTable.rebuild(countries=self.COUNTRIES)
+        live = {p.pk: calculate_product_price_breakdown(p, "DE", promo_discount=25) for p in self.products}
+        mock_ship.reset_mock()
+
+        context = PricingContext("DE")
+        with CaptureQueriesContext(connection) as queries:
+            context.prime(self.products)
+            promo = {p.pk: context.breakdown(p, promo_discount=25) for p in self.products}
+
+        self.assertEqual(len(queries), 1)
+        mock_ship.assert_not_called()
+        self.assertEqual(promo, live)
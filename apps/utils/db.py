@@ -0,0 +1,15 @@
+from django.db import router, connections
+
+
+def upsert_options(model, unique_fields, update_fields):
+    """
+    bulk_create() kwargs that turn an insert into an upsert on `unique_fields`.
+
+    PostgreSQL and SQLite need the conflict target spelled out; MySQL rejects
+    it and resolves conflicts against the table's unique keys instead.
+    """
+    options = {"update_conflicts": True, "update_fields": list(update_fields)}
+    features = connections[router.db_for_write(model)].features
+    if features.supports_update_conflicts_with_target:
+        options["unique_fields"] = list(unique_fields)
+    return options
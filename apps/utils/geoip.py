@@ -0,0 +1,170 @@
+"""
+Local IP -> country resolution.
+
+The database is a sorted array of non-overlapping IP ranges saved as a
+NumPy .npy file and memory-mapped on first use. Every address (IPv4 is
+stored IPv4-mapped) is packed to 16 big-endian bytes, so byte order equals
+numeric order and a lookup is one `searchsorted` binary search.
+
+Build or refresh the table with `python manage.py load_geoip`.
+"""
+import ipaddress
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+RANGE_DTYPE = np.dtype([("start", "S16"), ("end", "S16"), ("country", "S2")])
+
+
+def pack_ip(ip) -> bytes:
+    """16-byte big-endian key for an address; IPv4 is mapped into ::ffff:0:0/96."""
+    if not isinstance(ip, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+        ip = ipaddress.ip_address(ip)
+    if ip.version == 4:
+        ip = ipaddress.IPv6Address(f"::ffff:{ip}")
+    return ip.packed
+
+
+def build_table(ranges) -> np.ndarray:
+    """
+    Sorted, merged range table from (start_ip, end_ip, country) tuples.
+    Overlaps are resolved in favour of the earlier-starting range; adjacent
+    ranges with the same country are merged.
+    """
+    rows = sorted(
+        (pack_ip(start), pack_ip(end), country.upper().encode("ascii"))
+        for start, end, country in ranges
+        if country
+    )
+    merged = []
+    for start, end, country in rows:
+        if merged:
+            prev_start, prev_end, prev_country = merged[-1]
+            if start <= prev_end:
+                if end <= prev_end:
+                    continue
+                start = (int.from_bytes(prev_end, "big") + 1).to_bytes(16, "big")
+            if prev_country == country and int.from_bytes(start, "big") == int.from_bytes(prev_end, "big") + 1:
+                merged[-1] = (prev_start, end, country)
+                continue
+        merged.append((start, end, country))
+    return np.array(merged, dtype=RANGE_DTYPE)
+
+
+def save_table(table: np.ndarray, path) -> None:
+    """Atomically replace the database file so running workers pick it up."""
+    path = str(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as fh:
+        np.save(fh, table, allow_pickle=False)
+    os.replace(tmp, path)
+
+
+class GeoIPResolver:
+    """Resolver interface: ISO-3166 alpha-2 country for an address, or None."""
+
+    def country(self, ip_address):
+        raise NotImplementedError
+
+
+class RangeTableResolver(GeoIPResolver):
+    """Binary search over the memory-mapped range table at `path`."""
+
+    RELOAD_CHECK_SECONDS = 60
+
+    def __init__(self, path=None):
+        self.path = str(path or settings.GEOIP_DATABASE)
+        self._starts = None
+        self._ends = None
+        self._countries = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def country(self, ip_address):
+        try:
+            key = pack_ip(ip_address)
+        except ValueError:
+            return None
+        self._ensure_loaded()
+        if self._starts is None or not len(self._starts):
+            return None
+
+        idx = int(np.searchsorted(self._starts, np.bytes_(key), side="right")) - 1
+        if idx < 0 or bytes(self._ends[idx]).ljust(16, b"\0") < key:
+            return None
+        return self._countries[idx].decode("ascii")
+
+    def __len__(self):
+        self._ensure_loaded()
+        return 0 if self._starts is None else len(self._starts)
+
+    def _ensure_loaded(self):
+        now = time.monotonic()
+        if self._mtime is not None and now - self._checked_at < self.RELOAD_CHECK_SECONDS:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                if self._mtime is None:
+                    logger.warning("[geoip] database %s not found; run `manage.py load_geoip`", self.path)
+                    self._mtime = 0.0
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                table = np.load(self.path, mmap_mode="r", allow_pickle=False)
+            except (OSError, ValueError) as exc:
+                logger.warning("[geoip] could not load %s: %s", self.path, exc)
+                return
+            self._starts, self._ends, self._countries = table["start"], table["end"], table["country"]
+            self._mtime = mtime
+            logger.info("[geoip] loaded %d ranges from %s", len(table), self.path)
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver() -> GeoIPResolver:
+    """Process-wide resolver; `settings.GEOIP_RESOLVER` may name another class."""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                resolver_path = getattr(settings, "GEOIP_RESOLVER", None)
+                _resolver = import_string(resolver_path)() if resolver_path else RangeTableResolver()
+    return _resolver
+
+
+def set_resolver(resolver) -> None:
+    """Swap the process-wide resolver (tests, alternative backends)."""
+    global _resolver
+    _resolver = resolver
+
+
+def country_for_ip(ip_address, default=None):
+    """
+    Country code for `ip_address` without any network access. Private,
+    loopback and unresolvable addresses return `default`
+    (settings.GEOIP_DEFAULT_COUNTRY when not given).
+    """
+    if default is None:
+        default = getattr(settings, "GEOIP_DEFAULT_COUNTRY", "US")
+    try:
+        ip = ipaddress.ip_address((ip_address or "").strip())
+    except ValueError:
+        return default
+    if not ip.is_global:
+        return default
+    return get_resolver().country(ip) or default
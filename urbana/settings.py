@@ -381,6 +381,28 @@ STATIC_ROOT = BASE_DIR / "static"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# =====================================================
+# GeoIP (local IP-range table, built by `manage.py load_geoip`)
+# =====================================================
+
+GEOIP_DATABASE = config("GEOIP_DATABASE", default=str(BASE_DIR / "geoip" / "ip_country.npy"))
+GEOIP_DEFAULT_COUNTRY = "US"
+
+# =====================================================
+# Product embeddings (semantic search, built by `manage.py generate_embeddings`)
+# =====================================================
+
+EMBEDDING_ENCODER = config("EMBEDDING_ENCODER", default="apps.core.embeddings.HashingEncoder")
+EMBEDDING_INDEX_DIR = config("EMBEDDING_INDEX_DIR", default=str(BASE_DIR / "embeddings"))
+
+# =====================================================
+# APS scheduler (jobs run on the elected leader only). Run
+# `manage.py run_scheduler` as its own process; APS_AUTOSTART=True makes
+# every web worker join the election instead (single-process setups)
+# =====================================================
+
+APS_AUTOSTART = config("APS_AUTOSTART", default=False, cast=bool)
+
 # =====================================================
 # Email Configuration (cleaned — pick one backend)
 # =====================================================